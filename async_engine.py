@@ -0,0 +1,381 @@
+import asyncio
+import json
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+import aiohttp
+import metrics
+import preflight
+from transfer import IncompleteDownload, MAX_RESUMES, upload_bandwidth
+from cache import get_cache
+from ratelimit import get_limiter, ASSETS, SUBMIT, STATUS, THROTTLE_STATUSES, MAX_THROTTLE_RETRIES
+from config import pdf_services_url, DEFAULT_OCR_LANG, ASSET_DELETE_TIMEOUT
+from tokens import token_url, TOKEN_SCOPE, EXPIRY_MARGIN
+from poller import (
+    RETRYABLE_STATUSES, MAX_INTERVAL, initial_delay, next_interval, deadline_for, retry_after_seconds, download_uri_from
+)
+
+UPLOAD_TIMEOUT = 300
+CHUNK_SIZE = 1024 * 1024
+
+DEFAULT_MAX_JOBS = 1000  # Jobs in flight; most of them are just waiting on Adobe
+DEFAULT_MAX_TRANSFERS = 16  # Concurrent uploads/downloads, each holding a file and a socket
+
+
+class AsyncConversionEngine:
+    """Run the token -> upload -> export -> poll -> download pipeline on one event loop.
+
+    A job only holds a socket or a file handle while it is transferring bytes, so
+    thousands of jobs can wait on remote conversion at once. Use as an async
+    context manager, or call ``close`` when done.
+    """
+
+    def __init__(self, credentials, max_jobs=DEFAULT_MAX_JOBS, max_transfers=DEFAULT_MAX_TRANSFERS):
+        self.credentials = credentials
+        self.max_jobs = max_jobs
+        self.max_transfers = max_transfers
+        self._session = None
+        self._token = None
+        self._token_task = None
+        self._job_slots = None
+        self._transfer_slots = None
+        self._cleanups = set()  # Asset deletions still running
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def start(self):
+        if self._session is None:
+            connector = aiohttp.TCPConnector(limit=self.max_transfers * 2, limit_per_host=self.max_transfers, ttl_dns_cache=300)
+            self._session = aiohttp.ClientSession(connector=connector)
+            self._job_slots = asyncio.Semaphore(self.max_jobs)
+            self._transfer_slots = asyncio.Semaphore(self.max_transfers)
+
+    async def close(self):
+        if self._cleanups:
+            await asyncio.wait(self._cleanups, timeout=ASSET_DELETE_TIMEOUT)
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    @property
+    def client_id(self):
+        return self.credentials["client_credentials"]["client_id"]
+
+    async def get_access_token(self):
+        if self._token and self._token["expires_at"] > time.time():
+            return self._token["access_token"]
+        # Single flight: every coroutine awaits the same fetch task
+        if self._token_task is None or self._token_task.done():
+            self._token_task = asyncio.ensure_future(self._fetch_token())
+        self._token = await asyncio.shield(self._token_task)
+        return self._token["access_token"]
+
+    async def _fetch_token(self):
+        data = {
+            "grant_type": "client_credentials",
+            "client_id": self.client_id,
+            "client_secret": self.credentials["client_credentials"]["client_secret"],
+            "scope": TOKEN_SCOPE
+        }
+        with metrics.timed(metrics.TOKEN) as event:
+            for attempt in range(MAX_THROTTLE_RETRIES + 1):
+                async with self._session.post(token_url(), data=data, timeout=aiohttp.ClientTimeout(total=30)) as response:
+                    event["http_status"] = response.status
+                    if await _wait_if_throttled(response, attempt):
+                        continue
+                    response.raise_for_status()
+                    token_data = await response.json()
+                    break
+        return {
+            "access_token": token_data["access_token"],
+            "expires_at": time.time() + token_data["expires_in"] - EXPIRY_MARGIN
+        }
+
+    def _headers(self, access_token, content_type=None):
+        headers = {
+            "x-api-key": self.client_id,
+            "Authorization": f"Bearer {access_token}"
+        }
+        if content_type:
+            headers["Content-Type"] = content_type
+        return headers
+
+    async def _post_json(self, bucket, url, payload, access_token, event):
+        """POST within the rate limit, retrying throttled attempts; returns (headers, body bytes)."""
+        limiter = get_limiter()
+        for attempt in range(MAX_THROTTLE_RETRIES + 1):
+            await limiter.acquire_async(bucket)
+            async with self._session.post(url, json=payload, headers=self._headers(access_token, "application/json"),
+                                          timeout=aiohttp.ClientTimeout(total=30)) as response:
+                event["http_status"] = response.status
+                if limiter.feedback(bucket, response.status, response.headers) and attempt < MAX_THROTTLE_RETRIES:
+                    continue
+                response.raise_for_status()
+                return response.headers, await response.read()
+
+    async def upload_pdf(self, access_token, file_path):
+        with metrics.timed(metrics.ASSET_CREATE, file_path) as event:
+            _, body = await self._post_json(ASSETS, f"{pdf_services_url()}/assets", {"mediaType": "application/pdf"},
+                                            access_token, event)
+            upload_data = json.loads(body)
+
+        # Presigned storage URLs reject chunked bodies, so send an explicit length
+        file_size = os.path.getsize(file_path)
+        headers = {"Content-Type": "application/pdf", "Content-Length": str(file_size)}
+        try:
+            async with self._transfer_slots:
+                with metrics.timed(metrics.UPLOAD, file_path, bytes=file_size) as event:
+                    for attempt in range(MAX_THROTTLE_RETRIES + 1):
+                        async with self._session.put(upload_data["uploadUri"], data=_read_chunks(file_path), headers=headers,
+                                                     timeout=aiohttp.ClientTimeout(total=UPLOAD_TIMEOUT)) as response:
+                            event["http_status"] = response.status
+                            if await _wait_if_throttled(response, attempt):
+                                continue
+                            response.raise_for_status()
+                            break
+        except BaseException:
+            self.discard_asset(access_token, upload_data["assetID"])
+            raise
+        return upload_data["assetID"]
+
+    def discard_asset(self, access_token, asset_id):
+        """Delete an asset no job will use, in the background so a cancelled job ends at once."""
+        task = asyncio.ensure_future(self._delete_asset(access_token, asset_id))
+        self._cleanups.add(task)
+        task.add_done_callback(self._cleanups.discard)
+
+    async def _delete_asset(self, access_token, asset_id):
+        try:
+            async with self._session.delete(f"{pdf_services_url()}/assets/{asset_id}", headers=self._headers(access_token),
+                                            timeout=aiohttp.ClientTimeout(total=ASSET_DELETE_TIMEOUT)) as response:
+                if response.status not in (200, 204, 404):
+                    print(f"Could not delete asset {asset_id}: HTTP {response.status}")
+        except Exception as e:
+            print(f"Could not delete asset {asset_id}: {e}")
+
+    async def convert_pdf_to_docx(self, access_token, asset_id, file_path=None, ocr_lang=DEFAULT_OCR_LANG):
+        with metrics.timed(metrics.SUBMIT, file_path) as event:
+            headers, _ = await self._post_json(SUBMIT, f"{pdf_services_url()}/operation/exportpdf",
+                                               {"assetID": asset_id, "targetFormat": "docx", "ocrLang": ocr_lang},
+                                               access_token, event)
+            location = headers.get("Location", "")
+        job_id = location.split("/")[-2] if location.count("/") >= 2 else ""
+        if not job_id:
+            raise ValueError("Job ID not found in response")
+        return job_id
+
+    async def poll_status(self, access_token, job_id, file_size=0, file_path=None, pages=None, ocr=False):
+        """Poll with the same adaptive schedule and deadline as the threaded poller."""
+        with metrics.timed(metrics.REMOTE_WAIT, file_path):
+            return await self._poll_status(access_token, job_id, file_size, file_path, pages, ocr)
+
+    async def _poll_status(self, access_token, job_id, file_size, file_path, pages, ocr):
+        url = f"{pdf_services_url()}/operation/exportpdf/{job_id}/status"
+        interval = initial_delay(file_size, pages, ocr)
+        deadline = time.monotonic() + deadline_for(file_size, pages, ocr)
+        await asyncio.sleep(interval)
+        while time.monotonic() < deadline:
+            delay = None
+            await get_limiter().acquire_async(STATUS)
+            started = time.monotonic()
+            try:
+                access_token = await self.get_access_token()
+                async with self._session.get(url, headers=self._headers(access_token),
+                                             timeout=aiohttp.ClientTimeout(total=30)) as response:
+                    metrics.emit(metrics.POLL, file_path, time.monotonic() - started, http_status=response.status)
+                    get_limiter().feedback(STATUS, response.status, response.headers)
+                    delay = retry_after_seconds(response.headers)
+                    if response.status not in RETRYABLE_STATUSES:
+                        response.raise_for_status()
+                        status_data = await response.json()
+                        status = status_data.get("status")
+                        if status == "done":
+                            return download_uri_from(status_data)
+                        if status == "failed":
+                            raise ValueError(f"Conversion failed: {status_data.get('error')}")
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                metrics.emit(metrics.POLL, file_path, time.monotonic() - started, ok=False, error=str(e) or type(e).__name__)  # Network hiccup: try again until the deadline
+            interval = next_interval(interval)
+            await asyncio.sleep(delay if delay is not None else interval)
+        raise TimeoutError("Conversion did not finish before the deadline")
+
+    async def download(self, download_uri, output_path, file_path=None):
+        """Download into a temporary file, resuming with Range after a dropped connection, then rename into place."""
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(output_path)), prefix=".tmp-",
+                                        suffix=os.path.splitext(output_path)[1])
+        try:
+            async with self._transfer_slots:
+                with metrics.timed(metrics.DOWNLOAD, file_path) as event, os.fdopen(fd, "wb") as f:
+                    done, total = await self._fetch(download_uri, f, event)
+                    f.flush()
+                    os.fsync(f.fileno())
+            if total is not None and done != total:
+                raise IncompleteDownload(f"Received {done} of {total} bytes")
+            os.replace(tmp_path, output_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    async def _fetch(self, download_uri, f, event):
+        done, total, validator, throttles, resumes = 0, None, None, 0, 0
+        while True:
+            headers = {"Accept-Encoding": "identity"}
+            if done:
+                headers["Range"] = f"bytes={done}-"
+                if validator:
+                    # A changed object comes back whole (200) instead of being spliced onto the old bytes
+                    headers["If-Range"] = validator
+            try:
+                async with self._session.get(download_uri, headers=headers,
+                                             timeout=aiohttp.ClientTimeout(total=UPLOAD_TIMEOUT)) as response:
+                    event["http_status"] = response.status
+                    if await _wait_if_throttled(response, throttles):
+                        throttles += 1
+                        continue
+                    response.raise_for_status()
+                    if response.status != 206:
+                        # The server ignored the Range or the object changed: start over
+                        f.seek(0)
+                        f.truncate()
+                        done = 0
+                        total = response.content_length
+                    validator = response.headers.get("ETag") or response.headers.get("Last-Modified")
+                    async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+                        f.write(chunk)
+                        done += len(chunk)
+                        event["bytes"] = done
+                if total is None or done >= total:
+                    return done, total
+            except (aiohttp.ClientPayloadError, aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                if resumes == MAX_RESUMES:
+                    raise
+                print(f"Download interrupted at {done} bytes ({e}); resuming")
+            resumes += 1
+            event["resumes"] = resumes
+            if resumes > MAX_RESUMES:
+                raise IncompleteDownload(f"Received {done} of {total} bytes after {MAX_RESUMES} resumes")
+            await asyncio.sleep(min(2 ** (resumes - 1), 10))
+
+    async def convert(self, file_path, output_path=None, progress=None):
+        """Convert one PDF; returns False if the cache already had it.
+
+        ``progress(file_path, percent)`` is called between stages.
+        """
+        await self.start()
+        output_path = output_path or str(Path(file_path).with_suffix(".docx"))
+        report = progress or (lambda *args: None)
+        async with self._job_slots:
+            with metrics.timed(metrics.JOB, file_path) as event:
+                return await self._convert(file_path, output_path, report, event)
+
+    async def _convert(self, file_path, output_path, report, event):
+        loop = asyncio.get_running_loop()
+        # Fails fast on files Adobe would reject, before any request is made
+        info = await loop.run_in_executor(None, preflight.check, file_path)
+        cache = get_cache()
+        # Hashing reads the whole PDF once more than the upload does, for nothing if the cache keeps nothing
+        cache_key = await loop.run_in_executor(None, cache.key_for, file_path, "docx", info.ocr_lang) if cache.enabled else None
+        if cache_key and await loop.run_in_executor(None, cache.get, cache_key, output_path):
+            event["cached"] = True
+            report(file_path, 100)
+            return False
+        report(file_path, 10)
+        access_token = await self.get_access_token()
+        report(file_path, 30)
+        asset_id = await self.upload_pdf(access_token, file_path)
+        report(file_path, 50)
+        try:
+            job_id = await self.convert_pdf_to_docx(access_token, asset_id, file_path, info.ocr_lang)
+        except asyncio.CancelledError:
+            self.discard_asset(access_token, asset_id)
+            raise
+        report(file_path, 70)
+        download_uri = await self.poll_status(access_token, job_id, info.size, file_path, info.pages, info.needs_ocr)
+        await self.download(download_uri, output_path, file_path)
+        if cache_key:
+            await loop.run_in_executor(None, cache.put, cache_key, output_path)
+        report(file_path, 100)
+        return True
+
+    async def convert_many(self, file_paths, progress=None):
+        """Convert every file concurrently; returns {file_path: error or None}."""
+        results = await asyncio.gather(*(self.convert(path, progress=progress) for path in file_paths), return_exceptions=True)
+        return {path: result if isinstance(result, BaseException) else None for path, result in zip(file_paths, results)}
+
+
+async def _wait_if_throttled(response, attempt):
+    """Sleep out a 429/503 and return True if the request should be sent again.
+
+    aiohttp has no transport-level retries, so this stands in for the urllib3
+    Retry the threaded engine relies on.
+    """
+    if response.status not in THROTTLE_STATUSES or attempt >= MAX_THROTTLE_RETRIES:
+        return False
+    delay = retry_after_seconds(response.headers)
+    await asyncio.sleep(delay if delay is not None else min(2 ** attempt, MAX_INTERVAL))
+    return True
+
+
+async def _read_chunks(file_path):
+    loop = asyncio.get_running_loop()
+    with open(file_path, "rb") as f:
+        while True:
+            chunk = await loop.run_in_executor(None, f.read, CHUNK_SIZE)
+            if not chunk:
+                break
+            wait = upload_bandwidth.reserve(len(chunk))  # convert.py --upload-limit applies to this engine too
+            if wait:
+                await asyncio.sleep(wait)
+            yield chunk
+
+
+def run_batch(credentials, file_paths, max_jobs=DEFAULT_MAX_JOBS, max_transfers=DEFAULT_MAX_TRANSFERS, progress=None):
+    """Blocking entry point for command-line use."""
+    async def main():
+        async with AsyncConversionEngine(credentials, max_jobs, max_transfers) as engine:
+            return await engine.convert_many(list(file_paths), progress=progress)
+    return asyncio.run(main())
+
+
+class EngineThread:
+    """Own an event loop on a background thread so synchronous code (e.g. the GUI) can submit jobs."""
+
+    def __init__(self, credentials, max_jobs=DEFAULT_MAX_JOBS, max_transfers=DEFAULT_MAX_TRANSFERS):
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="async-engine", daemon=True)
+        self._thread.start()
+        self.engine = AsyncConversionEngine(credentials, max_jobs, max_transfers)
+        self._futures = set()
+        self._lock = threading.Lock()
+
+    def submit(self, file_path, output_path=None, progress=None):
+        """Schedule a conversion; returns a concurrent.futures.Future resolving to ``convert``'s result."""
+        future = asyncio.run_coroutine_threadsafe(self.engine.convert(file_path, output_path, progress), self._loop)
+        with self._lock:
+            self._futures.add(future)
+        future.add_done_callback(self._forget)
+        return future
+
+    def cancel_all(self):
+        with self._lock:
+            futures = list(self._futures)
+        for future in futures:
+            future.cancel()
+
+    def close(self):
+        self.cancel_all()
+        asyncio.run_coroutine_threadsafe(self.engine.close(), self._loop).result(timeout=10)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=10)
+
+    def _forget(self, future):
+        with self._lock:
+            self._futures.discard(future)
@@ -0,0 +1,473 @@
+import argparse
+import asyncio
+import contextlib
+import functools
+import importlib
+import io
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from mock_adobe_server import MockAdobeServer, MockSettings
+
+BENCH_CREDENTIALS = {"client_credentials": {"client_id": "benchmark", "client_secret": "benchmark"}}
+SAMPLE_INTERVAL = 0.05
+# --startup: budgets a run must stay within, in seconds from process start
+FIRST_PAINT_BUDGET = 1.5
+FIRST_UPLOAD_BUDGET = 3.0
+STARTUP_TIMEOUT = 60
+STARTUP_PDF_SIZE = 100 * 1024
+
+
+def make_pdf(path, size):
+    """Write a small but structurally valid PDF padded with random bytes to about ``size`` bytes."""
+    padding = os.urandom(max(size - 600, 0))
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents 4 0 R >>",
+        b"<< /Length " + str(len(padding)).encode() + b" >>\nstream\n" + padding + b"\nendstream",
+    ]
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n".encode() + body + b"\nendobj\n"
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    for offset in offsets:
+        out += f"{offset:010d} 00000 n \n".encode()
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    with open(path, "wb") as f:
+        f.write(out)
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(int(round(pct / 100 * (len(ordered) - 1))), len(ordered) - 1)]
+
+
+def current_rss():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+    except ImportError:  # Windows has no resource module
+        return None
+    # ru_maxrss is KB on Linux and bytes on macOS; either way it is a lifetime peak
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == "darwin" else 1024)
+
+
+class ResourceSampler:
+    """Track peak RSS and thread count on a background thread while a run is in progress."""
+
+    def __init__(self):
+        self.peak_rss = 0
+        self.peak_threads = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            self.peak_rss = max(self.peak_rss, current_rss() or 0)
+            self.peak_threads = max(self.peak_threads, threading.active_count())
+            if self._stop.wait(SAMPLE_INTERVAL):
+                return
+
+
+class StageTimer:
+    """Wrap stage functions so every call records its wall time under a stage name."""
+
+    def __init__(self):
+        self.samples = {}
+        self._lock = threading.Lock()
+        self._patches = []
+
+    def add(self, stage, seconds):
+        with self._lock:
+            self.samples.setdefault(stage, []).append(seconds)
+
+    def wrap(self, owner, name, stage):
+        original = getattr(owner, name)
+        if asyncio.iscoroutinefunction(original):
+            @functools.wraps(original)
+            async def timed(*args, **kwargs):
+                started = time.monotonic()
+                try:
+                    return await original(*args, **kwargs)
+                finally:
+                    self.add(stage, time.monotonic() - started)
+        else:
+            @functools.wraps(original)
+            def timed(*args, **kwargs):
+                started = time.monotonic()
+                try:
+                    return original(*args, **kwargs)
+                finally:
+                    self.add(stage, time.monotonic() - started)
+        setattr(owner, name, timed)
+        self._patches.append((owner, name, original))
+
+    def restore(self):
+        for owner, name, original in reversed(self._patches):
+            setattr(owner, name, original)
+        self._patches.clear()
+
+
+def run_threads(files, jobs, timer, record):
+    import convert
+    for name, stage in (("get_access_token", "token"), ("upload_pdf", "upload"), ("convert_pdf_to_docx", "submit"),
+                        ("poll_for_result", "poll"), ("download_result", "download")):
+        timer.wrap(convert, name, stage)
+
+    report = convert.BatchReport()
+    original_record = report.record
+
+    def record_with_timing(file_path, output_path, status, started, error=None):
+        record(time.monotonic() - started, status != convert.FAILED)
+        original_record(file_path, output_path, status, started, error)
+    report.record = record_with_timing
+    convert.run_batch([(Path(path), Path(path).with_suffix(".docx")) for path in files], jobs, report)
+
+
+def run_pipeline(files, jobs, timer, record):
+    import convert
+    # Polling happens on the shared poller here, so only the threaded stages are timed
+    for name, stage in (("get_access_token", "token"), ("upload_pdf", "upload"), ("convert_pdf_to_docx", "submit"),
+                        ("download_result", "download")):
+        timer.wrap(convert, name, stage)
+
+    report = convert.BatchReport()
+    original_record = report.record
+
+    def record_with_timing(file_path, output_path, status, started, error=None):
+        record(time.monotonic() - started, status != convert.FAILED)
+        original_record(file_path, output_path, status, started, error)
+    report.record = record_with_timing
+    tasks = [(Path(path), Path(path).with_suffix(".docx")) for path in files]
+    convert.run_batch_pipelined(tasks, report, upload_workers=jobs, submit_workers=jobs, download_workers=jobs)
+
+
+def run_async(files, jobs, timer, record):
+    import async_engine
+    for name, stage in (("get_access_token", "token"), ("upload_pdf", "upload"), ("convert_pdf_to_docx", "submit"),
+                        ("poll_status", "poll"), ("download", "download")):
+        timer.wrap(async_engine.AsyncConversionEngine, name, stage)
+
+    async def run_all():
+        async with async_engine.AsyncConversionEngine(BENCH_CREDENTIALS, max_jobs=jobs) as engine:
+            async def one(path):
+                started = time.monotonic()
+                try:
+                    await engine.convert(path)
+                    record(time.monotonic() - started, True)
+                except Exception:
+                    record(time.monotonic() - started, False)
+            await asyncio.gather(*(one(path) for path in files))
+    asyncio.run(run_all())
+
+
+def run_gui_worker(files, jobs, timer, record):
+    from PyQt5.QtCore import Qt
+    from gui import ConversionWorker
+    from scheduler import JobScheduler
+    for name, stage in (("get_access_token", "token"), ("upload_pdf", "upload"), ("convert_pdf_to_docx", "submit"),
+                        ("poll_for_result", "poll"), ("download_result", "download")):
+        timer.wrap(ConversionWorker, name, stage)
+
+    scheduler = JobScheduler(max_workers=jobs)
+    workers = []
+    for path in files:
+        worker = ConversionWorker(path, BENCH_CREDENTIALS)
+        started = {}
+
+        def on_finished(file_path, success, message, started=started):
+            record(time.monotonic() - started["at"], success)
+        # No Qt event loop runs here, so deliver the signal on the emitting thread
+        worker.finished.connect(on_finished, Qt.DirectConnection)
+
+        def run(worker=worker, started=started):
+            started["at"] = time.monotonic()
+            worker.run()
+        workers.append(worker)
+        scheduler.submit(path, run)
+    scheduler.wait()
+    scheduler.shutdown()
+
+
+MODES = {"threads": run_threads, "pipeline": run_pipeline, "async": run_async, "gui": run_gui_worker}
+
+
+def run_case(mode, size, batch, jobs, workdir):
+    run_dir = tempfile.mkdtemp(dir=workdir)
+    files = []
+    for index in range(batch):
+        path = os.path.join(run_dir, f"file{index:05d}.pdf")
+        make_pdf(path, size)
+        files.append(path)
+
+    latencies = []
+    failures = [0]
+    lock = threading.Lock()
+
+    def record(seconds, ok):
+        with lock:
+            latencies.append(seconds)
+            if not ok:
+                failures[0] += 1
+
+    timer = StageTimer()
+    started = time.monotonic()
+    try:
+        # The pipeline prints per-file progress; keep it out of the results table
+        with ResourceSampler() as sampler, contextlib.redirect_stdout(io.StringIO()):
+            MODES[mode](files, jobs, timer, record)
+    finally:
+        timer.restore()
+    elapsed = time.monotonic() - started
+    shutil.rmtree(run_dir, ignore_errors=True)
+
+    return {
+        "mode": mode,
+        "size_bytes": size,
+        "batch": batch,
+        "jobs": jobs,
+        "seconds": round(elapsed, 3),
+        "files_per_sec": round(batch / elapsed, 3) if elapsed else None,
+        "failures": failures[0],
+        "latency": {f"p{pct}": percentile(latencies, pct) for pct in (50, 95, 99)},
+        "stages": {stage: {f"p{pct}": percentile(values, pct) for pct in (50, 95, 99)} for stage, values in timer.samples.items()},
+        "peak_rss_mb": round(sampler.peak_rss / (1024 * 1024), 1),
+        "peak_threads": sampler.peak_threads,
+    }
+
+
+def format_row(result):
+    def ms(value):
+        return "-" if value is None else f"{value * 1000:.0f}"
+    stages = " ".join(f"{stage}={ms(values['p50'])}" for stage, values in result["stages"].items())
+    return (f"{result['mode']:<8} {result['size_bytes'] / 1024:>8.0f}KB {result['batch']:>6} {result['jobs']:>4} "
+            f"{result['files_per_sec']:>8.2f} {ms(result['latency']['p50']):>7} {ms(result['latency']['p95']):>7} "
+            f"{ms(result['latency']['p99']):>7} {result['peak_rss_mb']:>7} {result['peak_threads']:>7} "
+            f"{result['failures']:>5}  {stages}")
+
+
+def startup_env(url, run_dir):
+    """A child process environment pointed at the mock, with no state or settings shared with the user's own"""
+    env = dict(
+        os.environ, ADOBE_IMS_URL=url, ADOBE_PDF_SERVICES_URL=url,
+        PDF_SERVICES_CLIENT_ID=BENCH_CREDENTIALS["client_credentials"]["client_id"],
+        PDF_SERVICES_CLIENT_SECRET=BENCH_CREDENTIALS["client_credentials"]["client_secret"],
+        PDF2WORD_CONFIG=os.path.join(run_dir, "config.json"), PDF2WORD_CACHE_DIR=os.path.join(run_dir, "cache"),
+        PDF2WORD_JOURNAL=os.path.join(run_dir, "journal.sqlite3"), PDF2WORD_RATELIMIT_STATE=os.path.join(run_dir, "ratelimit.json"),
+        XDG_CONFIG_HOME=run_dir  # Where QSettings keeps the GUI's saved key path and options
+    )
+    env.pop("PDFSERVICES_CREDENTIALS", None)
+    if sys.platform.startswith("linux") and not os.environ.get("DISPLAY"):
+        env.setdefault("QT_QPA_PLATFORM", "offscreen")
+    return env
+
+
+def probe_gui(paint_path, pdf_path):
+    """Child process of --startup: open the window, note when it first paints, then press Start at once."""
+    from PyQt5.QtCore import QEvent, QObject, QTimer
+    from PyQt5.QtWidgets import QApplication
+    app = QApplication(sys.argv)
+    app.setStyle("Fusion")
+    import gui
+    window = gui.MainWindow()
+
+    class FirstPaint(QObject):
+        def eventFilter(self, watched, event):
+            if event.type() == QEvent.Paint:
+                with open(paint_path, "w") as f:
+                    f.write(repr(time.time()))
+                window.removeEventFilter(self)
+                window.add_files([pdf_path])
+                QTimer.singleShot(0, window.start_conversion)
+            return False
+
+    first_paint = FirstPaint()
+    window.installEventFilter(first_paint)
+    window.show()
+    app.exec_()
+
+
+def run_startup(mode, settings, workdir):
+    """Seconds from launching gui.py or convert.py to its first paint (GUI only) and its first upload request"""
+    run_dir = tempfile.mkdtemp(dir=workdir)
+    pdf_path = os.path.join(run_dir, "startup.pdf")
+    make_pdf(pdf_path, STARTUP_PDF_SIZE)
+    paint_path = os.path.join(run_dir, "first-paint")
+    here = os.path.dirname(os.path.abspath(__file__))
+    if mode == "gui":
+        command = [sys.executable, os.path.join(here, "benchmark.py"), "--startup-probe", paint_path, pdf_path]
+    else:
+        command = [sys.executable, os.path.join(here, "convert.py"), pdf_path, "-o", os.path.join(run_dir, "out")]
+    with MockAdobeServer(settings=settings) as server:
+        started = time.time()
+        process = subprocess.Popen(command, env=startup_env(server.url, run_dir), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            while "upload" not in server.state.first_request and process.poll() is None and time.time() - started < STARTUP_TIMEOUT:
+                time.sleep(0.005)
+        finally:
+            process.kill()
+            process.wait()
+        first_upload = server.state.first_request.get("upload")
+    first_paint = None
+    if os.path.exists(paint_path):
+        with open(paint_path) as f:
+            first_paint = float(f.read()) - started
+    shutil.rmtree(run_dir, ignore_errors=True)
+    return {"mode": mode, "first_paint": first_paint, "first_upload": first_upload - started if first_upload else None}
+
+
+def report_startup(results, paint_budget, upload_budget):
+    """Print p50/max per mode; returns the measurements that were missing or over budget"""
+    def s(value):
+        return "-" if value is None else f"{value:.3f}"
+    print(f"{'mode':<8} {'runs':>4} {'paint p50':>10} {'paint max':>10} {'upload p50':>11} {'upload max':>11}")
+    over = []
+    for mode in dict.fromkeys(result["mode"] for result in results):
+        runs = [result for result in results if result["mode"] == mode]
+        row = [f"{mode:<8} {len(runs):>4}"]
+        for measure, budget, width in (("first_paint", paint_budget, 10), ("first_upload", upload_budget, 11)):
+            values = [result[measure] for result in runs]
+            if mode != "gui" and measure == "first_paint":
+                row.append(f"{'-':>{width}} {'-':>{width}}")
+                continue
+            if None in values:
+                over.append(f"{mode} {measure}: not reached within {STARTUP_TIMEOUT}s")
+                values = [value for value in values if value is not None]
+            row.append(f"{s(percentile(values, 50)):>{width}} {s(max(values, default=None)):>{width}}")
+            if values and max(values) > budget:
+                over.append(f"{mode} {measure}: {max(values):.3f}s > {budget}s")
+        print(" ".join(row))
+    return over
+
+
+def parse_list(value, cast):
+    return [cast(item) for item in value.split(",") if item]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the conversion pipeline against a local mock Adobe API.")
+    parser.add_argument("--modes", default="threads", help="comma-separated: threads, pipeline, async, gui (default: threads)")
+    parser.add_argument("--sizes", default="0.1,1", help="file sizes in MB (default: 0.1,1)")
+    parser.add_argument("--batches", default="10,50", help="batch sizes (default: 10,50)")
+    parser.add_argument("--jobs", default="4", help="concurrency levels (default: 4)")
+    parser.add_argument("--latency", type=float, default=0.02, help="mock per-request latency in seconds")
+    parser.add_argument("--conversion-median", type=float, default=1.0, help="mock median conversion time in seconds")
+    parser.add_argument("--conversion-per-mb", type=float, default=0.2, help="mock extra conversion seconds per MB")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of mock responses that are 500s")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="fraction of mock responses that are 429s")
+    parser.add_argument("--bandwidth", type=float, help="mock per-transfer bandwidth cap in MB/s")
+    parser.add_argument("--drop-rate", type=float, default=0.0, help="fraction of mock downloads cut off halfway")
+    parser.add_argument("--poll-min-interval", type=float, help="override poller.MIN_INTERVAL")
+    parser.add_argument("--poll-max-interval", type=float, help="override poller.MAX_INTERVAL")
+    parser.add_argument("--first-poll-delay", type=float, help="override poller.FIRST_POLL_DELAY")
+    parser.add_argument("--chunk-size", type=int, help="override the smallest (starting) download buffer in bytes")
+    parser.add_argument("--json", help="also write all results to this JSON file")
+    parser.add_argument("--startup", action="store_true",
+                        help="measure startup instead: time to first paint (GUI) and to first upload (GUI and CLI)")
+    parser.add_argument("--startup-runs", type=int, default=5, help="launches per mode for --startup (default: 5)")
+    parser.add_argument("--max-first-paint", type=float, default=FIRST_PAINT_BUDGET,
+                        help="--startup: fail if the GUI takes longer to first paint, in seconds (default: %(default)s)")
+    parser.add_argument("--max-first-upload", type=float, default=FIRST_UPLOAD_BUDGET,
+                        help="--startup: fail if the first upload starts later, in seconds (default: %(default)s)")
+    parser.add_argument("--startup-probe", nargs=2, metavar=("PAINT_FILE", "PDF"), help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    if args.startup_probe:
+        return probe_gui(*args.startup_probe)
+
+    settings = MockSettings(
+        latency=args.latency, conversion_median=args.conversion_median, conversion_per_mb=args.conversion_per_mb,
+        error_rate=args.error_rate, throttle_rate=args.throttle_rate, drop_rate=args.drop_rate,
+        bandwidth=args.bandwidth * 1024 * 1024 if args.bandwidth else None
+    )
+    workdir = tempfile.mkdtemp(prefix="pdf2word-bench-")
+    if args.startup:
+        modes = [mode for mode in parse_list(args.modes, str) if mode in ("gui", "cli")] or ["gui", "cli"]
+        try:
+            results = [run_startup(mode, settings, workdir) for mode in modes for _ in range(args.startup_runs)]
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+        over = report_startup(results, args.max_first_paint, args.max_first_upload)
+        if args.json:
+            with open(args.json, "w") as f:
+                json.dump(results, f, indent=2)
+        for problem in over:
+            print(f"Over budget: {problem}")
+        sys.exit(1 if over else 0)
+    server = MockAdobeServer(settings=settings)
+    url = server.start()
+    # Point every client at the mock and keep cache/journal state out of the user's home directory
+    os.environ["ADOBE_IMS_URL"] = url
+    os.environ["ADOBE_PDF_SERVICES_URL"] = url
+    os.environ["PDF2WORD_CACHE_DIR"] = os.path.join(workdir, "cache")
+    os.environ["PDF2WORD_JOURNAL"] = os.path.join(workdir, "journal.sqlite3")
+    os.environ["PDF2WORD_RATELIMIT_STATE"] = os.path.join(workdir, "ratelimit.json")
+
+    import config
+    import poller
+    config.set_credentials(BENCH_CREDENTIALS)
+    if args.poll_min_interval is not None:
+        poller.MIN_INTERVAL = args.poll_min_interval
+    if args.poll_max_interval is not None:
+        poller.MAX_INTERVAL = args.poll_max_interval
+    if args.first_poll_delay is not None:
+        poller.FIRST_POLL_DELAY = args.first_poll_delay
+    if args.chunk_size:
+        # Optional modules (aiohttp, PyQt5) are only tuned when they can be imported
+        for module_name, attribute in (("transfer", "MIN_CHUNK_SIZE"), ("async_engine", "CHUNK_SIZE")):
+            try:
+                setattr(importlib.import_module(module_name), attribute, args.chunk_size)
+            except ImportError:
+                pass
+
+    results = []
+    print(f"{'mode':<8} {'size':>10} {'batch':>6} {'jobs':>4} {'files/s':>8} {'p50ms':>7} {'p95ms':>7} {'p99ms':>7} "
+          f"{'rssMB':>7} {'threads':>7} {'fail':>5}  stage p50 ms")
+    try:
+        for mode in parse_list(args.modes, str):
+            for size_mb in parse_list(args.sizes, float):
+                for batch in parse_list(args.batches, int):
+                    for jobs in parse_list(args.jobs, int):
+                        try:
+                            result = run_case(mode, int(size_mb * 1024 * 1024), batch, jobs, workdir)
+                        except ImportError as e:
+                            print(f"{mode:<8} skipped: {e}")
+                            break
+                        results.append(result)
+                        print(format_row(result))
+    finally:
+        server.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"Mock server: {json.dumps(server.state.stats())}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
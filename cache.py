@@ -0,0 +1,173 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from ratelimit import lock_file, unlock_file
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "pdf-to-word")
+DEFAULT_MAX_BYTES = 1024 * 1024 * 1024  # 1 GB
+HASH_CHUNK_SIZE = 1024 * 1024
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def _atomic_copy(source, destination):
+    # Copy next to the destination first so readers never see a half-written file
+    directory = os.path.dirname(os.path.abspath(destination))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+    os.close(fd)
+    try:
+        shutil.copyfile(source, tmp_path)
+        os.replace(tmp_path, destination)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+class ConversionCache:
+    """On-disk cache of converted documents keyed by PDF content and conversion parameters.
+
+    Entries live under ``objects/`` and are tracked in ``index.json``, which is
+    rewritten atomically on every change. Every change re-reads the index under
+    an OS file lock first, so processes sharing the directory merge their
+    entries instead of overwriting each other's. When the total size exceeds
+    ``max_bytes`` the least recently used entries are evicted, whichever
+    process added them.
+    """
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._index_path = os.path.join(directory, "index.json")
+        self._lock_path = self._index_path + ".lock"
+        os.makedirs(os.path.join(directory, "objects"), exist_ok=True)
+        self._index = self._load_index()
+
+    @property
+    def enabled(self):
+        """False when max_bytes is 0, so nothing is ever stored and hashing a file to look it up is wasted I/O."""
+        return self.max_bytes > 0
+
+    @staticmethod
+    def key_for(file_path, target_format="docx", ocr_lang="en-US"):
+        """SHA-256 of the PDF bytes plus the parameters that change the output."""
+        return ConversionCache.key_for_digest(ConversionCache.file_digest(file_path), target_format, ocr_lang)
+
+    @staticmethod
+    def file_digest(file_path):
+        """SHA-256 of the PDF bytes; hash once and use key_for_digest when keying several formats."""
+        digest = hashlib.sha256()
+        with open(file_path, "rb") as f:
+            for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    @staticmethod
+    def key_for_digest(pdf_sha256, target_format="docx", ocr_lang="en-US"):
+        params = json.dumps({"targetFormat": target_format, "ocrLang": ocr_lang}, sort_keys=True)
+        return hashlib.sha256(f"{pdf_sha256}:{params}".encode()).hexdigest()
+
+    def get(self, key, output_path):
+        """Materialize the cached result at output_path; returns False on a miss."""
+        object_path = self._object_path(key)
+        with self._shared_index() as index:
+            entry = index.get(key)
+            if entry is None or not os.path.exists(object_path):
+                index.pop(key, None)
+                self.misses += 1
+                return False
+            entry["last_access"] = time.time()
+        try:
+            _atomic_copy(object_path, output_path)
+        except FileNotFoundError:
+            if os.path.exists(object_path):
+                raise  # The destination's directory is missing
+            with self._lock:
+                self.misses += 1  # Evicted by another process in the meantime
+            return False
+        with self._lock:
+            self.hits += 1
+        return True
+
+    def put(self, key, source_path):
+        """Store a freshly converted file, evicting old entries to stay under max_bytes."""
+        size = os.path.getsize(source_path)
+        if size > self.max_bytes:
+            return
+        object_path = self._object_path(key)
+        os.makedirs(os.path.dirname(object_path), exist_ok=True)
+        _atomic_copy(source_path, object_path)
+        with self._shared_index() as index:
+            index[key] = {"size": size, "last_access": time.time()}
+            self._evict()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self._index),
+                "bytes": sum(entry["size"] for entry in self._index.values())
+            }
+
+    def _object_path(self, key):
+        return os.path.join(self.directory, "objects", key[:2], key)
+
+    @contextmanager
+    def _shared_index(self):
+        """The index fresh from disk, held under this process's lock and the OS file lock; saved on success."""
+        with self._lock, open(self._lock_path, "a+b") as f:
+            lock_file(f)
+            try:
+                self._index = self._load_index()
+                yield self._index
+                self._save_index()
+            finally:
+                unlock_file(f)
+
+    def _evict(self):
+        # Called inside _shared_index
+        total = sum(entry["size"] for entry in self._index.values())
+        for key, entry in sorted(self._index.items(), key=lambda item: item[1]["last_access"]):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(self._object_path(key))
+            except FileNotFoundError:
+                pass
+            total -= entry["size"]
+            del self._index[key]
+
+    def _load_index(self):
+        try:
+            with open(self._index_path, "r") as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def _save_index(self):
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix=".index-")
+        with os.fdopen(fd, "w") as f:
+            json.dump(self._index, f)
+        os.replace(tmp_path, self._index_path)
+
+
+def get_cache():
+    """Return the shared cache, configured by PDF2WORD_CACHE_DIR / PDF2WORD_CACHE_MAX_MB (0 disables it)."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            directory = os.environ.get("PDF2WORD_CACHE_DIR", DEFAULT_CACHE_DIR)
+            max_mb = os.environ.get("PDF2WORD_CACHE_MAX_MB")
+            max_bytes = int(max_mb) * 1024 * 1024 if max_mb else DEFAULT_MAX_BYTES
+            _cache = ConversionCache(directory, max_bytes)
+        return _cache
@@ -0,0 +1,594 @@
+import hmac
+import ipaddress
+import json
+import os
+import re
+import secrets
+import socket
+import sqlite3
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+import requests
+import config
+import ratelimit
+import tokens
+from journal import get_journal, stage_reached, STAGES
+from scheduler import JobScheduler, DEFAULT_MAX_WORKERS
+
+DEFAULT_PORT = 8770
+DEFAULT_QUEUE_PATH = os.path.join(os.path.expanduser("~"), ".cache", "pdf-to-word", "queue.sqlite3")
+SECRET_ENV = "PDF2WORD_CLUSTER_SECRET"
+
+LEASE_SECONDS = 60  # A job whose worker has not been heard from for this long goes back in the queue
+HEARTBEAT_INTERVAL = 15
+MAX_ATTEMPTS = 3  # Leases per job before it is failed rather than handed out again
+IDLE_POLL = 2.0  # Seconds between lease requests while the queue is empty
+DRAIN_GRACE = 2 * IDLE_POLL  # A finished coordinator stays up this long so idle workers hear that it is done
+UNREACHABLE_AFTER = LEASE_SECONDS  # A worker gives up once the coordinator has been silent this long
+REQUEST_TIMEOUT = 10
+
+# Queue states
+QUEUED = "queued"
+LEASED = "leased"
+DONE = "done"
+FAILED = "failed"
+STATES = (QUEUED, LEASED, DONE, FAILED)
+
+_HANDLES = ("output_path", "asset_id", "job_id", "download_uri", "options")  # What a job's stages carry from worker to worker
+_JOB_COLUMNS = ("id", "file_path", "output_path", "formats", "state", "worker", "lease_expires", "attempts",
+                "status", "error", "stages", "updated_at")
+
+
+class JobQueue:
+    """Durable SQLite queue of files for cluster workers to convert.
+
+    Workers lease jobs for ``lease_seconds`` and extend the lease by heartbeat;
+    a job whose lease runs out goes back to the queue, up to ``max_attempts``
+    leases. Workers report each journaled stage, so the next lease of a job
+    carries the assetID, job ID and download URI needed to resume where the
+    last worker stopped. Re-queueing a finished file starts it over.
+    """
+
+    def __init__(self, path=DEFAULT_QUEUE_PATH, lease_seconds=LEASE_SECONDS, max_attempts=MAX_ATTEMPTS):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS queue (
+                id INTEGER PRIMARY KEY,
+                file_path TEXT NOT NULL,
+                output_path TEXT NOT NULL,
+                formats TEXT NOT NULL,
+                state TEXT NOT NULL,
+                worker TEXT,
+                lease_expires REAL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                status TEXT,
+                error TEXT,
+                stages TEXT NOT NULL DEFAULT '{}',
+                updated_at REAL,
+                UNIQUE (file_path, output_path)
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS queue_state ON queue (state, id)")
+
+    def enqueue(self, file_path, output_path, formats):
+        """Queue a file unless it is already queued or leased; returns its job ID."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO queue (file_path, output_path, formats, state, updated_at) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (file_path, output_path) DO UPDATE SET formats = excluded.formats, state = excluded.state, "
+                "worker = NULL, lease_expires = NULL, attempts = 0, status = NULL, error = NULL, stages = '{}', "
+                "updated_at = excluded.updated_at WHERE state IN (?, ?)",
+                (file_path, output_path, ",".join(formats), QUEUED, now, DONE, FAILED)
+            )
+            row = self._conn.execute("SELECT id FROM queue WHERE file_path = ? AND output_path = ?",
+                                     (file_path, output_path)).fetchone()
+        return row[0]
+
+    def lease(self, worker, count):
+        """Hand up to count queued jobs to worker, oldest first."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                ids = [row[0] for row in self._conn.execute(
+                    "SELECT id FROM queue WHERE state = ? ORDER BY id LIMIT ?", (QUEUED, max(int(count), 0))
+                )]
+                self._conn.executemany(
+                    "UPDATE queue SET state = ?, worker = ?, lease_expires = ?, attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                    [(LEASED, worker, now + self.lease_seconds, now, job_id) for job_id in ids]
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return [self.get(job_id) for job_id in ids]
+
+    def heartbeat(self, worker, ids):
+        """Extend worker's leases; returns the IDs it no longer holds."""
+        now = time.time()
+        lost = []
+        with self._lock:
+            for job_id in ids:
+                cursor = self._conn.execute(
+                    "UPDATE queue SET lease_expires = ? WHERE id = ? AND worker = ? AND state = ?",
+                    (now + self.lease_seconds, job_id, worker, LEASED)
+                )
+                if not cursor.rowcount:
+                    lost.append(job_id)
+        return lost
+
+    def report(self, worker, job_id, target_format, stage, fields):
+        """Merge one journaled stage into the job; ignored unless worker still holds the lease."""
+        with self._lock:
+            row = self._conn.execute("SELECT stages FROM queue WHERE id = ? AND worker = ? AND state = ?",
+                                     (job_id, worker, LEASED)).fetchone()
+            if row is None:
+                return False
+            stages = json.loads(row[0])
+            # A worker starts over from TOKEN when its remote handles have expired, dropping the old ones
+            entry = stages[target_format] = {} if stage == STAGES[0] else stages.get(target_format, {})
+            entry["stage"] = stage
+            entry.update((name, value) for name, value in fields.items() if name in _HANDLES)
+            self._conn.execute("UPDATE queue SET stages = ?, updated_at = ? WHERE id = ?", (json.dumps(stages), time.time(), job_id))
+        return True
+
+    def complete(self, worker, job_id, status, error=None):
+        """Finish a leased job; returns it, or None if worker no longer held the lease."""
+        state = FAILED if status == FAILED else DONE
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE queue SET state = ?, status = ?, error = ?, lease_expires = NULL, updated_at = ? "
+                "WHERE id = ? AND worker = ? AND state = ?",
+                (state, status, error, time.time(), job_id, worker, LEASED)
+            )
+            if not cursor.rowcount:
+                return None
+        return self.get(job_id)
+
+    def requeue_expired(self):
+        """Return lapsed leases to the queue; returns the jobs failed for running out of attempts."""
+        now = time.time()
+        with self._lock:
+            expired = [row[0] for row in self._conn.execute(
+                "SELECT id FROM queue WHERE state = ? AND lease_expires < ? AND attempts >= ?", (LEASED, now, self.max_attempts)
+            )]
+            self._conn.execute(
+                "UPDATE queue SET state = ?, status = ?, error = ?, lease_expires = NULL, updated_at = ? "
+                "WHERE state = ? AND lease_expires < ? AND attempts >= ?",
+                (FAILED, FAILED, f"Lease expired {self.max_attempts} times", now, LEASED, now, self.max_attempts)
+            )
+            self._conn.execute(
+                "UPDATE queue SET state = ?, worker = NULL, lease_expires = NULL, updated_at = ? WHERE state = ? AND lease_expires < ?",
+                (QUEUED, now, LEASED, now)
+            )
+        return [self.get(job_id) for job_id in expired]
+
+    def get(self, job_id):
+        with self._lock:
+            row = self._conn.execute(f"SELECT {', '.join(_JOB_COLUMNS)} FROM queue WHERE id = ?", (job_id,)).fetchone()
+        return _job(row) if row else None
+
+    def jobs(self, limit=1000):
+        """Most recently updated jobs first."""
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {', '.join(_JOB_COLUMNS)} FROM queue ORDER BY updated_at DESC LIMIT ?", (limit,)
+            ).fetchall()
+        return [_job(row) for row in rows]
+
+    def counts(self):
+        with self._lock:
+            counts = dict(self._conn.execute("SELECT state, COUNT(*) FROM queue GROUP BY state").fetchall())
+        return {state: counts.get(state, 0) for state in STATES}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def _job(row):
+    job = dict(zip(_JOB_COLUMNS, row))
+    job["formats"] = job["formats"].split(",")
+    job["stages"] = json.loads(job["stages"])
+    return job
+
+
+def is_loopback(host):
+    """Whether host only accepts connections from this machine; "" and 0.0.0.0 listen everywhere."""
+    if not host:
+        return False
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        pass  # A name
+    try:
+        return ipaddress.ip_address(socket.gethostbyname(host)).is_loopback
+    except OSError:
+        return False
+
+
+class Coordinator:
+    """Serve a JobQueue to cluster workers over HTTP, along with the tokens and request budgets they share.
+
+    Workers never see the client secret: they borrow the coordinator's IMS
+    token, and draw every API request from the coordinator's rate limiter, so
+    the cluster as a whole stays within one quota. ``on_complete(job)`` runs
+    for each job that finishes or fails. Without a ``secret`` anyone who can
+    reach the port can borrow tokens, so it listens on localhost unless told
+    otherwise, and one listening beyond it makes up a secret of its own
+    (``generated_secret`` is then True).
+    """
+
+    def __init__(self, queue, credentials, host="127.0.0.1", port=DEFAULT_PORT, secret=None, on_complete=None):
+        self.queue = queue
+        self.credentials = credentials
+        self.generated_secret = not secret and not is_loopback(host)
+        self.secret = secrets.token_urlsafe(24) if self.generated_secret else secret
+        self.on_complete = on_complete
+        self.limiter = ratelimit.get_limiter()
+        self.workers = {}  # name -> {"last_seen", "leased", "done", "failed"}
+        self._lock = threading.Lock()
+        self._finishing = threading.Event()
+        self._changed = threading.Condition()
+        handler = type("BoundCoordinatorHandler", (CoordinatorHandler,), {"coordinator": self})
+        self.httpd = ThreadingHTTPServer((host, port), handler)
+        self.httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="coordinator", daemon=True)
+        self._thread.start()
+        return self.url
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def finish(self):
+        """No more files are coming: workers are told to exit once the queue has drained."""
+        self._finishing.set()
+        self._notify()
+
+    def drained(self):
+        counts = self.queue.counts()
+        return self._finishing.is_set() and not counts[QUEUED] and not counts[LEASED]
+
+    def wait(self, interval=IDLE_POLL):
+        """Block until finish() has been called and every job has completed."""
+        while True:
+            self._expire()
+            if self.drained():
+                return
+            with self._changed:
+                self._changed.wait(interval)
+
+    def status(self):
+        self._expire()
+        now = time.time()
+        with self._lock:
+            workers = {name: dict(info, idle=round(now - info["last_seen"], 1)) for name, info in self.workers.items()}
+        return {"counts": self.queue.counts(), "workers": workers, "jobs": self.queue.jobs(),
+                "drained": self.drained(), "limits": self.limiter.snapshot()}
+
+    def lease(self, worker, count):
+        self._expire()
+        jobs = self.queue.lease(worker, count)
+        self._seen(worker, leased=len(jobs))
+        return {"jobs": jobs, "lease_seconds": self.queue.lease_seconds, "drained": not jobs and self.drained()}
+
+    def heartbeat(self, worker, ids):
+        self._seen(worker)
+        return {"lost": self.queue.heartbeat(worker, ids)}
+
+    def report(self, worker, job_id, target_format, stage, fields):
+        if stage not in STAGES:
+            raise ValueError(f"Unknown stage: {stage}")
+        self._seen(worker)
+        return {"accepted": self.queue.report(worker, job_id, target_format, stage, fields)}
+
+    def complete(self, worker, job_id, status, error=None):
+        job = self.queue.complete(worker, job_id, status, error)
+        self._seen(worker)
+        if job:
+            self._seen(worker, **{FAILED if status == FAILED else DONE: 1})
+            self._completed(job)
+        return {"accepted": job is not None}
+
+    def token(self):
+        access_token, expires_at = tokens.get_token_provider(self.credentials).get_token_with_expiry()
+        # Relative expiry, since the workers' clocks need not agree with this one
+        return {"access_token": access_token, "expires_in": max(expires_at - time.time(), 0),
+                "client_id": self.credentials["client_credentials"]["client_id"]}
+
+    def reserve(self, bucket):
+        return {"wait": self.limiter.reserve(bucket)}
+
+    def feedback(self, bucket, status_code, retry_after=None, retried=()):
+        headers = {"Retry-After": str(retry_after)} if retry_after is not None else {}
+        retries = [SimpleNamespace(status=status) for status in retried]
+        return {"throttled": self.limiter.feedback(bucket, status_code, headers, retries)}
+
+    def _expire(self):
+        for job in self.queue.requeue_expired():
+            self._completed(job)
+
+    def _completed(self, job):
+        if self.on_complete:
+            try:
+                self.on_complete(job)
+            except Exception as e:
+                print(f"Coordinator completion callback error: {e}")
+        self._notify()
+
+    def _notify(self):
+        with self._changed:
+            self._changed.notify_all()
+
+    def _seen(self, worker, **counts):
+        with self._lock:
+            info = self.workers.setdefault(worker, {"last_seen": 0, "leased": 0, "done": 0, "failed": 0})
+            info["last_seen"] = time.time()
+            for name, count in counts.items():
+                info[name] += count
+
+
+class CoordinatorHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    coordinator = None  # Set per server by Coordinator
+
+    ROUTES = [
+        ("GET", re.compile(r"^/status$"), "status"),
+        ("POST", re.compile(r"^/lease$"), "lease"),
+        ("POST", re.compile(r"^/heartbeat$"), "heartbeat"),
+        ("POST", re.compile(r"^/report$"), "report"),
+        ("POST", re.compile(r"^/complete$"), "complete"),
+        ("POST", re.compile(r"^/token$"), "token"),
+        ("POST", re.compile(r"^/ratelimit/reserve$"), "reserve"),
+        ("POST", re.compile(r"^/ratelimit/feedback$"), "feedback"),
+    ]
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self.dispatch("GET")
+
+    def do_POST(self):
+        self.dispatch("POST")
+
+    def dispatch(self, method):
+        path = self.path.split("?", 1)[0]
+        try:
+            payload = self.json_body()
+        except ValueError:
+            return self.send_json(400, {"error": "Body is not JSON"})
+        secret = self.coordinator.secret
+        if secret and not hmac.compare_digest(self.headers.get("Authorization", ""), f"Bearer {secret}"):
+            return self.send_json(401, {"error": "Wrong or missing cluster secret"})
+        for route_method, pattern, name in self.ROUTES:
+            if route_method == method and pattern.match(path):
+                break
+        else:
+            return self.send_json(404, {"error": path})
+        try:
+            self.send_json(200, getattr(self.coordinator, name)(**payload))
+        except (TypeError, ValueError, KeyError) as e:
+            self.send_json(400, {"error": str(e)})
+        except Exception as e:
+            self.send_json(500, {"error": str(e)})
+
+    def json_body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}") if length else {}
+
+    def send_json(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class CoordinatorClient:
+    """JSON calls to a coordinator; its own session, apart from the pools used for Adobe."""
+
+    def __init__(self, url, secret=None, timeout=REQUEST_TIMEOUT):
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+        self._session = requests.Session()
+        if secret:
+            self._session.headers["Authorization"] = f"Bearer {secret}"
+
+    def call(self, path, **payload):
+        if payload:
+            response = self._session.post(self.url + path, json=payload, timeout=self.timeout)
+        elif path == "/status":
+            response = self._session.get(self.url + path, timeout=self.timeout)
+        else:
+            response = self._session.post(self.url + path, json={}, timeout=self.timeout)
+        if response.status_code != 200:
+            raise RuntimeError(f"Coordinator {path}: HTTP {response.status_code} {response.text[:200]}")
+        return response.json()
+
+    def close(self):
+        self._session.close()
+
+
+class RemoteTokenProvider(tokens.TokenProvider):
+    """TokenProvider that borrows the coordinator's IMS token instead of holding the client secret."""
+
+    def __init__(self, credentials, client):
+        super().__init__(credentials)
+        self.client = client
+
+    def _fetch(self):
+        token = self.client.call("/token")
+        return {"access_token": token["access_token"], "expires_at": time.time() + token["expires_in"]}
+
+
+class RemoteRateLimiter(ratelimit.RateLimiter):
+    """RateLimiter whose buckets live on the coordinator, so the whole cluster shares one budget.
+
+    While the coordinator cannot be reached, this node falls back to local
+    buckets with the default limits.
+    """
+
+    def __init__(self, client):
+        super().__init__()
+        self.client = client
+
+    def reserve(self, bucket):
+        try:
+            return self.client.call("/ratelimit/reserve", bucket=bucket)["wait"]
+        except (requests.RequestException, RuntimeError) as e:
+            print(f"Coordinator rate limit unavailable ({e}); using a local budget")
+            return super().reserve(bucket)
+
+    def feedback(self, bucket, status_code, headers=None, retries=None):
+        retried = [retry.status for retry in retries or () if getattr(retry, "status", None)]
+        try:
+            return self.client.call("/ratelimit/feedback", bucket=bucket, status_code=status_code,
+                                    retry_after=ratelimit.retry_after_seconds(headers or {}), retried=retried)["throttled"]
+        except (requests.RequestException, RuntimeError):
+            return super().feedback(bucket, status_code, headers, retries)
+
+
+class ClusterWorker:
+    """Lease jobs from a coordinator and convert them with ``convert(file_path, output_path, formats)``.
+
+    Every node must see the input and output files under the same paths, e.g.
+    on a shared drive. Up to ``slots`` files convert at once; leases are kept
+    alive by heartbeat, stages are reported as they are journaled, and the
+    worker exits once the coordinator says the queue has drained.
+    """
+
+    def __init__(self, client, convert, slots=DEFAULT_MAX_WORKERS, name=None):
+        self.client = client
+        self.convert = convert
+        self.slots = slots
+        self.name = name or f"{socket.gethostname()}-{os.getpid()}"
+        self.counts = {}
+        self._lock = threading.Lock()
+        self._running = {}  # job ID -> job
+        self._by_path = {}  # input path -> job ID
+        self._slot_freed = threading.Event()
+
+    def install(self):
+        """Route this process's tokens and request budgets through the coordinator."""
+        client_id = self.client.call("/token")["client_id"]
+        credentials = {"client_credentials": {"client_id": client_id}}
+        config.set_credentials(credentials)
+        tokens.set_token_provider(credentials, RemoteTokenProvider(credentials, self.client))
+        ratelimit.set_limiter(RemoteRateLimiter(self.client))
+        get_journal().add_listener(self._journaled)
+
+    def run(self, stop=None):
+        """Convert leased jobs until the queue drains or ``stop`` is set; returns counts per status."""
+        stop = stop or threading.Event()
+        self.install()
+        scheduler = JobScheduler(max_workers=self.slots)
+        heartbeat = threading.Thread(target=self._heartbeat, args=(stop,), name="cluster-heartbeat", daemon=True)
+        heartbeat.start()
+        last_contact = time.monotonic()
+        try:
+            while not stop.is_set():
+                with self._lock:
+                    free = self.slots - len(self._running)
+                reply = None
+                if free > 0:
+                    try:
+                        reply = self.client.call("/lease", worker=self.name, count=free)
+                        last_contact = time.monotonic()
+                    except (requests.RequestException, RuntimeError) as e:
+                        if time.monotonic() - last_contact > UNREACHABLE_AFTER:
+                            raise RuntimeError(f"Coordinator unreachable for {UNREACHABLE_AFTER}s: {e}") from e
+                        print(f"Coordinator unavailable ({e}); retrying")
+                    for job in reply["jobs"] if reply else ():
+                        self._start(scheduler, job)
+                    with self._lock:
+                        idle = not self._running
+                    if reply and reply["drained"] and idle:
+                        break
+                    if reply and reply["jobs"]:
+                        continue
+                self._slot_freed.wait(IDLE_POLL)
+                self._slot_freed.clear()
+        finally:
+            scheduler.wait()  # Heartbeats continue meanwhile, so the leases outlive the last conversions
+            stop.set()
+            scheduler.shutdown()
+            get_journal().remove_listener(self._journaled)
+        return dict(self.counts)
+
+    def _start(self, scheduler, job):
+        _resume_from(job)
+        with self._lock:
+            self._running[job["id"]] = job
+            self._by_path[job["file_path"]] = job["id"]
+        scheduler.submit(job["file_path"], lambda: self._convert(job))
+
+    def _convert(self, job):
+        try:
+            status, error = self.convert(job["file_path"], job["output_path"], tuple(job["formats"])), None
+        except Exception as e:
+            status, error = FAILED, str(e)
+            print(f"Failed: {job['file_path']} ({e})")
+        with self._lock:
+            self._running.pop(job["id"], None)
+            self._by_path.pop(job["file_path"], None)
+            self.counts[status] = self.counts.get(status, 0) + 1
+        try:
+            self.client.call("/complete", worker=self.name, job_id=job["id"], status=status, error=error)
+        except (requests.RequestException, RuntimeError) as e:
+            # The lease lapses and the job runs again, finding its output already saved
+            print(f"Could not report {job['file_path']} to the coordinator: {e}")
+        self._slot_freed.set()
+
+    def _journaled(self, file_path, target_format, stage, fields):
+        with self._lock:
+            job_id = self._by_path.get(file_path)
+        if job_id is not None:
+            self.client.call("/report", worker=self.name, job_id=job_id, target_format=target_format, stage=stage, fields=fields)
+
+    def _heartbeat(self, stop):
+        while not stop.wait(HEARTBEAT_INTERVAL):
+            with self._lock:
+                ids = list(self._running)
+            if not ids:
+                continue
+            try:
+                lost = self.client.call("/heartbeat", worker=self.name, ids=ids)["lost"]
+            except (requests.RequestException, RuntimeError) as e:
+                print(f"Heartbeat failed: {e}")
+                continue
+            for job_id in lost:
+                # Already handed to another worker; finishing anyway is harmless, its result is just not counted here
+                print(f"Lease on job {job_id} was lost")
+
+
+def _resume_from(job):
+    """Seed the local journal with the stages another worker reported, so this one continues from there."""
+    journal = get_journal()
+    for target_format, entry in job["stages"].items():
+        if "stage" not in entry or stage_reached(journal.get(job["file_path"], target_format), entry["stage"]):
+            continue
+        try:
+            journal.record(job["file_path"], entry["stage"], target_format=target_format,
+                           **{name: entry[name] for name in _HANDLES if name in entry})
+        except OSError as e:
+            print(f"Cannot resume {job['file_path']} here: {e}")
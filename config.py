@@ -0,0 +1,120 @@
+import json
+import os
+import threading
+
+CREDENTIALS_ENV = "PDFSERVICES_CREDENTIALS"
+DEFAULT_CREDENTIALS_PATH = "X:/adobe/pdfservices-api-credentials.json"
+# The client ID and secret themselves, instead of a credentials file (the names Adobe's SDKs use)
+CLIENT_ID_ENV = "PDF_SERVICES_CLIENT_ID"
+CLIENT_SECRET_ENV = "PDF_SERVICES_CLIENT_SECRET"
+# Optional JSON file with defaults for the settings below, e.g. {"credentials": "/etc/adobe/key.json"}
+CONFIG_ENV = "PDF2WORD_CONFIG"
+DEFAULT_CONFIG_PATH = os.path.join(os.path.expanduser("~"), ".config", "pdf-to-word", "config.json")
+# Endpoint overrides, e.g. to point at mock_adobe_server.py for benchmarks
+IMS_URL_ENV = "ADOBE_IMS_URL"
+PDF_SERVICES_URL_ENV = "ADOBE_PDF_SERVICES_URL"
+DEFAULT_IMS_URL = "https://ims-na1.adobelogin.com"
+DEFAULT_PDF_SERVICES_URL = "https://pdf-services.adobe.io"
+# Formats the exportpdf operation can produce; the file extension is the format name
+TARGET_FORMATS = ("docx", "doc", "rtf", "pptx", "xlsx")
+DEFAULT_TARGET_FORMAT = "docx"
+# Languages exportpdf can OCR scanned pages in
+OCR_LANGS = (
+    "en-US", "en-GB", "bg-BG", "ca-CA", "cs-CZ", "da-DK", "de-DE", "de-CH", "el-GR", "es-ES", "et-EE", "fi-FI",
+    "fr-FR", "hr-HR", "hu-HU", "it-IT", "iw-IL", "ja-JP", "ko-KR", "lt-LT", "lv-LV", "mk-MK", "mt-MT", "nb-NO",
+    "nl-NL", "no-NO", "pl-PL", "pt-BR", "ro-RO", "ru-RU", "sk-SK", "sl-SI", "sr-SR", "sv-SE", "tr-TR", "uk-UA",
+    "zh-CN", "zh-HK"
+)
+DEFAULT_OCR_LANG = "en-US"
+
+# Deleting an orphaned asset is best effort and must not hold up a cancel for long
+ASSET_DELETE_TIMEOUT = 5
+
+_credentials = None
+_credentials_path = None
+_file_settings = None
+_lock = threading.Lock()
+
+
+def config_path():
+    return os.environ.get(CONFIG_ENV, DEFAULT_CONFIG_PATH)
+
+
+def file_settings():
+    """The config file's settings, read once on first use; {} when there is no file."""
+    global _file_settings
+    with _lock:
+        if _file_settings is None:
+            path = config_path()
+            try:
+                with open(path, "r") as f:
+                    settings = json.load(f)
+            except FileNotFoundError:
+                settings = {}
+            except ValueError as e:
+                raise ValueError(f"Config file {path} is not valid JSON: {e}") from None
+            if not isinstance(settings, dict):
+                raise ValueError(f"Config file {path} must hold a JSON object")
+            _file_settings = settings
+        return _file_settings
+
+
+def setting(name, env=None, default=None):
+    """$env if set, then the config file's entry for name, then default."""
+    if env and os.environ.get(env):
+        return os.environ[env]
+    return file_settings().get(name, default)
+
+
+def credentials_path():
+    """Explicitly set path, then $PDFSERVICES_CREDENTIALS, then the config file, then the historical default."""
+    return _credentials_path or setting("credentials", CREDENTIALS_ENV, DEFAULT_CREDENTIALS_PATH)
+
+
+def set_credentials_path(path):
+    global _credentials, _credentials_path
+    with _lock:
+        _credentials_path = path
+        _credentials = None
+
+
+def set_credentials(credentials):
+    global _credentials
+    with _lock:
+        _credentials = credentials
+
+
+def get_credentials():
+    """Load the Adobe credentials on first use rather than at import time.
+
+    A client ID and secret in the environment win over any credentials file,
+    unless a path was set explicitly.
+    """
+    global _credentials
+    if _credentials_path is None and os.environ.get(CLIENT_ID_ENV) and os.environ.get(CLIENT_SECRET_ENV):
+        with _lock:
+            if _credentials is None:
+                _credentials = {"client_credentials": {
+                    "client_id": os.environ[CLIENT_ID_ENV], "client_secret": os.environ[CLIENT_SECRET_ENV]
+                }}
+            return _credentials
+    path = credentials_path()
+    with _lock:
+        if _credentials is None:
+            try:
+                with open(path, "r") as f:
+                    _credentials = json.load(f)
+            except FileNotFoundError:
+                raise FileNotFoundError(
+                    f"Credentials file not found: {path} (pass --credentials, set {CREDENTIALS_ENV} or "
+                    f"{CLIENT_ID_ENV}/{CLIENT_SECRET_ENV}, or name it in {config_path()})"
+                ) from None
+        return _credentials
+
+
+def ims_url():
+    return setting("ims_url", IMS_URL_ENV, DEFAULT_IMS_URL).rstrip("/")
+
+
+def pdf_services_url():
+    return setting("pdf_services_url", PDF_SERVICES_URL_ENV, DEFAULT_PDF_SERVICES_URL).rstrip("/")
@@ -1,121 +1,711 @@
+import argparse
+import contextlib
+import glob
 import json
+import os
+import sys
+import threading
 import time
-import requests
+from concurrent.futures import Future
 from pathlib import Path
+from config import (
+    get_credentials, set_credentials_path, pdf_services_url, CREDENTIALS_ENV, DEFAULT_CREDENTIALS_PATH,
+    TARGET_FORMATS, DEFAULT_TARGET_FORMAT, OCR_LANGS, DEFAULT_OCR_LANG, ASSET_DELETE_TIMEOUT
+)
+from tokens import get_token_provider
+from poller import get_poller
+from cache import get_cache
+from journal import get_journal, run_stages, run_formats
+import http_session
+import metrics
+import preflight
+import cluster
+import ratelimit
+import split
+import transfer
+import watch
+from http_session import get_session
+from scheduler import JobScheduler, DEFAULT_MAX_WORKERS, DONE
+from pipeline import (
+    StagedPipeline, format_depths, DEFAULT_UPLOAD_WORKERS, DEFAULT_SUBMIT_WORKERS, DEFAULT_DOWNLOAD_WORKERS
+)
+from poller import MAX_CONCURRENT_POLLS
 
-UPLOAD_TIMEOUT = 300  # 5 minutes
-POLL_INTERVAL = 10  # 10 seconds
-MAX_RETRIES = 5
 
-# Load credentials
-with open("X:/adobe/pdfservices-api-credentials.json", "r") as f:
-    credentials = json.load(f)
-
-token_cache = None
+# Output status values reported per file
+CONVERTED = "converted"
+CACHED = "cached"
+UP_TO_DATE = "up-to-date"
+SKIPPED = "skipped"
+FAILED = "failed"
 
 def get_access_token():
-    global token_cache
-    if token_cache and token_cache["expires_at"] > time.time():
-        return token_cache["access_token"]
-
-    url = "https://ims-na1.adobelogin.com/ims/token/v3"
-    data = {
-        "grant_type": "client_credentials",
-        "client_id": credentials["client_credentials"]["client_id"],
-        "client_secret": credentials["client_credentials"]["client_secret"],
-        "scope": "openid,AdobeID,read_organizations,exportpdf"
-    }
-    
-    response = requests.post(url, data=data, headers={"Content-Type": "application/x-www-form-urlencoded"}, timeout=30)
-    response.raise_for_status()
-    token_data = response.json()
-    
-    token_cache = {
-        "access_token": token_data["access_token"],
-        "expires_at": time.time() + token_data["expires_in"] - 30
-    }
-    return token_cache["access_token"]
+    return get_token_provider(get_credentials()).get_token()
 
-def upload_pdf(access_token, file_path):
-    url = "https://pdf-services.adobe.io/assets"
+def warm_up():
+    """Fetch the first token in the background while inputs are scanned and checked"""
+    def warm():
+        try:
+            get_access_token()
+        except Exception:
+            pass  # The first conversion raises the same error where it can be reported
+    threading.Thread(target=warm, name="warm-up", daemon=True).start()
+
+def upload_pdf(access_token, file_path, progress=None, control=None, expected_sha256=None, uploaded=None):
+    """Create an asset and stream the PDF into it; see transfer.upload_file for the optional arguments
+
+    uploaded, if given, receives the SHA-256 of the bytes sent under "sha256".
+    """
+    url = f"{pdf_services_url()}/assets"
     headers = {
-        "x-api-key": credentials["client_credentials"]["client_id"],
+        "x-api-key": get_credentials()["client_credentials"]["client_id"],
         "Authorization": f"Bearer {access_token}",
         "Content-Type": "application/json"
     }
-    response = requests.post(url, json={"mediaType": "application/pdf"}, headers=headers, timeout=30)
-    response.raise_for_status()
-    upload_data = response.json()
-    
-    with open(file_path, "rb") as f:
-        requests.put(upload_data["uploadUri"], data=f, headers={"Content-Type": "application/pdf"}, timeout=UPLOAD_TIMEOUT)
+    # A cancel aborts the request itself rather than waiting out its timeout
+    with metrics.timed(metrics.ASSET_CREATE, file_path) as event, http_session.abort_on(control):
+        response = ratelimit.get_limiter().send(ratelimit.ASSETS, lambda: get_session().post(
+            url, json={"mediaType": "application/pdf"}, headers=headers, timeout=30
+        ), sleep=control.sleep if control else time.sleep)
+        event.update(metrics.http_fields(response))
+        response.raise_for_status()
+        upload_data = response.json()
     
+    try:
+        with metrics.timed(metrics.UPLOAD, file_path) as event:
+            event["sha256"] = transfer.upload_file(upload_data["uploadUri"], file_path, progress, control, event, expected_sha256)
+        if uploaded is not None:
+            uploaded["sha256"] = event["sha256"]
+    except BaseException:
+        # Nothing else knows this assetID yet, so a failed or cancelled upload would leave it orphaned
+        delete_asset(access_token, upload_data["assetID"])
+        raise
+
     return upload_data["assetID"]
 
-def convert_pdf_to_docx(access_token, asset_id):
-    url = "https://pdf-services.adobe.io/operation/exportpdf"
+def delete_asset(access_token, asset_id):
+    """Best-effort delete of an asset no job will use; Adobe would otherwise keep it until it expires.
+
+    Runs on its own thread so a cancelled conversion is not held up by it; with
+    access_token None the token is fetched there too. The thread is not a
+    daemon: the process waits up to ASSET_DELETE_TIMEOUT for it before exiting.
+    """
+    threading.Thread(target=_delete_asset, args=(access_token, asset_id), name="delete-asset").start()
+
+def _delete_asset(access_token, asset_id):
+    try:
+        access_token = access_token or get_access_token()
+        # Never retried, so the timeout really bounds it
+        response = http_session.get_no_retry_session().delete(f"{pdf_services_url()}/assets/{asset_id}", headers={
+            "x-api-key": get_credentials()["client_credentials"]["client_id"],
+            "Authorization": f"Bearer {access_token}"
+        }, timeout=ASSET_DELETE_TIMEOUT)
+        if response.status_code not in (200, 204, 404):
+            print(f"Could not delete asset {asset_id}: HTTP {response.status_code}")
+    except Exception as e:
+        print(f"Could not delete asset {asset_id}: {e}")
+
+def convert_pdf_to_docx(access_token, asset_id, target_format=DEFAULT_TARGET_FORMAT, ocr_lang=DEFAULT_OCR_LANG):
+    """Submit an export job for an uploaded asset; any of TARGET_FORMATS works, not just DOCX"""
+    url = f"{pdf_services_url()}/operation/exportpdf"
     headers = {
-        "x-api-key": credentials["client_credentials"]["client_id"],
+        "x-api-key": get_credentials()["client_credentials"]["client_id"],
         "Authorization": f"Bearer {access_token}",
         "Content-Type": "application/json"
     }
-    response = requests.post(url, json={"assetID": asset_id, "targetFormat": "docx", "ocrLang": "en-US"}, headers=headers, timeout=30)
-    response.raise_for_status()
+    with metrics.timed(metrics.SUBMIT, asset_id=asset_id, target_format=target_format) as event:
+        response = ratelimit.get_limiter().send(ratelimit.SUBMIT, lambda: get_session().post(
+            url, json={"assetID": asset_id, "targetFormat": target_format, "ocrLang": ocr_lang}, headers=headers, timeout=30
+        ))
+        event.update(metrics.http_fields(response))
+        response.raise_for_status()
     
     job_id = response.headers.get("Location", "").split("/")[-2]
     if not job_id:
         raise ValueError("Job ID not found in response")
     return job_id
 
-def poll_and_download_result(access_token, job_id, output_path):
-    url = f"https://pdf-services.adobe.io/operation/exportpdf/{job_id}/status"
-    headers = {
-        "x-api-key": credentials["client_credentials"]["client_id"],
-        "Authorization": f"Bearer {access_token}"
-    }
-    retries = 0
-    download_uri = None
-    
-    while retries < MAX_RETRIES:
-        response = requests.get(url, headers=headers, timeout=30)
-        response.raise_for_status()
-        status_data = response.json()
-        print(f"Job status: {status_data.get('status')}")
-        
-        if status_data.get("status") == "done":
-            download_uri = status_data.get("downloadUri") or status_data.get("asset", {}).get("downloadUri")
-            if not download_uri:
-                raise ValueError("Download URI not found")
-            break
-        
-        time.sleep(POLL_INTERVAL)
-        retries += 1
-    
-    if not download_uri:
-        raise ValueError("Conversion completed but download URI is missing")
-    
-    response = requests.get(download_uri, stream=True, timeout=UPLOAD_TIMEOUT)
-    response.raise_for_status()
-    with open(output_path, "wb") as f:
-        for chunk in response.iter_content(chunk_size=8192):
-            f.write(chunk)
-    
+def track_result(job_id, file_size=0, file_path=None, pages=None, ocr=False):
+    """Hand the job to the shared poller; returns a Future of the download URI"""
+    # The shared poller multiplexes all outstanding jobs and supplies fresh tokens itself
+    url = f"{pdf_services_url()}/operation/exportpdf/{job_id}/status"
+    started = time.monotonic()
+    future = get_poller(get_credentials()).track(url, file_size, label=file_path, pages=pages, ocr=ocr)
+    future.add_done_callback(lambda f: metrics.emit(
+        metrics.REMOTE_WAIT, file_path, time.monotonic() - started, ok=not f.cancelled() and f.exception() is None
+    ))
+    return future
+
+def poll_for_result(job_id, file_size=0, file_path=None, pages=None, ocr=False):
+    download_uri = track_result(job_id, file_size, file_path, pages, ocr).result()
+    print(f"Job status: done ({job_id})")
+    return download_uri
+
+def download_result(download_uri, output_path):
+    # Written to a temporary file and renamed once complete, so a failure never leaves a truncated output
+    with metrics.timed(metrics.DOWNLOAD, output_path) as event:
+        transfer.download_file(download_uri, output_path, event=event)
+
     print(f"File successfully saved to: {output_path}")
 
-def main():
+def poll_and_download_result(access_token, job_id, output_path, file_size=0):
+    download_uri = poll_for_result(job_id, file_size)
+    download_result(download_uri, output_path)
+
+def outputs_for(output_path, formats):
+    """{target format: output path}, one file per format next to output_path"""
+    return {target_format: str(Path(output_path).with_suffix("." + target_format)) for target_format in formats}
+
+def convert_file(file_path, output_path=None, formats=(DEFAULT_TARGET_FORMAT,), force=False):
+    """Convert one PDF to each of formats and return CONVERTED, CACHED or UP_TO_DATE
+
+    Outputs share output_path's name (default: the PDF's) with the format as extension.
+    With force, outputs the journal shows as already saved are converted again.
+    """
+    with metrics.timed(metrics.JOB, file_path, bytes=os.path.getsize(file_path)) as event:
+        event["status"] = _convert_file(file_path, output_path, formats, force)
+        return event["status"]
+
+def _convert_file(file_path, output_path, formats, force=False):
+    outputs = outputs_for(output_path or file_path, formats)
+    # Corrupt, empty and encrypted files fail here instead of after an upload and a poll cycle
+    info = preflight.check(file_path)
+    cache = get_cache()
+    # Keying by content reads the whole PDF before the upload reads it again; that buys a hit on any copy
+    # of it, so it is only done when a hit is possible. Otherwise the upload's own hash keys what is stored.
+    digest = cache.file_digest(file_path) if cache.enabled and not force else None
+    if digest is None:
+        pending = outputs
+    else:
+        pending = {target_format: path for target_format, path in outputs.items()
+                   if not cache.get(cache.key_for_digest(digest, target_format, info.ocr_lang), path)}
+    if not pending:
+        print(f"Cache hit, no API calls needed: {', '.join(outputs.values())}")
+        return CACHED
+    ranges = split.plan(file_path, info.pages) if list(pending) == [DEFAULT_TARGET_FORMAT] else None
+    if ranges:
+        # Only the chunks are uploaded, so nothing else hashes the PDF itself
+        digest = digest or cache.file_digest(file_path)
+        # Chunks live under the cache so an interrupted run finds them, and their journal entries, again
+        output_path = pending[DEFAULT_TARGET_FORMAT]
+        directory = os.path.join(cache.directory, "splits", cache.key_for_digest(digest, DEFAULT_TARGET_FORMAT, info.ocr_lang))
+        parts = split.convert_split(file_path, output_path, ranges, directory,
+                                    lambda chunk, part: convert_stages(chunk, part, force=force))
+        print(f"Merged {parts} parts into {output_path}")
+        converted = {DEFAULT_TARGET_FORMAT: True}
+    else:
+        uploaded = {}
+        converted = convert_formats(file_path, pending, digest, force=force, uploaded=uploaded)
+        # The journal may have resumed past the upload, in which case this run never hashed the file
+        digest = digest or uploaded.get("sha256")
+    for target_format, output_path in pending.items():
+        if converted[target_format]:
+            if cache.enabled:
+                digest = digest or cache.file_digest(file_path)
+                cache.put(cache.key_for_digest(digest, target_format, info.ocr_lang), output_path)
+        else:
+            # Not produced by this run, so it cannot vouch for the cache key; --force converts it again
+            print(f"Already converted in an earlier run: {output_path}")
+    return CONVERTED if any(converted.values()) else UP_TO_DATE
+
+def convert_formats(file_path, outputs, sha256=None, force=False, uploaded=None):
+    """Upload one PDF once and export it to every {target format: output path}; returns {format: converted}
+
+    sha256 is the digest the PDF was cached under; the upload fails if the file no longer matches it.
+    uploaded is passed on to upload_pdf.
+    """
+    info = preflight.check(file_path)
+    return run_formats(
+        get_journal(), os.path.abspath(file_path),
+        {target_format: os.path.abspath(path) for target_format, path in outputs.items()},
+        upload=lambda: upload_pdf(get_access_token(), file_path, expected_sha256=sha256, uploaded=uploaded),
+        submit=lambda asset_id, target_format: convert_pdf_to_docx(get_access_token(), asset_id, target_format, info.ocr_lang),
+        poll=lambda job_id: poll_for_result(job_id, info.size, file_path, info.pages, info.needs_ocr),
+        download=download_result,
+        discard=lambda asset_id: delete_asset(None, asset_id),
+        options=export_options(info),
+        force=force
+    )
+
+def export_options(info):
+    """Options besides the target format that change what a job produces, as the journal records them"""
+    return {"ocr_lang": info.ocr_lang}
+
+def convert_stages(file_path, output_path, force=False):
+    """Upload, convert, poll and download one PDF; False if the journal shows it already done"""
+    # Stages already recorded in the journal by an interrupted run are skipped
+    info = preflight.check(file_path)
+    return run_stages(
+        get_journal(), os.path.abspath(file_path), os.path.abspath(output_path),
+        upload=lambda: upload_pdf(get_access_token(), file_path),
+        submit=lambda asset_id: convert_pdf_to_docx(get_access_token(), asset_id, ocr_lang=info.ocr_lang),
+        poll=lambda job_id: poll_for_result(job_id, info.size, file_path, info.pages, info.needs_ocr),
+        download=lambda download_uri: download_result(download_uri, output_path),
+        discard=lambda asset_id: delete_asset(None, asset_id),
+        options=export_options(info),
+        force=force
+    )
+
+def print_cache_stats():
+    stats = get_cache().stats()
+    print(f"Cache: {stats['hits']} hits, {stats['misses']} misses, {stats['entries']} entries ({stats['bytes'] / (1024 * 1024):.1f} MB)")
+
+def convert_files(file_paths, max_workers=DEFAULT_MAX_WORKERS, formats=(DEFAULT_TARGET_FORMAT,)):
+    """Convert many PDFs with at most max_workers in flight; returns {file_path: error or None}"""
+    def report(job):
+        print(f"{job.state}: {job.key}" + (f" ({job.error})" if job.error else ""))
+
+    http_session.configure(pool_size=max_workers)
+    scheduler = JobScheduler(max_workers=max_workers, on_state_change=report)
+    jobs = [scheduler.submit(file_path, lambda file_path=file_path: convert_file(file_path, formats=formats)) for file_path in file_paths]
+    scheduler.wait()
+    scheduler.shutdown()
+    print_cache_stats()
+    return {job.key: None if job.state == DONE else job.error for job in jobs}
+
+def convert_files_async(file_paths, max_jobs=None):
+    """Convert many PDFs from a single event loop; returns {file_path: error or None}"""
+    import async_engine  # aiohttp is only needed for this mode
+    def report(file_path, percent):
+        print(f"{percent}%: {file_path}")
+    return async_engine.run_batch(get_credentials(), file_paths, max_jobs=max_jobs or async_engine.DEFAULT_MAX_JOBS, progress=report)
+
+def make_pipeline(upload_workers=DEFAULT_UPLOAD_WORKERS, submit_workers=DEFAULT_SUBMIT_WORKERS,
+                  download_workers=DEFAULT_DOWNLOAD_WORKERS):
+    """A StagedPipeline wired to the functions above, with the HTTP pools sized to match"""
+    http_session.configure(pool_size=upload_workers + submit_workers + download_workers + MAX_CONCURRENT_POLLS)
+
+    def track(file_path, job_id):
+        info = preflight.check(file_path)  # Remembered from the batch loop, so no second read
+        return track_result(job_id, info.size, file_path, info.pages, info.needs_ocr)
+
+    return StagedPipeline(
+        upload=lambda file_path: upload_pdf(get_access_token(), file_path),
+        submit=lambda file_path, asset_id: convert_pdf_to_docx(get_access_token(), asset_id, ocr_lang=preflight.check(file_path).ocr_lang),
+        track=track,
+        download=lambda file_path, download_uri, output_path: download_result(download_uri, output_path),
+        discard=lambda asset_id: delete_asset(None, asset_id),
+        options=lambda file_path: export_options(preflight.check(file_path)),
+        upload_workers=upload_workers, submit_workers=submit_workers, download_workers=download_workers
+    )
+
+def convert_split_pipelined(pipeline, file_path, output_path, ranges, cache_key, force=False):
+    """Convert a PDF's page-range chunks through the pipeline and merge them; returns a Future of True.
+
+    Splitting, waiting on the chunks and merging happen on a thread of their
+    own, so the caller can go on feeding the pipeline meanwhile.
+    """
+    future = Future()
+    directory = os.path.join(get_cache().directory, "splits", cache_key)
+
+    def run():
+        try:
+            parts = split.convert_split(file_path, output_path, ranges, directory, lambda chunk, part: pipeline.convert(
+                os.path.abspath(chunk), os.path.abspath(part), force).result())
+            print(f"Merged {parts} parts into {output_path}")
+            future.set_result(True)
+        except BaseException as e:
+            future.set_exception(e)
+    threading.Thread(target=run, name="pipeline-split", daemon=True).start()
+    return future
+
+def is_glob(path):
+    return any(char in path for char in "*?[")
+
+def glob_base(pattern):
+    """Leading directories of a glob pattern that contain no wildcards"""
+    parts = []
+    for part in Path(pattern).parts:
+        if is_glob(part):
+            break
+        parts.append(part)
+    return Path(*parts) if parts else Path(".")
+
+def iter_inputs(inputs):
+    """Yield (pdf_path, root) pairs from files, directories (recursive), globs and "-" for stdin"""
+    for item in inputs:
+        if item == "-":
+            for line in sys.stdin:
+                line = line.strip()
+                if line:
+                    yield Path(line), None
+        elif is_glob(item):
+            base = glob_base(item)
+            for match in sorted(glob.glob(item, recursive=True)):
+                if match.lower().endswith(".pdf") and os.path.isfile(match):
+                    yield Path(match), base
+        elif os.path.isdir(item):
+            for dir_path, _, file_names in os.walk(item):
+                for file_name in sorted(file_names):
+                    if file_name.lower().endswith(".pdf"):
+                        yield Path(dir_path) / file_name, Path(item)
+        else:
+            yield Path(item), None
+
+def output_path_for(file_path, root, output_dir):
+    """Next to the input by default; with an output directory, mirror the tree below root"""
+    if output_dir is None:
+        return file_path.with_suffix(".docx")
+    relative = file_path.relative_to(root) if root is not None else Path(file_path.name)
+    return Path(output_dir) / relative.with_suffix(".docx")
+
+def is_up_to_date(file_path, output_path, formats=(DEFAULT_TARGET_FORMAT,)):
     try:
-        file_path = "X:/adobe/sample3.pdf"
-        output_path = str(Path(file_path).with_suffix(".docx"))
-        
-        print(f"Starting conversion for: {file_path}")
-        access_token = get_access_token()
-        asset_id = upload_pdf(access_token, file_path)
-        job_id = convert_pdf_to_docx(access_token, asset_id)
-        poll_and_download_result(access_token, job_id, output_path)
-        
-        print("Conversion process completed successfully!")
-    except Exception as e:
-        print(f"Main process error: {e}")
+        return all(os.path.getmtime(path) >= os.path.getmtime(file_path) for path in outputs_for(output_path, formats).values())
+    except OSError:
+        return False
+
+class BatchReport:
+    """Write one JSON object per finished file to a stream and keep running totals"""
+
+    def __init__(self, stream=None, on_record=None):
+        self.stream = stream
+        self.on_record = on_record  # Called with (file_path, status) for every finished file
+        self.counts = {}
+        self._lock = threading.Lock()
+
+    def record(self, file_path, output_path, status, started, error=None):
+        entry = {
+            "input": str(file_path),
+            "output": str(output_path),
+            "status": status,
+            "seconds": round(time.monotonic() - started, 3),
+            "bytes": os.path.getsize(file_path) if os.path.exists(file_path) else None,
+            "finished_at": time.time()
+        }
+        if error is not None:
+            entry["error"] = str(error)
+        with self._lock:
+            self.counts[status] = self.counts.get(status, 0) + 1
+            if self.stream:
+                self.stream.write(json.dumps(entry) + "\n")
+                self.stream.flush()
+        if self.on_record:
+            self.on_record(file_path, status)
+
+def run_batch(tasks, jobs, report, formats=(DEFAULT_TARGET_FORMAT,), force=False):
+    """Convert (input, output) pairs on the thread scheduler"""
+    def run(file_path, output_path):
+        started = time.monotonic()
+        try:
+            output_path.parent.mkdir(parents=True, exist_ok=True)
+            report.record(file_path, output_path, convert_file(str(file_path), str(output_path), formats, force), started)
+        except Exception as e:
+            report.record(file_path, output_path, FAILED, started, e)
+            print(f"Failed: {file_path} ({e})")
+
+    http_session.configure(pool_size=jobs)
+    # A bounded queue keeps memory flat when the input list is tens of thousands long
+    scheduler = JobScheduler(max_workers=jobs, max_pending=jobs * 4)
+    for file_path, output_path in tasks:
+        scheduler.submit(str(file_path), lambda file_path=file_path, output_path=output_path: run(file_path, output_path))
+    scheduler.wait()
+    scheduler.shutdown()
+
+def run_batch_async(tasks, jobs, report):
+    """Convert (input, output) pairs on the asyncio engine, with at most ``jobs`` in flight (None: the engine's default)"""
+    import asyncio
+    import async_engine  # aiohttp is only needed for this mode
+
+    async def run_all():
+        async with async_engine.AsyncConversionEngine(get_credentials(), max_jobs=jobs or async_engine.DEFAULT_MAX_JOBS) as engine:
+            async def run(file_path, output_path):
+                started = time.monotonic()
+                try:
+                    output_path.parent.mkdir(parents=True, exist_ok=True)
+                    converted = await engine.convert(str(file_path), str(output_path))
+                    report.record(file_path, output_path, CONVERTED if converted else CACHED, started)
+                except Exception as e:
+                    report.record(file_path, output_path, FAILED, started, e)
+                    print(f"Failed: {file_path} ({e})")
+            await asyncio.gather(*(run(file_path, output_path) for file_path, output_path in tasks))
+    asyncio.run(run_all())
+
+def run_batch_pipelined(tasks, report, upload_workers, submit_workers, download_workers, depth_interval=None, force=False):
+    """Convert (input, output) pairs on the stage-separated pipeline"""
+    pipeline = make_pipeline(upload_workers, submit_workers, download_workers)
+    cache = get_cache()
+    stop = threading.Event()
+    splits = []  # One Event per split file, set once its result is recorded; its chunks may not all be queued yet
+
+    def show_depths():
+        while not stop.wait(depth_interval):
+            print(format_depths(pipeline.queue_depths()))
+
+    def finished(future, file_path, output_path, cache_key, started):
+        error = future.exception() if not future.cancelled() else "cancelled"
+        metrics.emit(metrics.JOB, str(file_path), time.monotonic() - started, ok=error is None)
+        if error is not None:
+            report.record(file_path, output_path, FAILED, started, error)
+            print(f"Failed: {file_path} ({error})")
+            return
+        if not future.result():
+            # Saved by an earlier run, which cannot vouch for this cache key
+            return report.record(file_path, output_path, UP_TO_DATE, started)
+        try:
+            if cache_key:
+                cache.put(cache_key, str(output_path))
+        except OSError as e:
+            print(f"Could not cache {output_path}: {e}")
+        report.record(file_path, output_path, CONVERTED, started)
+
+    if depth_interval:
+        threading.Thread(target=show_depths, name="pipeline-depths", daemon=True).start()
+    try:
+        for file_path, output_path in tasks:
+            started = time.monotonic()
+            try:
+                output_path.parent.mkdir(parents=True, exist_ok=True)
+                info = preflight.check(str(file_path))
+                # Hashing reads the whole PDF once more than the upload does, for nothing if the cache keeps nothing
+                cache_key = cache.key_for(str(file_path), ocr_lang=info.ocr_lang) if cache.enabled else None
+                if cache_key and cache.get(cache_key, str(output_path)):
+                    report.record(file_path, output_path, CACHED, started)
+                    continue
+                ranges = split.plan(str(file_path), info.pages)
+                if ranges:
+                    future = convert_split_pipelined(pipeline, str(file_path), str(output_path), ranges,
+                                                     cache_key or cache.key_for(str(file_path), ocr_lang=info.ocr_lang), force)
+                else:
+                    future = pipeline.convert(os.path.abspath(file_path), os.path.abspath(output_path), force)
+            except Exception as e:
+                report.record(file_path, output_path, FAILED, started, e)
+                print(f"Failed: {file_path} ({e})")
+                continue
+            future.add_done_callback(lambda f, file_path=file_path, output_path=output_path, cache_key=cache_key, started=started:
+                                     finished(f, file_path, output_path, cache_key, started))
+            if ranges:
+                # Callbacks run in the order added, so this one fires after the result is recorded
+                recorded = threading.Event()
+                future.add_done_callback(lambda f, recorded=recorded: recorded.set())
+                splits.append(recorded)
+        for recorded in splits:
+            recorded.wait()
+        pipeline.wait()
+    finally:
+        stop.set()
+        pipeline.shutdown()
+
+def run_coordinated(tasks, report, address, formats=(DEFAULT_TARGET_FORMAT,), secret=None, queue_path=cluster.DEFAULT_QUEUE_PATH,
+                    keep_running=False):
+    """Queue (input, output) pairs for cluster workers (convert.py --join) and record their results"""
+    host, _, port = address.rpartition(":")
+    started = {}
+
+    def completed(job):
+        report.record(Path(job["file_path"]), Path(job["output_path"]), job["status"],
+                      started.pop(job["id"], time.monotonic()), job["error"])
+
+    queue = cluster.JobQueue(queue_path)
+    coordinator = cluster.Coordinator(queue, get_credentials(), host or "127.0.0.1", int(port), secret, on_complete=completed)
+    coordinator.start()
+    print(f"Coordinator listening on {coordinator.url}; start workers with: convert.py --join {coordinator.url}")
+    if coordinator.generated_secret:
+        # Reachable from other machines, so never without a secret
+        print(f"No cluster secret was set; workers need this one: {cluster.SECRET_ENV}={coordinator.secret}")
+    try:
+        for file_path, output_path in tasks:
+            output_path.parent.mkdir(parents=True, exist_ok=True)
+            job_id = queue.enqueue(os.path.abspath(file_path), os.path.abspath(output_path), formats)
+            started.setdefault(job_id, time.monotonic())
+        if not keep_running:
+            coordinator.finish()
+        coordinator.wait()
+        time.sleep(cluster.DRAIN_GRACE)  # Lets idle workers hear that the queue has drained
+    finally:
+        coordinator.stop()
+        queue.close()
+
+def run_worker(url, jobs, secret=None):
+    """Convert jobs leased from a coordinator until its queue drains"""
+    http_session.configure(pool_size=jobs)
+    client = cluster.CoordinatorClient(url, secret)
+    worker = cluster.ClusterWorker(client, convert_file, jobs)
+    print(f"Worker {worker.name} joined {url} with {jobs} slots")
+    try:
+        counts = worker.run()
+    finally:
+        client.close()
+    print("Done: " + ", ".join(f"{count} {status}" for status, count in sorted(counts.items())))
+    return counts
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Convert PDFs to DOCX with Adobe PDF Services.")
+    parser.add_argument("inputs", nargs="*", help="PDF files, directories (searched recursively) or glob patterns; '-' reads paths from stdin")
+    parser.add_argument("-o", "--output-dir", help="write outputs here, mirroring the input tree (default: next to each PDF)")
+    parser.add_argument("-j", "--jobs", type=int, default=DEFAULT_MAX_WORKERS, help=f"files converted concurrently (default: {DEFAULT_MAX_WORKERS})")
+    parser.add_argument("--credentials", help=f"credentials JSON (default: ${CREDENTIALS_ENV} or {DEFAULT_CREDENTIALS_PATH})")
+    parser.add_argument("--force", action="store_true", help="convert even when the output is newer than the PDF")
+    parser.add_argument("--report", help="append a JSON-lines report to this file ('-' for stdout)")
+    parser.add_argument("--formats", default=DEFAULT_TARGET_FORMAT,
+                        help=f"comma-separated output formats, uploading each PDF once ({', '.join(TARGET_FORMATS)}; default: {DEFAULT_TARGET_FORMAT})")
+    parser.add_argument("--watch", action="store_true",
+                        help="keep running and convert PDFs as they are dropped into the input directories")
+    parser.add_argument("--settle", type=float, default=watch.SETTLE_SECONDS,
+                        help=f"watch mode: seconds a new PDF must stop changing before it is converted (default: {watch.SETTLE_SECONDS:g})")
+    parser.add_argument("--poll-interval", type=float, default=watch.POLL_INTERVAL,
+                        help=f"watch mode: rescan interval without filesystem events (default: {watch.POLL_INTERVAL:g}s)")
+    parser.add_argument("--checkpoint", default=os.environ.get("PDF2WORD_WATCH_STATE", watch.DEFAULT_CHECKPOINT_PATH),
+                        help="watch mode: log of PDFs already converted, so restarts skip them (default: $PDF2WORD_WATCH_STATE or %(default)s)")
+    parser.add_argument("--serve", metavar="[HOST:]PORT",
+                        help=f"coordinate a cluster: queue the inputs for workers on other machines instead of converting here (port {cluster.DEFAULT_PORT} is customary)")
+    parser.add_argument("--join", metavar="URL", help="work for a coordinator started with --serve, e.g. http://host:8770; inputs are not needed")
+    parser.add_argument("--cluster-secret", default=os.environ.get(cluster.SECRET_ENV),
+                        help=f"shared secret between coordinator and workers (default: ${cluster.SECRET_ENV})")
+    parser.add_argument("--queue", default=os.environ.get("PDF2WORD_QUEUE", cluster.DEFAULT_QUEUE_PATH),
+                        help="coordinator: durable job queue (default: $PDF2WORD_QUEUE or %(default)s)")
+    parser.add_argument("--engine", choices=("threads", "async", "pipeline"), default="threads",
+                        help="conversion engine (default: threads); 'pipeline' runs upload, submit, poll and download as separate stages")
+    parser.add_argument("--async-jobs", type=int,
+                        help="async engine: files in flight at once; most of them only wait on Adobe, so this can be far above --jobs (default: 1000)")
+    parser.add_argument("--upload-workers", type=int, default=DEFAULT_UPLOAD_WORKERS, help=f"pipeline engine: concurrent uploads (default: {DEFAULT_UPLOAD_WORKERS})")
+    parser.add_argument("--submit-workers", type=int, default=DEFAULT_SUBMIT_WORKERS, help=f"pipeline engine: concurrent job submissions (default: {DEFAULT_SUBMIT_WORKERS})")
+    parser.add_argument("--download-workers", type=int, default=DEFAULT_DOWNLOAD_WORKERS, help=f"pipeline engine: concurrent downloads (default: {DEFAULT_DOWNLOAD_WORKERS})")
+    parser.add_argument("--split-pages", type=int, default=split.SPLIT_MIN_PAGES,
+                        help=f"split PDFs with at least this many pages into parallel chunks (default: {split.SPLIT_MIN_PAGES}; needs pypdf, python-docx and docxcompose)")
+    parser.add_argument("--chunk-pages", type=int, default=split.CHUNK_PAGES, help=f"pages per chunk when splitting (default: {split.CHUNK_PAGES})")
+    parser.add_argument("--no-split", action="store_true", help="always convert each PDF as one job")
+    parser.add_argument("--ocr-lang", choices=OCR_LANGS, metavar="LANG",
+                        help=f"OCR language for scanned pages (default: the PDF's own /Lang if it needs OCR, else {DEFAULT_OCR_LANG})")
+    parser.add_argument("--no-preflight", action="store_true",
+                        help="upload every file without first checking locally that it is a readable, unencrypted PDF")
+    parser.add_argument("--upload-limit", type=float, metavar="MB_PER_SECOND",
+                        help="cap the combined bandwidth of all uploads (default: unlimited)")
+    parser.add_argument("--rate-limit", action="append", default=[], metavar="BUDGET=PER_SECOND",
+                        help=f"request ceiling for one budget ({', '.join(ratelimit.BUCKETS)}); may be repeated")
+    parser.add_argument("--metrics-jsonl", help="append per-stage timing events to this JSON-lines file")
+    parser.add_argument("--metrics-prom", help="keep a Prometheus text-exposition file of stage histograms here")
+    parser.add_argument("--stats", action="store_true", help="print a per-stage timing summary at the end")
+    args = parser.parse_args(argv)
+    if args.upload_limit is not None and args.upload_limit <= 0:
+        parser.error("--upload-limit must be positive")
+    if min(args.jobs, args.async_jobs or 1, args.upload_workers, args.submit_workers, args.download_workers,
+           args.split_pages, args.chunk_pages) < 1:
+        parser.error("--jobs, --async-jobs, the per-stage worker counts and the split sizes must be at least 1")
+    args.formats = tuple(dict.fromkeys(name.strip().lower() for name in args.formats.split(",") if name.strip()))
+    unknown = [name for name in args.formats if name not in TARGET_FORMATS]
+    if unknown or not args.formats:
+        parser.error(f"--formats takes one or more of {', '.join(TARGET_FORMATS)}")
+    if args.formats != (DEFAULT_TARGET_FORMAT,) and args.engine != "threads":
+        parser.error(f"--formats other than {DEFAULT_TARGET_FORMAT} needs --engine threads")
+    for limit in args.rate_limit:
+        bucket, _, rate = limit.partition("=")
+        try:
+            if bucket not in ratelimit.BUCKETS or float(rate) <= 0:
+                raise ValueError
+        except ValueError:
+            parser.error(f"--rate-limit expects BUDGET=PER_SECOND with BUDGET one of {', '.join(ratelimit.BUCKETS)}")
+    if args.serve and args.join:
+        parser.error("--serve and --join are exclusive")
+    if args.serve:
+        port = args.serve.rpartition(":")[2]
+        if not port.isdigit():
+            parser.error("--serve takes [HOST:]PORT")
+    if args.join:
+        return args
+    if args.watch:
+        if not args.inputs or not all(os.path.isdir(item) for item in args.inputs):
+            parser.error("--watch takes one or more directories")
+        if args.engine == "async":
+            parser.error("--watch needs --engine threads or pipeline")
+        if args.settle < 0 or args.poll_interval <= 0:
+            parser.error("--settle and --poll-interval must be positive")
+    if not args.inputs:
+        if sys.stdin.isatty():
+            parser.error("no input files given")
+        args.inputs = ["-"]
+    return args
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.credentials:
+        set_credentials_path(args.credentials)
+    for limit in args.rate_limit:
+        bucket, _, rate = limit.partition("=")
+        ratelimit.get_limiter().set_limit(bucket, float(rate))
+    if args.upload_limit:
+        transfer.upload_bandwidth.set_rate(args.upload_limit * 1024 * 1024)
+    preflight.configure(enabled=not args.no_preflight, ocr_lang=args.ocr_lang)
+    split.configure(enabled=not args.no_split, min_pages=args.split_pages, chunk_pages=args.chunk_pages)
+    if args.join:
+        # Tokens and request budgets come from the coordinator, so no credentials are needed here
+        counts = run_worker(args.join, args.jobs, args.cluster_secret)
+        if counts.get(FAILED):
+            exit(1)
+        return
+
+    report_stream = None
+    if args.report == "-":
+        report_stream = sys.stdout
+    elif args.report:
+        report_stream = open(args.report, "a")
+    watcher = None
+    if args.watch:
+        watcher = watch.FolderWatcher(args.inputs, watch.Checkpoint(args.checkpoint), settle=args.settle, interval=args.poll_interval)
+    report = BatchReport(report_stream, on_record=watcher and (
+        lambda file_path, status: watcher.failed(str(file_path)) if status == FAILED else watcher.done(str(file_path))
+    ))
+    sinks = []
+    if args.metrics_jsonl:
+        sinks.append(metrics.add_sink(metrics.JsonLinesSink(args.metrics_jsonl)))
+    if args.metrics_prom:
+        sinks.append(metrics.add_sink(metrics.PrometheusSink(args.metrics_prom)))
+
+    def inputs():
+        if watcher is None:
+            yield from iter_inputs(args.inputs)
+            return
+        watcher.start()
+        print(f"Watching {', '.join(watcher.directories)} "
+              f"({'filesystem events' if watcher.use_events else f'polling every {args.poll_interval:g}s'}); Ctrl+C stops")
+        for file_path, root in watcher:
+            yield Path(file_path), Path(root)
+
+    def tasks():
+        for file_path, root in inputs():
+            output_path = output_path_for(file_path, root, args.output_dir)
+            if not args.force and is_up_to_date(file_path, output_path, args.formats):
+                report.record(file_path, output_path, SKIPPED, time.monotonic())
+                continue
+            yield file_path, output_path
+
+    # With the report on stdout, progress messages move to stderr so stdout stays pure JSON lines
+    with contextlib.redirect_stdout(sys.stderr if report_stream is sys.stdout else sys.stdout):
+        try:
+            get_credentials()
+            if args.engine != "async":
+                warm_up()  # The async engine fetches tokens through its own session
+            if args.serve:
+                run_coordinated(tasks(), report, args.serve, args.formats, args.cluster_secret, args.queue, keep_running=args.watch)
+            elif args.engine == "async":
+                run_batch_async(list(tasks()), args.async_jobs, report)
+            elif args.engine == "pipeline":
+                run_batch_pipelined(tasks(), report, args.upload_workers, args.submit_workers, args.download_workers,
+                                    depth_interval=5 if args.stats else None, force=args.force)
+            else:
+                run_batch(tasks(), args.jobs, report, args.formats, args.force)
+        except KeyboardInterrupt:
+            if watcher is None:
+                raise
+            print("Stopped watching")
+        except Exception as e:
+            print(f"Main process error: {e}")
+            exit(1)
+        finally:
+            if watcher is not None:
+                watcher.stop()
+                watcher.checkpoint.close()
+            if report_stream not in (None, sys.stdout):
+                report_stream.close()
+            for sink in sinks:
+                metrics.remove_sink(sink)
+                sink.close()
+
+        print_cache_stats()
+        if args.stats:
+            print(metrics.histograms.summary())
+        print("Done: " + ", ".join(f"{count} {status}" for status, count in sorted(report.counts.items())))
+    if report.counts.get(FAILED):
         exit(1)
 
 if __name__ == "__main__":
@@ -1,21 +1,36 @@
 import sys
-import json
 import time
-import requests
 import os
+import threading
 from pathlib import Path
+from concurrent.futures import CancelledError
 from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
-    QListWidget, QPushButton, QTableWidget, QTableWidgetItem,
-    QHeaderView, QProgressBar, QFileDialog, QAbstractItemView,
-    QLabel, QSpacerItem, QSizePolicy, QMessageBox
+    QListWidget, QPushButton, QTableView,
+    QHeaderView, QFileDialog, QAbstractItemView,
+    QLabel, QSpacerItem, QSizePolicy, QMessageBox, QSpinBox, QCheckBox, QInputDialog
 )
-from PyQt5.QtCore import Qt, QThread, QObject, pyqtSignal, pyqtSlot, QSettings
-from PyQt5.QtGui import QFont, QColor, QIcon
+from PyQt5.QtCore import Qt, QObject, QTimer, pyqtSignal, pyqtSlot, QSettings
+from PyQt5.QtGui import QFont, QIcon
+from config import (
+    get_credentials, set_credentials_path, pdf_services_url, TARGET_FORMATS, DEFAULT_TARGET_FORMAT, DEFAULT_OCR_LANG,
+    ASSET_DELETE_TIMEOUT
+)
+from cache import get_cache
+from journal import get_journal, run_formats, TOKEN, UPLOADED, SUBMITTED, DONE, SAVED
+# The network stack (requests, tokens, poller, transfer, cluster) is imported where it is used, and loaded by
+# MainWindow.warm_up in the background once the window is up, so it never delays the first paint
+import metrics
+import preflight
+import ratelimit
+from progress_model import ProgressTableModel, ProgressBarDelegate, PROGRESS_COLUMN
+from scheduler import JobScheduler, DEFAULT_MAX_WORKERS, QUEUED, RUNNING, CANCELLED
 
-UPLOAD_TIMEOUT = 300
-POLL_INTERVAL = 10
-MAX_RETRIES = 5
+CACHE_HIT = "cache hit"
+RESUMABLE = "Resumable"
+METRICS_REFRESH_MS = 1000
+CLUSTER_REFRESH_MS = 2000
+STAGE_PROGRESS = {TOKEN: 30, UPLOADED: 50, SUBMITTED: 70, DONE: 90, SAVED: 95}
 
 # Modern color palette
 COLORS = {
@@ -50,7 +65,7 @@ STYLESHEET = f"""
         border: 2px solid {COLORS['primary']};
         border-radius: 4px;
     }}
-    QTableWidget {{
+    QTableView {{
         background-color: white;
         border: 2px solid {COLORS['primary']};
         border-radius: 4px;
@@ -60,169 +75,289 @@ STYLESHEET = f"""
         color: white;
         padding: 6px;
     }}
-    QProgressBar {{
-        border: 1px solid {COLORS['primary']};
-        border-radius: 4px;
-        text-align: center;
-    }}
-    QProgressBar::chunk {{
-        background-color: {COLORS['secondary']};
-        width: 10px;
-    }}
 """
 
-UPLOAD_TIMEOUT = 300
-POLL_INTERVAL = 10
-MAX_RETRIES = 5
+def delete_asset(credentials, access_token, asset_id):
+    """Best-effort delete of an asset no job will use.
+
+    Off the calling thread, so a stopped worker is free at once; the delete
+    finishes on its own. Without access_token the token is fetched there as well.
+    """
+    threading.Thread(target=_delete_asset, args=(credentials, access_token, asset_id), name="delete-asset").start()
+
+
+def _delete_asset(credentials, access_token, asset_id):
+    from http_session import get_no_retry_session
+    from tokens import get_token_provider
+    try:
+        access_token = access_token or get_token_provider(credentials).get_token()
+        # Never retried, so ASSET_DELETE_TIMEOUT really bounds it
+        response = get_no_retry_session().delete(f"{pdf_services_url()}/assets/{asset_id}", headers={
+            "x-api-key": credentials["client_credentials"]["client_id"],
+            "Authorization": f"Bearer {access_token}"
+        }, timeout=ASSET_DELETE_TIMEOUT)
+        if response.status_code not in (200, 204, 404):
+            print(f"Could not delete asset {asset_id}: HTTP {response.status_code}")
+    except Exception as e:
+        print(f"Could not delete asset {asset_id}: {e}")
+
 
 class ConversionWorker(QObject):
     progress_updated = pyqtSignal(str, int)
     finished = pyqtSignal(str, bool, str)
     stopped = pyqtSignal()
 
-    def __init__(self, file_path, credentials):
+    def __init__(self, file_path, credentials, formats=(DEFAULT_TARGET_FORMAT,)):
         super().__init__()
         self.file_path = file_path
         self.credentials = credentials
-        self._is_running = False
-        self.token_cache = None
+        self.formats = formats
+        self.info = None  # Preflight result
+        self.digest = None  # SHA-256 the cache keys were built from; the upload checks the file still matches
+        import transfer
+        # Pauses transfers; cancelling it interrupts every wait and transfer of this worker
+        self.control = transfer.TransferControl()
 
     def get_access_token(self):
-        if self.token_cache and self.token_cache["expires_at"] > time.time():
-            return self.token_cache["access_token"]
-
-        url = "https://ims-na1.adobelogin.com/ims/token/v3"
-        data = {
-            "grant_type": "client_credentials",
-            "client_id": self.credentials["client_credentials"]["client_id"],
-            "client_secret": self.credentials["client_credentials"]["client_secret"],
-            "scope": "openid,AdobeID,read_organizations,exportpdf"
-        }
-        
-        response = requests.post(url, data=data, headers={"Content-Type": "application/x-www-form-urlencoded"}, timeout=30)
-        response.raise_for_status()
-        token_data = response.json()
-        
-        self.token_cache = {
-            "access_token": token_data["access_token"],
-            "expires_at": time.time() + token_data["expires_in"] - 30
-        }
-        return self.token_cache["access_token"]
+        from tokens import get_token_provider
+        # All workers share one provider, so a batch makes a single IMS token request
+        return get_token_provider(self.credentials).get_token()
 
     def run(self):
-        self._is_running = True
         try:
-            output_path = str(Path(self.file_path).with_suffix(".docx"))
-            
-            self.progress_updated.emit(self.file_path, 10)
-            access_token = self.get_access_token()
-            
-            self.progress_updated.emit(self.file_path, 30)
-            asset_id = self.upload_pdf(access_token)
-            
-            self.progress_updated.emit(self.file_path, 50)
-            job_id = self.convert_pdf_to_docx(access_token, asset_id)
-            
-            self.progress_updated.emit(self.file_path, 70)
-            self.poll_and_download_result(access_token, job_id, output_path)
-            
-            self.finished.emit(self.file_path, True, "")
-            self.progress_updated.emit(self.file_path, 100)
-
+            with metrics.timed(metrics.JOB, self.file_path, bytes=os.path.getsize(self.file_path)):
+                self.convert()
+        except CancelledError:
+            self.finished.emit(self.file_path, False, CANCELLED)
         except Exception as e:
             self.finished.emit(self.file_path, False, str(e))
         finally:
             self.stopped.emit()
 
-    def upload_pdf(self, access_token):
-        url = "https://pdf-services.adobe.io/assets"
+    def enqueue(self, pipeline, stop):
+        """Hand the file to a shared StagedPipeline instead of converting it on this thread.
+
+        Blocks while the pipeline is full. The outcome is signalled as by
+        ``run``, once the pipeline is done with the file; with ``stop`` set the
+        file is reported cancelled without being queued.
+        """
+        started = time.monotonic()
+        try:
+            if stop.is_set():
+                raise CancelledError()
+            pending, cache_keys = self.prepare()
+            if not pending:
+                return self.stopped.emit()
+            output_path = pending[DEFAULT_TARGET_FORMAT]
+            future = pipeline.convert(os.path.abspath(self.file_path), output_path)
+        except CancelledError:
+            self.finished.emit(self.file_path, False, CANCELLED)
+            return self.stopped.emit()
+        except Exception as e:
+            self.finished.emit(self.file_path, False, str(e))
+            return self.stopped.emit()
+        future.add_done_callback(lambda future: self.pipeline_done(future, cache_keys.get(DEFAULT_TARGET_FORMAT), output_path, started))
+
+    def pipeline_done(self, future, cache_key, output_path, started):
+        error = CancelledError() if future.cancelled() else future.exception()
+        metrics.emit(metrics.JOB, self.file_path, time.monotonic() - started, ok=error is None)
+        if isinstance(error, CancelledError):
+            self.finished.emit(self.file_path, False, CANCELLED)
+        elif error is not None:
+            self.finished.emit(self.file_path, False, str(error))
+        else:
+            # False means an earlier run saved it, which cannot vouch for this cache key
+            if future.result() and cache_key:
+                get_cache().put(cache_key, output_path)
+            self.finished.emit(self.file_path, True, "")
+            self.progress_updated.emit(self.file_path, 100)
+        self.stopped.emit()
+
+    def prepare(self):
+        """Preflight and cache lookup; returns ({format: output path}, {format: cache key}) for what is left to convert
+
+        The cache keys are empty when the cache is disabled.
+        """
+        outputs = {target_format: str(Path(self.file_path).with_suffix("." + target_format)) for target_format in self.formats}
+        
+        # Rejects corrupt, empty and encrypted files before anything is uploaded
+        self.info = preflight.check(self.file_path)
+        cache = get_cache()
+        # Hashing reads the whole PDF once more than the upload does, for nothing if the cache keeps nothing
+        self.digest = cache.file_digest(self.file_path) if cache.enabled else None
+        cache_keys = {target_format: cache.key_for_digest(self.digest, target_format, self.info.ocr_lang)
+                      for target_format in outputs} if self.digest else {}
+        pending = {target_format: os.path.abspath(path) for target_format, path in outputs.items()
+                   if not cache_keys or not cache.get(cache_keys[target_format], path)}
+        if not pending:
+            self.finished.emit(self.file_path, True, CACHE_HIT)
+            self.progress_updated.emit(self.file_path, 100)
+        else:
+            self.progress_updated.emit(self.file_path, 10)
+        return pending, cache_keys
+
+    def convert(self):
+        pending, cache_keys = self.prepare()
+        if not pending:
+            return
+        cache = get_cache()
+        # One upload serves every format; the row shows the average progress of the exports
+        reached = dict.fromkeys(pending, 10)
+        def on_stage(target_format, stage):
+            reached[target_format] = STAGE_PROGRESS[stage]
+            self.progress_updated.emit(self.file_path, sum(reached.values()) // len(reached))
+        # Stages already recorded in the journal by an interrupted run are skipped
+        converted = run_formats(
+            get_journal(), os.path.abspath(self.file_path), pending,
+            upload=lambda: self.upload_pdf(self.get_access_token(), self.digest),
+            submit=lambda asset_id, target_format: self.convert_pdf_to_docx(self.get_access_token(), asset_id, target_format, self.info.ocr_lang),
+            poll=self.poll_for_result,
+            download=self.download_result,
+            on_stage=on_stage,
+            discard=lambda asset_id: self.delete_asset(None, asset_id),
+            options={"ocr_lang": self.info.ocr_lang}
+        )
+        # Outputs an earlier run saved under other options must not enter the cache under these
+        for target_format, output_path in pending.items():
+            if converted[target_format] and cache_keys:
+                cache.put(cache_keys[target_format], output_path)
+        
+        self.finished.emit(self.file_path, True, "")
+        self.progress_updated.emit(self.file_path, 100)
+
+    def upload_pdf(self, access_token, expected_sha256=None):
+        import transfer
+        from http_session import get_session, abort_on
+        url = f"{pdf_services_url()}/assets"
         headers = {
             "x-api-key": self.credentials["client_credentials"]["client_id"],
             "Authorization": f"Bearer {access_token}",
             "Content-Type": "application/json"
         }
-        response = requests.post(url, json={"mediaType": "application/pdf"}, headers=headers, timeout=30)
-        response.raise_for_status()
-        upload_data = response.json()
-        
-        with open(self.file_path, "rb") as f:
-            requests.put(upload_data["uploadUri"], data=f, headers={"Content-Type": "application/pdf"}, timeout=UPLOAD_TIMEOUT)
+        # Stop aborts the request itself instead of waiting out its timeout
+        with metrics.timed(metrics.ASSET_CREATE, self.file_path) as event, abort_on(self.control):
+            response = ratelimit.get_limiter().send(ratelimit.ASSETS, lambda: get_session().post(
+                url, json={"mediaType": "application/pdf"}, headers=headers, timeout=30
+            ), sleep=self.control.sleep)
+            event.update(metrics.http_fields(response))
+            response.raise_for_status()
+            upload_data = response.json()
         
+        # Byte-level progress between the "token" and "uploaded" marks, hashed in the same pass
+        try:
+            with metrics.timed(metrics.UPLOAD, self.file_path) as event:
+                event["sha256"] = transfer.upload_file(
+                    upload_data["uploadUri"], self.file_path, progress=self.stage_progress(TOKEN, UPLOADED),
+                    control=self.control, event=event, expected_sha256=expected_sha256
+                )
+        except BaseException:
+            # Stopped or failed mid-upload: nothing else knows this assetID, so remove it now
+            self.delete_asset(access_token, upload_data["assetID"])
+            raise
+
         return upload_data["assetID"]
 
-    def convert_pdf_to_docx(self, access_token, asset_id):
-        url = "https://pdf-services.adobe.io/operation/exportpdf"
+    def delete_asset(self, access_token, asset_id):
+        delete_asset(self.credentials, access_token, asset_id)
+
+    def convert_pdf_to_docx(self, access_token, asset_id, target_format=DEFAULT_TARGET_FORMAT, ocr_lang=DEFAULT_OCR_LANG):
+        from http_session import get_session, abort_on
+        url = f"{pdf_services_url()}/operation/exportpdf"
         headers = {
             "x-api-key": self.credentials["client_credentials"]["client_id"],
             "Authorization": f"Bearer {access_token}",
             "Content-Type": "application/json"
         }
-        response = requests.post(url, json={
-            "assetID": asset_id,
-            "targetFormat": "docx",
-            "ocrLang": "en-US"
-        }, headers=headers, timeout=30)
-        response.raise_for_status()
+        with metrics.timed(metrics.SUBMIT, self.file_path, asset_id=asset_id, target_format=target_format) as event, \
+                abort_on(self.control):
+            response = ratelimit.get_limiter().send(ratelimit.SUBMIT, lambda: get_session().post(url, json={
+                "assetID": asset_id,
+                "targetFormat": target_format,
+                "ocrLang": ocr_lang
+            }, headers=headers, timeout=30), sleep=self.control.sleep)
+            event.update(metrics.http_fields(response))
+            response.raise_for_status()
         
         job_id = response.headers.get("Location", "").split("/")[-2]
         if not job_id:
             raise ValueError("Job ID not found in response")
         return job_id
 
+    def track_result(self, job_id):
+        """Hand the job to the shared poller; returns a Future of the download URI"""
+        from poller import get_poller
+        # The shared poller multiplexes all outstanding jobs and supplies fresh tokens itself
+        url = f"{pdf_services_url()}/operation/exportpdf/{job_id}/status"
+        return get_poller(self.credentials).track(url, self.info.size, label=self.file_path,
+                                                  pages=self.info.pages, ocr=self.info.needs_ocr)
+
+    def poll_for_result(self, job_id):
+        future = self.track_result(job_id)
+        with metrics.timed(metrics.REMOTE_WAIT, self.file_path):
+            # Wakes on the result or on stop, whichever comes first; stopping also drops the job from the poller
+            return self.control.result(future)
+
+    def download_result(self, download_uri, output_path):
+        import transfer
+        # Stopping or a failed resume discards the temporary file; output_path is only ever complete
+        with metrics.timed(metrics.DOWNLOAD, self.file_path) as event:
+            transfer.download_file(download_uri, output_path, control=self.control,
+                                   progress=self.stage_progress(DONE, SAVED), event=event)
+
+    def stage_progress(self, start, end):
+        """Transfer progress callback mapping bytes done onto the bar between two stages"""
+        low, high = STAGE_PROGRESS[start], STAGE_PROGRESS[end]
+        def report(done, total):
+            if total:
+                self.progress_updated.emit(self.file_path, low + (high - low) * done // total)
+        return report
+
     def poll_and_download_result(self, access_token, job_id, output_path):
-        url = f"https://pdf-services.adobe.io/operation/exportpdf/{job_id}/status"
-        headers = {
-            "x-api-key": self.credentials["client_credentials"]["client_id"],
-            "Authorization": f"Bearer {access_token}"
-        }
-        retries = 0
-        download_uri = None
-        
-        while retries < MAX_RETRIES and self._is_running:
-            try:
-                response = requests.get(url, headers=headers, timeout=30)
-                response.raise_for_status()
-                status_data = response.json()
-                
-                if status_data.get("status") == "done":
-                    download_uri = status_data.get("downloadUri") or status_data.get("asset", {}).get("downloadUri")
-                    if not download_uri:
-                        raise ValueError("Download URI not found")
-                    break
-                
-                time.sleep(POLL_INTERVAL)
-                retries += 1
-            except Exception as e:
-                if retries >= MAX_RETRIES:
-                    raise e
-                retries += 1
-                time.sleep(POLL_INTERVAL)
-        
-        if not download_uri:
-            raise ValueError("Conversion completed but download URI is missing")
-        
-        response = requests.get(download_uri, stream=True, timeout=UPLOAD_TIMEOUT)
-        response.raise_for_status()
-        with open(output_path, "wb") as f:
-            for chunk in response.iter_content(chunk_size=8192):
-                if not self._is_running:
-                    break
-                f.write(chunk)    
+        download_uri = self.poll_for_result(job_id)
+        self.download_result(download_uri, output_path)
     
     def stop(self):
-        self._is_running = False
+        self.control.cancel()
+
+    def pause(self):
+        self.control.pause()
+
+    def resume(self):
+        self.control.resume()
 
 class MainWindow(QMainWindow):
+    job_state_changed = pyqtSignal(str, str)
+    async_progress = pyqtSignal(str, int)
+    async_finished = pyqtSignal(str, bool, str)
+    cluster_status = pyqtSignal(object)
+    warmed_up = pyqtSignal(bool, str)
+
     def __init__(self):
         super().__init__()
         self.workers = []
-        self.threads = []
-        self.credentials_path = None
+        self.engine = None  # Async engine thread, created on first use
+        self.pipeline = None  # StagedPipeline, created on first use
+        self.pipeline_workers = {}  # Absolute file path -> ConversionWorker whose file is in the pipeline
+        self.pipeline_stop = threading.Event()  # Set by Stop All for the files still being fed in
+        self.cluster_client = None  # Set while monitoring a coordinator
+        self._cluster_fetching = False
         self.settings = QSettings("PDFConverter", "PDFtoDOCX")  # For Remember Me feature
+        # Scheduler callbacks fire on pool threads; the signal hops them onto the GUI thread
+        self.job_state_changed.connect(self.update_job_state)
+        self.async_progress.connect(self.update_progress)
+        self.async_finished.connect(self.conversion_finished)
+        self.cluster_status.connect(self.update_cluster)
+        self.warmed_up.connect(self.show_credentials_status)
+        self.scheduler = JobScheduler(
+            max_workers=int(self.settings.value("max_workers", DEFAULT_MAX_WORKERS)),
+            on_state_change=lambda job: self.job_state_changed.emit(job.key, job.state)
+        )
         self.initUI()
         self.load_credentials()
         self.setStyleSheet(STYLESHEET)
         self.setWindowIcon(QIcon(self.resource_path("favicon.ico")))  # Set favicon
+        # Runs from the event loop, i.e. once the window has been shown and painted
+        QTimer.singleShot(0, self.after_show)
         
     def resource_path(self, relative_path):
         """Get the absolute path to a resource, works for dev and for PyInstaller"""
@@ -253,6 +388,9 @@ class MainWindow(QMainWindow):
         self.btn_choose_key = QPushButton("🔑 Choose Key")
         self.btn_choose_key.clicked.connect(self.choose_credentials)
         credentials_layout.addWidget(self.btn_choose_key)
+        self.credentials_label = QLabel("🔑 Checking credentials…")
+        self.credentials_label.setWordWrap(True)
+        credentials_layout.addWidget(self.credentials_label, 1)
         
         # File selection controls
         control_layout = QHBoxLayout()
@@ -276,24 +414,88 @@ class MainWindow(QMainWindow):
         right_panel = QVBoxLayout()
         right_panel.setSpacing(15)
         
-        self.table = QTableWidget(0, 3)
-        self.table.setHorizontalHeaderLabels(["File Name", "Progress", "Status"])
+        self.progress_model = ProgressTableModel(COLORS, self)
+        self.table = QTableView()
+        self.table.setModel(self.progress_model)
+        self.table.setItemDelegateForColumn(PROGRESS_COLUMN, ProgressBarDelegate(COLORS, self.table))
         self.table.horizontalHeader().setSectionResizeMode(0, QHeaderView.Stretch)
+        # Fixed row heights let the view skip measuring every row when thousands are listed
+        self.table.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
         self.table.verticalHeader().setVisible(False)
         self.table.setFont(QFont("Segoe UI", 10))
-        self.table.setEditTriggers(QTableWidget.NoEditTriggers)
+        self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectRows)
         
         # Action buttons
         button_layout = QHBoxLayout()
         self.btn_start = QPushButton("🚀 Start Conversion")
         self.btn_stop = QPushButton("⛔ Stop All")
+        self.btn_pause = QPushButton("⏸ Pause")
+        self.btn_pause.setCheckable(True)
+        self.btn_pause.setToolTip("Hold uploads and downloads mid-file; conversions already at Adobe keep running")
+        self.btn_pause.toggled.connect(self.pause_transfers)
         self.btn_start.clicked.connect(self.start_conversion)
         self.btn_stop.clicked.connect(self.stop_all)
+        self.spin_workers = QSpinBox()
+        self.spin_workers.setRange(1, 32)
+        self.spin_workers.setValue(self.scheduler.max_workers)
+        self.spin_workers.setToolTip("Maximum number of files converted at the same time")
+        self.spin_workers.valueChanged.connect(self.set_max_workers)
+        self.chk_async = QCheckBox("Async engine")
+        self.chk_async.setToolTip("Drive all files from one event loop instead of the worker pool")
+        self.chk_async.setChecked(self.settings.value("async_engine", False, type=bool))
+        self.chk_async.toggled.connect(lambda checked: self.settings.setValue("async_engine", checked))
+        self.chk_pipeline = QCheckBox("Staged pipeline")
+        self.chk_pipeline.setToolTip("Upload, submit and download on separate pools, so one file uploads while others "
+                                     "convert at Adobe or download (DOCX only)")
+        self.chk_pipeline.setChecked(self.settings.value("staged_pipeline", False, type=bool)
+                                     and not self.chk_async.isChecked())
+        self.chk_pipeline.toggled.connect(lambda checked: self.settings.setValue("staged_pipeline", checked))
+        # One engine at a time
+        self.chk_async.toggled.connect(lambda checked: checked and self.chk_pipeline.setChecked(False))
+        self.chk_pipeline.toggled.connect(lambda checked: checked and self.chk_async.setChecked(False))
+        self.btn_cluster = QPushButton("🛰 Monitor Cluster")
+        self.btn_cluster.setCheckable(True)
+        self.btn_cluster.setToolTip("Show the jobs and workers of a coordinator started with convert.py --serve")
+        self.btn_cluster.toggled.connect(self.monitor_cluster)
+        format_layout = QHBoxLayout()
+        format_layout.addWidget(QLabel("Export as:"))
+        saved_formats = self.settings.value("target_formats", DEFAULT_TARGET_FORMAT).split(",")
+        self.format_checks = {}
+        for target_format in TARGET_FORMATS:
+            check = QCheckBox(target_format.upper())
+            check.setChecked(target_format in saved_formats)
+            check.toggled.connect(self.save_target_formats)
+            format_layout.addWidget(check)
+            self.format_checks[target_format] = check
+        format_layout.addStretch()
+        button_layout.addWidget(QLabel("Parallel:"))
+        button_layout.addWidget(self.spin_workers)
+        button_layout.addWidget(self.chk_async)
+        button_layout.addWidget(self.chk_pipeline)
+        button_layout.addWidget(self.btn_cluster)
         button_layout.addWidget(self.btn_start)
+        button_layout.addWidget(self.btn_pause)
         button_layout.addWidget(self.btn_stop)
         
+        right_panel.addLayout(format_layout)
         right_panel.addWidget(QLabel("Conversion Progress:"))
         right_panel.addWidget(self.table)
+        self.cache_label = QLabel()
+        right_panel.addWidget(self.cache_label)
+        self.update_cache_label()
+        self.metrics_label = QLabel()
+        self.metrics_label.setWordWrap(True)
+        right_panel.addWidget(self.metrics_label)
+        self.metrics_timer = QTimer(self)
+        self.metrics_timer.timeout.connect(self.update_metrics_label)
+        self.metrics_timer.timeout.connect(self.update_cache_label)
+        self.metrics_timer.start(METRICS_REFRESH_MS)
+        self.cluster_label = QLabel()
+        self.cluster_label.setWordWrap(True)
+        right_panel.addWidget(self.cluster_label)
+        self.cluster_timer = QTimer(self)
+        self.cluster_timer.timeout.connect(self.fetch_cluster_status)
         right_panel.addLayout(button_layout)
 
         # Add panels to main layout
@@ -310,23 +512,50 @@ class MainWindow(QMainWindow):
             self, "Choose Credentials File", "", "JSON Files (*.json)"
         )
         if file_path:
-            self.credentials_path = file_path
-            self.settings.setValue("credentials_path", self.credentials_path)  # Save path
+            self.settings.setValue("credentials_path", file_path)  # Save path
             self.load_credentials()
-            
+            self.credentials_label.setText("🔑 Checking credentials…")
+            self.warm_up()
+
     def load_credentials(self):
-        """Load credentials from the selected file or last saved path"""
-        self.credentials_path = self.settings.value("credentials_path")  # Load saved path
-        if self.credentials_path and os.path.exists(self.credentials_path):
+        """Use the last chosen key file, else $PDFSERVICES_CREDENTIALS or the config file; read on first use"""
+        saved_path = self.settings.value("credentials_path")
+        if saved_path and os.path.exists(saved_path):
+            set_credentials_path(saved_path)
+
+    def after_show(self):
+        self.restore_incomplete()
+        self.warm_up()
+
+    def warm_up(self):
+        """Load the network stack, fetch a token and open the API connections in the background.
+
+        The first Start then finds all of it ready, and a missing or rejected
+        key shows up next to "Choose Key" instead of in a dialog at startup.
+        """
+        pool_size = self.scheduler.max_workers
+
+        def warm():
             try:
-                with open(self.credentials_path, "r") as f:
-                    self.credentials = json.load(f)
-                print("Credentials loaded successfully!")
+                import http_session
+                import poller  # noqa: F401
+                import transfer  # noqa: F401
+                from tokens import get_token_provider
+                http_session.configure(pool_size=pool_size)
+                get_token_provider(get_credentials()).get_token()
+                http_session.warm(pdf_services_url())
             except Exception as e:
-                QMessageBox.critical(self, "Error", f"Failed to load credentials: {e}")
+                self.warmed_up.emit(False, str(e))
+            else:
+                self.warmed_up.emit(True, "")
+        threading.Thread(target=warm, name="warm-up", daemon=True).start()
+
+    def show_credentials_status(self, ok, message):
+        if ok:
+            self.credentials_label.setText("🔑 Connected to Adobe")
         else:
-            QMessageBox.warning(self, "Warning", "No credentials file selected.")
-            
+            self.credentials_label.setText(f"🔑 {message}")
+        self.credentials_label.setToolTip(message)
 
     def select_files(self):
         """Open file dialog to select PDF files"""
@@ -337,109 +566,290 @@ class MainWindow(QMainWindow):
             "PDF Files (*.pdf)"
         )
         if files:
-            self.file_list.addItems(files)
-            for file in files:
-                self.add_progress_row(file)                                
-        
-    def select_files(self):
-        """Open file dialog to select PDF files"""
-        files, _ = QFileDialog.getOpenFileNames(
-            self, 
-            "Select PDF Files", 
-            "", 
-            "PDF Files (*.pdf)"
-        )
-        if files:
-            self.file_list.addItems(files)
-            for file in files:
-                self.add_progress_row(file)        
+            self.add_files(files)        
+
+    def restore_incomplete(self):
+        """Re-list files an earlier session started but never finished; Start resumes them"""
+        for file_path in self.add_files([path for path in get_journal().incomplete() if os.path.exists(path)]):
+            self.update_job_state(file_path, RESUMABLE)
 
     def clear_all_files(self):
         """Clear all selected files and progress"""
         self.file_list.clear()
-        self.table.setRowCount(0)
+        self.progress_model.clear()
         self.stop_all()
 
-    def load_credentials(self):
-        try:
-            with open("X:/adobe/pdfservices-api-credentials.json", "r") as f:
-                self.credentials = json.load(f)
-        except Exception as e:
-            print(f"Error loading credentials: {e}")
+    def add_files(self, files):
+        """List files for conversion, skipping ones already listed; returns the ones added"""
+        added = self.progress_model.add_files(files)
+        self.file_list.addItems(added)
+        return added
 
-    def select_files(self):
-        files, _ = QFileDialog.getOpenFileNames(self, "Select PDF Files", "", "PDF Files (*.pdf)")
-        if files:
-            self.file_list.addItems(files)
-            for file in files:
-                self.add_progress_row(file)
-
-    def add_progress_row(self, file_path):
-        row = self.table.rowCount()
-        self.table.insertRow(row)
-        self.table.setItem(row, 0, QTableWidgetItem(Path(file_path).name))
-        progress = QProgressBar()
-        progress.setValue(0)
-        self.table.setCellWidget(row, 1, progress)
-        self.table.setItem(row, 2, QTableWidgetItem("Pending"))
+    def target_formats(self):
+        return tuple(target_format for target_format, check in self.format_checks.items() if check.isChecked())
+
+    def save_target_formats(self):
+        self.settings.setValue("target_formats", ",".join(self.target_formats()))
 
     def start_conversion(self):
-        for i in range(self.file_list.count()):
-            file_path = self.file_list.item(i).text()
-            self.start_worker(file_path)
+        formats = self.target_formats()
+        if not formats:
+            QMessageBox.warning(self, "No Format", "Select at least one format to export.")
+            return
+        if self.chk_async.isChecked() and formats != (DEFAULT_TARGET_FORMAT,):
+            QMessageBox.warning(self, "Async Engine", "The async engine only exports DOCX; untick it to export other formats.")
+            return
+        if self.chk_pipeline.isChecked() and formats != (DEFAULT_TARGET_FORMAT,):
+            QMessageBox.warning(self, "Staged Pipeline", "The staged pipeline only exports DOCX; untick it to export other formats.")
+            return
+        try:
+            credentials = get_credentials()
+        except Exception as e:
+            QMessageBox.critical(self, "Credentials", f"{e}\n\nClick \"🔑 Choose Key\" to select your credentials file.")
+            return
+        file_paths = [self.file_list.item(i).text() for i in range(self.file_list.count())]
+        if self.chk_pipeline.isChecked():
+            return self.start_pipelined(file_paths, credentials)
+        for file_path in file_paths:
+            if self.chk_async.isChecked():
+                self.start_async(file_path, credentials)
+            else:
+                self.start_worker(file_path, credentials, formats)
 
-    def start_worker(self, file_path):
-        worker = ConversionWorker(file_path, self.credentials)
-        thread = QThread()
-        worker.moveToThread(thread)
+    def start_worker(self, file_path, credentials, formats=(DEFAULT_TARGET_FORMAT,)):
+        worker = ConversionWorker(file_path, credentials, formats)
+        if self.btn_pause.isChecked():
+            worker.pause()
 
         worker.progress_updated.connect(self.update_progress)
         worker.finished.connect(self.conversion_finished)
-        thread.started.connect(worker.run)
-        worker.stopped.connect(thread.quit)
+        worker.stopped.connect(lambda worker=worker: self.forget_worker(worker))
         worker.stopped.connect(worker.deleteLater)
-        thread.finished.connect(thread.deleteLater)
 
         self.workers.append(worker)
-        self.threads.append(thread)
-        thread.start()
+        # The scheduler runs worker.run on one of its pool threads once a slot is free
+        self.scheduler.submit(file_path, worker.run)
+
+    def start_pipelined(self, file_paths, credentials):
+        """Feed files into the shared StagedPipeline; a feeder thread waits whenever the pipeline is full"""
+        if self.pipeline is None:
+            self.pipeline = self.make_pipeline(credentials)
+        self.pipeline_stop = stop = threading.Event()
+        workers = []
+        for file_path in file_paths:
+            key = os.path.abspath(file_path)
+            if key in self.pipeline_workers:
+                continue  # Still in the pipeline from an earlier Start
+            worker = ConversionWorker(file_path, credentials)
+            if self.btn_pause.isChecked():
+                worker.pause()
+            worker.progress_updated.connect(self.update_progress)
+            worker.finished.connect(self.conversion_finished)
+            worker.stopped.connect(lambda worker=worker, key=key: self.forget_worker(worker, key))
+            worker.stopped.connect(worker.deleteLater)
+            self.workers.append(worker)
+            self.pipeline_workers[key] = worker
+            self.update_job_state(file_path, QUEUED)
+            workers.append(worker)
+
+        def feed():
+            for worker in workers:
+                worker.enqueue(self.pipeline, stop)
+        threading.Thread(target=feed, name="pipeline-feed", daemon=True).start()
+
+    def make_pipeline(self, credentials):
+        """A StagedPipeline whose stages call the worker of the file at hand, so Pause and Stop reach them"""
+        import http_session
+        from pipeline import StagedPipeline, DEFAULT_UPLOAD_WORKERS, DEFAULT_SUBMIT_WORKERS, DEFAULT_DOWNLOAD_WORKERS
+        from poller import MAX_CONCURRENT_POLLS
+        workers = self.pipeline_workers
+        http_session.configure(pool_size=DEFAULT_UPLOAD_WORKERS + DEFAULT_SUBMIT_WORKERS + DEFAULT_DOWNLOAD_WORKERS
+                               + MAX_CONCURRENT_POLLS)
+
+        def upload(file_path):
+            worker = workers[file_path]
+            return worker.upload_pdf(worker.get_access_token(), worker.digest)
+
+        def submit(file_path, asset_id):
+            worker = workers[file_path]
+            return worker.convert_pdf_to_docx(worker.get_access_token(), asset_id, DEFAULT_TARGET_FORMAT, worker.info.ocr_lang)
+
+        def on_stage(file_path, stage):
+            # Signals, since stages report from pool and poller threads
+            if stage == TOKEN:
+                self.job_state_changed.emit(workers[file_path].file_path, RUNNING)  # Accepted into the pipeline
+            self.async_progress.emit(workers[file_path].file_path, STAGE_PROGRESS[stage])
+
+        def track(file_path, job_id):
+            started = time.monotonic()
+            future = workers[file_path].track_result(job_id)
+            future.add_done_callback(lambda f: metrics.emit(
+                metrics.REMOTE_WAIT, file_path, time.monotonic() - started, ok=not f.cancelled() and f.exception() is None
+            ))
+            return future
+
+        return StagedPipeline(
+            upload=upload,
+            submit=submit,
+            track=track,
+            download=lambda file_path, download_uri, output_path: workers[file_path].download_result(download_uri, output_path),
+            on_stage=on_stage,
+            discard=lambda asset_id: delete_asset(credentials, None, asset_id),
+            options=lambda file_path: {"ocr_lang": workers[file_path].info.ocr_lang}
+        )
+
+    def start_async(self, file_path, credentials):
+        if self.engine is None:
+            from async_engine import EngineThread  # aiohttp is only needed for this mode
+            self.engine = EngineThread(credentials)
+        self.update_job_state(file_path, RUNNING)
+        # Callbacks run on the engine's loop thread; emitting signals queues them to the GUI thread
+        future = self.engine.submit(file_path, progress=self.async_progress.emit)
+        future.add_done_callback(lambda f, file_path=file_path: self.async_done(file_path, f))
+
+    def async_done(self, file_path, future):
+        if future.cancelled():
+            self.async_finished.emit(file_path, False, "Cancelled")
+        elif future.exception():
+            self.async_finished.emit(file_path, False, str(future.exception()))
+        else:
+            self.async_finished.emit(file_path, True, "" if future.result() else CACHE_HIT)
+
+    def forget_worker(self, worker, pipeline_key=None):
+        # Stop All may have cleared the list already
+        if worker in self.workers:
+            self.workers.remove(worker)
+        if pipeline_key is not None and self.pipeline_workers.get(pipeline_key) is worker:
+            del self.pipeline_workers[pipeline_key]
+
+    def set_max_workers(self, value):
+        import http_session
+        self.scheduler.set_max_workers(value)
+        http_session.configure(pool_size=value)
+        self.settings.setValue("max_workers", value)
+
+    def update_job_state(self, file_path, state):
+        if state not in (QUEUED, RUNNING, CANCELLED, RESUMABLE):
+            return  # Final states are reported by conversion_finished
+        self.progress_model.set_status(file_path, state)
 
     def update_progress(self, file_path, progress):
-        for row in range(self.table.rowCount()):
-            if self.table.item(row, 0).text() == Path(file_path).name:
-                progress_bar = self.table.cellWidget(row, 1)
-                progress_bar.setValue(progress)
-                
-                # Update progress bar color based on percentage
-                if progress < 33:
-                    color = COLORS['danger']
-                elif progress < 66:
-                    color = COLORS['primary']
-                else:
-                    color = COLORS['success']
-                
-                progress_bar.setStyleSheet(f"""
-                    QProgressBar::chunk {{
-                        background-color: {color};
-                    }}
-                """)
-                
+        # The model coalesces updates; the delegate picks the bar color from the value
+        self.progress_model.set_progress(file_path, progress)
+
     def conversion_finished(self, file_path, success, message):
-        for row in range(self.table.rowCount()):
-            if self.table.item(row, 0).text() == Path(file_path).name:
-                status_item = self.table.item(row, 2)
-                if success:
-                    status_item.setText("✅ Completed")
-                    status_item.setForeground(QColor(COLORS['success']))
-                else:
-                    status_item.setText(f"❌ Failed: {message}")
-                    status_item.setForeground(QColor(COLORS['danger']))
+        if message == CANCELLED:
+            self.progress_model.set_status(file_path, CANCELLED)
+        elif success and message == CACHE_HIT:
+            self.progress_model.set_status(file_path, "✅ Completed (cached)", COLORS['success'])
+        elif success:
+            self.progress_model.set_status(file_path, "✅ Completed", COLORS['success'])
+        else:
+            self.progress_model.set_status(file_path, f"❌ Failed: {message}", COLORS['danger'])
+
+    def update_cache_label(self):
+        stats = get_cache().stats()
+        self.cache_label.setText(f"Cache: {stats['hits']} hits / {stats['misses']} misses")
+
+    def update_metrics_label(self):
+        """Show live throughput and where time goes, to tell upload bandwidth from Adobe queue time"""
+        rates = metrics.histograms.throughput()
+        stage_times = []
+        for stage in (metrics.UPLOAD, metrics.SUBMIT, metrics.REMOTE_WAIT, metrics.DOWNLOAD, metrics.JOB):
+            mean = metrics.histograms.mean(stage)
+            if mean is not None:
+                stage_times.append(f"{stage} {mean:.1f}s")
+        self.metrics_label.setText(
+            f"Upload {rates['upload_mb_s']:.2f} MB/s · Download {rates['download_mb_s']:.2f} MB/s · "
+            f"{rates['jobs_per_min']:.1f} jobs/min"
+            + (f"\nAverage stage time: {', '.join(stage_times)}" if stage_times else "")
+        )
+
+    def pause_transfers(self, paused):
+        self.btn_pause.setText("▶ Resume" if paused else "⏸ Pause")
+        for worker in self.workers:
+            if paused:
+                worker.pause()
+            else:
+                worker.resume()
+
+    def monitor_cluster(self, enabled):
+        """Follow a coordinator's queue in the progress table; the conversions run on its workers"""
+        import cluster
+        self.cluster_timer.stop()
+        if self.cluster_client is not None:
+            self.cluster_client.close()
+            self.cluster_client = None
+        if not enabled:
+            self.cluster_label.clear()
+            return
+        url, ok = QInputDialog.getText(self, "Monitor Cluster", "Coordinator URL:", text=self.settings.value(
+            "cluster_url", f"http://127.0.0.1:{cluster.DEFAULT_PORT}"))
+        if not ok or not url.strip():
+            self.btn_cluster.setChecked(False)
+            return
+        self.settings.setValue("cluster_url", url.strip())
+        self.cluster_client = cluster.CoordinatorClient(url.strip(), os.environ.get(cluster.SECRET_ENV))
+        self.cluster_label.setText(f"Connecting to {url.strip()}…")
+        self.fetch_cluster_status()
+        self.cluster_timer.start(CLUSTER_REFRESH_MS)
+
+    def fetch_cluster_status(self):
+        # The request runs off the GUI thread; the signal brings the answer back
+        client = self.cluster_client
+        if client is None or self._cluster_fetching:
+            return
+        self._cluster_fetching = True
+
+        def fetch():
+            try:
+                status = client.call("/status")
+            except Exception as e:
+                status = {"error": str(e)}
+            self._cluster_fetching = False
+            self.cluster_status.emit(status)
+        threading.Thread(target=fetch, name="cluster-status", daemon=True).start()
+
+    def update_cluster(self, status):
+        import cluster
+        if self.cluster_client is None:
+            return
+        if "error" in status:
+            self.cluster_label.setText(f"Cluster: {status['error']}")
+            return
+        jobs = status["jobs"]
+        self.progress_model.add_files([job["file_path"] for job in jobs])
+        for job in jobs:
+            file_path = job["file_path"]
+            if job["state"] == cluster.DONE:
+                self.progress_model.set_progress(file_path, 100)
+                self.progress_model.set_status(file_path, "✅ Completed" + (" (cached)" if job["status"] == "cached" else ""), COLORS['success'])
+            elif job["state"] == cluster.FAILED:
+                self.progress_model.set_status(file_path, f"❌ Failed: {job['error']}", COLORS['danger'])
+            elif job["state"] == cluster.LEASED:
+                stages = [entry.get("stage") for entry in job["stages"].values()]
+                reached = [STAGE_PROGRESS[stage] for stage in stages if stage in STAGE_PROGRESS]
+                self.progress_model.set_progress(file_path, min(reached) if len(reached) == len(job["formats"]) else 10)
+                self.progress_model.set_status(file_path, f"Running on {job['worker']}")
+            else:
+                self.progress_model.set_status(file_path, QUEUED)
+        counts = status["counts"]
+        workers = ", ".join(f"{name} ({info['done']} done, seen {info['idle']:.0f}s ago)" for name, info in status["workers"].items())
+        self.cluster_label.setText(
+            f"Cluster: {counts[cluster.QUEUED]} queued, {counts[cluster.LEASED]} running, "
+            f"{counts[cluster.DONE]} done, {counts[cluster.FAILED]} failed" + (f"\nWorkers: {workers}" if workers else "")
+        )
 
     def stop_all(self):
+        self.scheduler.cancel_pending()
+        if self.engine is not None:
+            self.engine.cancel_all()
+        self.pipeline_stop.set()
+        if self.pipeline is not None:
+            self.pipeline.cancel_pending()
         for worker in self.workers:
             worker.stop()
         self.workers.clear()
-        self.threads.clear()
         
 if __name__ == "__main__":
     app = QApplication(sys.argv)
@@ -0,0 +1,198 @@
+import contextlib
+import socket
+import threading
+from concurrent.futures import CancelledError
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.util.retry import Retry
+from config import ims_url, pdf_services_url
+
+DEFAULT_POOL_SIZE = 4
+DEFAULT_MAX_RETRIES = 3
+DEFAULT_BACKOFF_FACTOR = 1.0
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+# POST is left out on purpose: retrying asset creation or job submission can duplicate work
+RETRY_METHODS = ("GET", "PUT", "HEAD", "DELETE")
+
+_config = {
+    "pool_size": DEFAULT_POOL_SIZE,
+    "max_retries": DEFAULT_MAX_RETRIES,
+    "backoff_factor": DEFAULT_BACKOFF_FACTOR,
+    # Token requests are rare, so IMS gets a small pool regardless of concurrency
+    "ims_pool_size": 2,
+    "host_pool_sizes": {},
+}
+_session = None
+_no_retry_session = None
+_lock = threading.Lock()
+_local = threading.local()  # The control that abort_on ties this thread's requests to
+
+
+class _AbortableMixin:
+    """Connection whose socket a cancel from another thread can shut down mid-request."""
+
+    def request(self, *args, **kwargs):
+        self._owner = object()  # A stale abort must not hit whoever takes the connection from the pool next
+        control = getattr(_local, "control", None)
+        if control is not None:
+            if control.cancelled:
+                raise CancelledError("Request cancelled")  # Also stops urllib3 retrying an aborted request
+            owner = self._owner
+            _local.unregisters.append(control.on_cancel(lambda: self._abort(owner)))
+        return super().request(*args, **kwargs)
+
+    def _abort(self, owner):
+        sock = self.sock
+        if sock is not None and self._owner is owner:
+            try:
+                # Unlike close(), shutdown wakes a thread blocked in send or recv on this socket
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+
+class _AbortableHTTPConnection(_AbortableMixin, HTTPConnection):
+    pass
+
+
+class _AbortableHTTPSConnection(_AbortableMixin, HTTPSConnection):
+    pass
+
+
+class _AbortableHTTPPool(HTTPConnectionPool):
+    ConnectionCls = _AbortableHTTPConnection
+
+
+class _AbortableHTTPSPool(HTTPSConnectionPool):
+    ConnectionCls = _AbortableHTTPSConnection
+
+
+class _AbortableAdapter(HTTPAdapter):
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {"http": _AbortableHTTPPool, "https": _AbortableHTTPSPool}
+
+
+@contextlib.contextmanager
+def abort_on(control):
+    """Let ``control.cancel()`` abort the requests this thread makes inside the block.
+
+    The cancel shuts the request's socket, so a thread blocked sending a body or
+    waiting for a response fails at once instead of when the timeout expires, and
+    whatever the aborted request raised leaves the block as CancelledError.
+    ``control`` is a ``transfer.TransferControl``; None makes this a no-op.
+    """
+    if control is None:
+        yield
+        return
+    previous = getattr(_local, "control", None), getattr(_local, "unregisters", None)
+    _local.control, _local.unregisters = control, []
+    try:
+        yield
+    except Exception:
+        if control.cancelled:
+            raise CancelledError("Request cancelled") from None
+        raise
+    finally:
+        for unregister in _local.unregisters:
+            unregister()
+        _local.control, _local.unregisters = previous
+
+
+def _make_adapter(pool_size, retries=True):
+    retry = Retry(
+        total=_config["max_retries"] if retries else 0,
+        backoff_factor=_config["backoff_factor"],
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=RETRY_METHODS,
+        respect_retry_after_header=True,
+        raise_on_status=False
+    )
+    # pool_block keeps the number of sockets per host at pool_size instead of opening extras
+    return _AbortableAdapter(pool_connections=4, pool_maxsize=pool_size, max_retries=retry, pool_block=True)
+
+
+def _build_session(retries=True):
+    session = requests.Session()
+    pool_size = _config["pool_size"]
+    # The catch-all adapter also serves the presigned storage hosts used for upload/download
+    session.mount("https://", _make_adapter(pool_size, retries))
+    session.mount("http://", _make_adapter(pool_size, retries))
+    session.mount(pdf_services_url(), _make_adapter(pool_size, retries))
+    if ims_url() != pdf_services_url():
+        session.mount(ims_url(), _make_adapter(_config["ims_pool_size"], retries))
+    for host, size in _config["host_pool_sizes"].items():
+        session.mount(host, _make_adapter(size, retries))
+    return session
+
+
+def get_session():
+    """Return the process-wide keep-alive session used for every Adobe API call."""
+    global _session
+    with _lock:
+        if _session is None:
+            _session = _build_session()
+        return _session
+
+
+def get_no_retry_session():
+    """Session that never retries, for best-effort calls such as cleanup that must end within their timeout,
+    and for callers like the status poller that handle throttling and retries themselves."""
+    global _no_retry_session
+    with _lock:
+        if _no_retry_session is None:
+            _no_retry_session = _build_session(retries=False)
+        return _no_retry_session
+
+
+def configure(pool_size=None, max_retries=None, backoff_factor=None, host_pool_sizes=None):
+    """Resize the connection pools or change the retry policy.
+
+    ``pool_size`` should match the worker concurrency. In-flight requests keep the
+    old pools; new requests use the rebuilt session. Nothing is rebuilt when the
+    settings do not change, so warm connections survive repeated calls.
+    """
+    global _session, _no_retry_session
+    with _lock:
+        previous = dict(_config, host_pool_sizes=dict(_config["host_pool_sizes"]))
+        if pool_size is not None:
+            _config["pool_size"] = max(int(pool_size), 1)
+        if max_retries is not None:
+            _config["max_retries"] = max_retries
+        if backoff_factor is not None:
+            _config["backoff_factor"] = backoff_factor
+        if host_pool_sizes is not None:
+            _config["host_pool_sizes"].update(host_pool_sizes)
+        if _config == previous:
+            return
+        # Rebuilt by the next get_session, so configuring at startup costs nothing
+        old = [_session, _no_retry_session]
+        _session = _no_retry_session = None
+    for session in old:
+        if session is not None:
+            # Closing only drops idle connections; requests in flight finish on their own sockets
+            session.close()
+
+
+def warm(*urls, timeout=5):
+    """Open a keep-alive connection to each URL's host in advance, so the first real request skips the handshake.
+
+    Best effort: any answer, even an error status, leaves a pooled connection behind.
+    """
+    for url in urls:
+        try:
+            get_session().head(url, timeout=timeout).close()
+        except requests.RequestException:
+            pass
+
+
+def close():
+    global _session, _no_retry_session
+    with _lock:
+        old = [_session, _no_retry_session]
+        _session = _no_retry_session = None
+    for session in old:
+        if session is not None:
+            session.close()
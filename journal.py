@@ -0,0 +1,325 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import CancelledError
+from config import DEFAULT_TARGET_FORMAT
+
+DEFAULT_JOURNAL_PATH = os.path.join(os.path.expanduser("~"), ".cache", "pdf-to-word", "journal.sqlite3")
+
+# Stage order; each one is recorded once it has durably completed
+TOKEN = "token"
+UPLOADED = "uploaded"
+SUBMITTED = "submitted"
+DONE = "done"
+SAVED = "saved"
+STAGES = (TOKEN, UPLOADED, SUBMITTED, DONE, SAVED)
+
+_journal = None
+_journal_lock = threading.Lock()
+
+
+class JobJournal:
+    """SQLite journal of per-file stage transitions so interrupted batches can resume.
+
+    Each file has one row per target format holding its last completed stage and
+    the remote handles needed to continue from there (assetID, job ID, download
+    URI), along with the export options the job was started with. Rows are
+    invalidated automatically when the input file's size or mtime changes.
+    Listeners added with ``add_listener`` hear of every recorded stage.
+    """
+
+    def __init__(self, path=DEFAULT_JOURNAL_PATH):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.listeners = []  # callback(file_path, target_format, stage, fields), fields including output_path if given
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._create_table()
+
+    def _create_table(self):
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(jobs)")]
+        if columns and "target_format" not in columns:
+            # Journals from before multi-format support hold DOCX jobs keyed by file path alone
+            self._conn.execute("BEGIN")
+            self._conn.execute("ALTER TABLE jobs RENAME TO jobs_v1")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                file_path TEXT NOT NULL,
+                target_format TEXT NOT NULL,
+                output_path TEXT,
+                stage TEXT NOT NULL,
+                size INTEGER,
+                mtime REAL,
+                asset_id TEXT,
+                job_id TEXT,
+                download_uri TEXT,
+                updated_at REAL,
+                options TEXT,
+                PRIMARY KEY (file_path, target_format)
+            )
+        """)
+        if columns and "target_format" not in columns:
+            self._conn.execute(
+                "INSERT INTO jobs (file_path, target_format, output_path, stage, size, mtime, asset_id, job_id, download_uri, updated_at) "
+                "SELECT file_path, ?, output_path, stage, size, mtime, asset_id, job_id, download_uri, updated_at FROM jobs_v1",
+                (DEFAULT_TARGET_FORMAT,)
+            )
+            self._conn.execute("DROP TABLE jobs_v1")
+            self._conn.execute("COMMIT")
+        elif columns and "options" not in columns:
+            # Rows from before options were recorded match no options, so those files convert afresh once
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN options TEXT")
+
+    def get(self, file_path, target_format=DEFAULT_TARGET_FORMAT, options=None):
+        """Return the journal row for file_path, or None if absent or the file has changed.
+
+        With ``options`` (as from ``encode_options``), a row started with
+        different export options counts as absent too: its job produces a
+        different document.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT file_path, output_path, stage, size, mtime, asset_id, job_id, download_uri, updated_at, options "
+                "FROM jobs WHERE file_path = ? AND target_format = ?", (file_path, target_format)
+            ).fetchone()
+        if row is None:
+            return None
+        entry = dict(zip(("file_path", "output_path", "stage", "size", "mtime", "asset_id", "job_id", "download_uri",
+                          "updated_at", "options"), row))
+        entry["target_format"] = target_format
+        try:
+            stat = os.stat(file_path)
+        except FileNotFoundError:
+            return None
+        if entry["size"] != stat.st_size or entry["mtime"] != stat.st_mtime:
+            self.reset(file_path)  # Every format's handles refer to the old contents
+            return None
+        if options is not None and entry["options"] != options:
+            return None
+        return entry
+
+    def record(self, file_path, stage, output_path=None, target_format=DEFAULT_TARGET_FORMAT, **fields):
+        """Record that file_path has completed ``stage``; extra fields are asset_id, job_id, download_uri, options."""
+        if stage not in STAGES:
+            raise ValueError(f"Unknown stage: {stage}")
+        stat = os.stat(file_path)
+        columns = {"stage": stage, "size": stat.st_size, "mtime": stat.st_mtime, "updated_at": time.time()}
+        if output_path is not None:
+            columns["output_path"] = output_path
+        columns.update(fields)
+        names = ", ".join(columns)
+        placeholders = ", ".join("?" for _ in columns)
+        updates = ", ".join(f"{name} = excluded.{name}" for name in columns)
+        with self._lock:
+            self._conn.execute(
+                f"INSERT INTO jobs (file_path, target_format, {names}) VALUES (?, ?, {placeholders}) "
+                f"ON CONFLICT(file_path, target_format) DO UPDATE SET {updates}",
+                (file_path, target_format, *columns.values())
+            )
+        for listener in list(self.listeners):
+            try:
+                listener(file_path, target_format, stage, dict(fields, output_path=output_path) if output_path else fields)
+            except Exception as e:
+                print(f"Journal listener error: {e}")
+
+    def add_listener(self, callback):
+        self.listeners.append(callback)
+        return callback
+
+    def remove_listener(self, callback):
+        if callback in self.listeners:
+            self.listeners.remove(callback)
+
+    def reset(self, file_path, target_format=None):
+        """Forget file_path's progress for one target format, or for all of them."""
+        with self._lock:
+            if target_format is None:
+                self._conn.execute("DELETE FROM jobs WHERE file_path = ?", (file_path,))
+            else:
+                self._conn.execute("DELETE FROM jobs WHERE file_path = ? AND target_format = ?", (file_path, target_format))
+
+    def incomplete(self):
+        """File paths with at least one format that was started but never saved."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT file_path FROM jobs WHERE stage != ? GROUP BY file_path ORDER BY MIN(updated_at)", (SAVED,)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def stage_reached(entry, stage):
+    return entry is not None and STAGES.index(entry["stage"]) >= STAGES.index(stage)
+
+
+def encode_options(options):
+    """The journal's form of a job's export options, e.g. {"ocr_lang": "de-DE"}; equal options encode equally."""
+    return json.dumps(options or {}, sort_keys=True)
+
+
+def run_stages(journal, file_path, output_path, upload, submit, poll, download, on_stage=None,
+               target_format=DEFAULT_TARGET_FORMAT, discard=None, options=None, force=False):
+    """Run upload -> submit -> poll -> download, skipping stages the journal already has.
+
+    ``upload()`` returns an assetID, ``submit(asset_id)`` a job ID, ``poll(job_id)``
+    a download URI and ``download(download_uri)`` writes output_path. Remote
+    handles from an earlier run can expire, so if a resumed run fails it is retried
+    from the job ID, and then once more from scratch. If the run is cancelled
+    between upload and submit, ``discard(asset_id)`` deletes the asset that no
+    job will use and the journal forgets it.
+
+    ``options`` are the export options ``submit`` applies (OCR language and
+    the like); progress made under other options is not reused. ``force``
+    starts from scratch even if the journal shows the output already saved.
+    """
+    options = encode_options(options)
+    entry = None if force else journal.get(file_path, target_format, options)
+    if stage_reached(entry, SAVED) and entry["output_path"] == output_path and os.path.exists(output_path):
+        return False
+    attempts = [entry]
+    if stage_reached(entry, DONE):
+        attempts.append(dict(entry, stage=SUBMITTED))  # Download URIs expire long before the job does
+    if entry is not None:
+        attempts.append(None)
+    for attempt in attempts:
+        if attempt is None and entry is not None:
+            journal.reset(file_path, target_format)
+        try:
+            _run(journal, file_path, output_path, target_format, attempt, upload, submit, poll, download, on_stage, options)
+            return True
+        except CancelledError:
+            if discard:
+                discard_unsubmitted(journal, file_path, discard, [target_format])
+            raise
+        except Exception:
+            if attempt is attempts[-1]:
+                raise
+
+
+def discard_unsubmitted(journal, file_path, discard, target_formats=(DEFAULT_TARGET_FORMAT,)):
+    """Pass the assets uploaded for file_path but not yet submitted to ``discard`` and forget them.
+
+    An asset that any of the formats already submitted is kept: the job
+    still reads it, and a later run resumes from the job ID.
+    """
+    entries = {target_format: journal.get(file_path, target_format) for target_format in target_formats}
+    if any(stage_reached(entry, SUBMITTED) for entry in entries.values()):
+        return
+    uploaded = {target_format: entry["asset_id"] for target_format, entry in entries.items() if stage_reached(entry, UPLOADED)}
+    for asset_id in set(uploaded.values()):
+        discard(asset_id)
+    for target_format in uploaded:
+        journal.reset(file_path, target_format)
+
+
+def _run(journal, file_path, output_path, target_format, entry, upload, submit, poll, download, on_stage, options):
+    report = on_stage or (lambda stage: None)
+    if not stage_reached(entry, TOKEN):
+        # A fresh start: clear handles left by a run under other options
+        journal.record(file_path, TOKEN, output_path, target_format, asset_id=None, job_id=None, download_uri=None, options=options)
+    report(TOKEN)
+
+    if stage_reached(entry, UPLOADED):
+        asset_id = entry["asset_id"]
+    else:
+        asset_id = upload()
+        journal.record(file_path, UPLOADED, target_format=target_format, asset_id=asset_id)
+    report(UPLOADED)
+
+    if stage_reached(entry, SUBMITTED):
+        job_id = entry["job_id"]
+    else:
+        job_id = submit(asset_id)
+        journal.record(file_path, SUBMITTED, target_format=target_format, job_id=job_id)
+    report(SUBMITTED)
+
+    if stage_reached(entry, DONE):
+        download_uri = entry["download_uri"]
+    else:
+        download_uri = poll(job_id)
+        journal.record(file_path, DONE, target_format=target_format, download_uri=download_uri)
+    report(DONE)
+
+    download(download_uri)
+    journal.record(file_path, SAVED, target_format=target_format)
+    report(SAVED)
+
+
+def run_formats(journal, file_path, outputs, upload, submit, poll, download, on_stage=None, discard=None,
+                options=None, force=False):
+    """``run_stages`` for several target formats of one file, uploading the PDF only once.
+
+    ``outputs`` maps target format to output path. ``submit(asset_id, target_format)``
+    and ``download(download_uri, output_path)`` take the format's details, and
+    ``on_stage(target_format, stage)`` reports progress. The export jobs for the
+    formats run concurrently against the same assetID. Returns
+    ``{target_format: converted}``; once every format has finished, the first
+    failure is raised. ``discard`` is as for ``run_stages``, applied to the
+    shared asset once every format has stopped; ``options`` and ``force`` are
+    as for ``run_stages`` and apply to every format.
+    """
+    lock = threading.Lock()
+    shared = {}
+    handed = {}  # target_format -> assetID it was last given
+
+    def upload_for(target_format):
+        with lock:
+            # A repeat call from a format is a retry, perhaps because its asset expired. Only a format
+            # still on the current asset uploads afresh; one that failed on an asset another format has
+            # already replaced gets the replacement, so concurrent retries share a single upload
+            if "asset_id" not in shared or handed.get(target_format) == shared["asset_id"]:
+                shared["asset_id"] = upload()
+            handed[target_format] = shared["asset_id"]
+            return shared["asset_id"]
+
+    def run(target_format, discard=None):
+        return run_stages(
+            journal, file_path, outputs[target_format],
+            upload=lambda: upload_for(target_format),
+            submit=lambda asset_id: submit(asset_id, target_format),
+            poll=poll,
+            download=lambda download_uri: download(download_uri, outputs[target_format]),
+            on_stage=(lambda stage: on_stage(target_format, stage)) if on_stage else None,
+            target_format=target_format,
+            discard=discard,
+            options=options,
+            force=force
+        )
+
+    if len(outputs) == 1:
+        target_format = next(iter(outputs))
+        return {target_format: run(target_format, discard)}
+    results, errors = {}, []
+
+    def run_one(target_format):
+        try:
+            results[target_format] = run(target_format)
+        except BaseException as e:
+            errors.append(e)
+    threads = [threading.Thread(target=run_one, args=(target_format,), name=f"export-{target_format}", daemon=True)
+               for target_format in outputs]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    cancelled = next((e for e in errors if isinstance(e, CancelledError)), None)
+    if cancelled is not None and discard:
+        discard_unsubmitted(journal, file_path, discard, list(outputs))
+    if errors:
+        raise next((e for e in errors if isinstance(e, CancelledError)), errors[0])
+    return results
+
+
+def get_journal():
+    """Return the shared journal, stored at PDF2WORD_JOURNAL if set."""
+    global _journal
+    with _journal_lock:
+        if _journal is None:
+            _journal = JobJournal(os.environ.get("PDF2WORD_JOURNAL", DEFAULT_JOURNAL_PATH))
+        return _journal
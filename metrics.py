@@ -0,0 +1,246 @@
+import bisect
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# Stage names used by the pipeline
+PREFLIGHT = "preflight"  # Local checks before anything is uploaded
+TOKEN = "token"
+ASSET_CREATE = "asset_create"
+UPLOAD = "upload"
+SUBMIT = "submit"
+POLL = "poll"  # One status request
+REMOTE_WAIT = "remote_wait"  # Submit to "done": time spent in Adobe's queue and converter
+DOWNLOAD = "download"
+JOB = "job"  # One whole file, end to end
+STAGES = (PREFLIGHT, TOKEN, ASSET_CREATE, UPLOAD, SUBMIT, POLL, REMOTE_WAIT, DOWNLOAD, JOB)
+
+# Histogram bucket upper bounds in seconds
+BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, float("inf"))
+THROUGHPUT_WINDOW = 60  # Seconds of history used for MB/s and jobs/min
+
+_sinks = []
+_sinks_lock = threading.Lock()
+
+
+def emit(stage, file_path=None, seconds=None, ok=True, **fields):
+    """Send one structured event to every registered sink."""
+    event = {"ts": time.time(), "stage": stage, "file": file_path, "seconds": seconds, "ok": ok}
+    event.update(fields)
+    with _sinks_lock:
+        sinks = list(_sinks)
+    for sink in sinks:
+        try:
+            sink.handle(event)
+        except Exception as e:
+            print(f"Metrics sink error: {e}")
+
+
+@contextmanager
+def timed(stage, file_path=None, **fields):
+    """Time a block with the monotonic clock and emit it; the yielded dict takes extra fields.
+
+    Set e.g. ``event["bytes"]`` or ``event["http_status"]`` inside the block. An
+    exception marks the event as failed and is re-raised.
+    """
+    event = dict(fields)
+    started = time.monotonic()
+    try:
+        yield event
+    except BaseException as e:
+        event.setdefault("error", str(e) or type(e).__name__)
+        emit(stage, file_path, time.monotonic() - started, ok=False, **event)
+        raise
+    emit(stage, file_path, time.monotonic() - started, **event)
+
+
+def http_fields(response):
+    """Status code and urllib3 retry count for a requests response."""
+    retries = getattr(getattr(response, "raw", None), "retries", None)
+    history = getattr(retries, "history", None) or ()
+    return {"http_status": response.status_code, "retries": len(history)}
+
+
+def add_sink(sink):
+    with _sinks_lock:
+        if sink not in _sinks:
+            _sinks.append(sink)
+    return sink
+
+
+def remove_sink(sink):
+    with _sinks_lock:
+        if sink in _sinks:
+            _sinks.remove(sink)
+
+
+class JsonLinesSink:
+    """Append every event as one JSON object per line."""
+
+    def __init__(self, path_or_stream):
+        if isinstance(path_or_stream, str):
+            self.stream = open(path_or_stream, "a")
+            self._owned = True
+        else:
+            self.stream = path_or_stream
+            self._owned = False
+        self._lock = threading.Lock()
+
+    def handle(self, event):
+        line = json.dumps(event) + "\n"
+        with self._lock:
+            self.stream.write(line)
+            self.stream.flush()
+
+    def close(self):
+        if self._owned:
+            self.stream.close()
+
+
+class HistogramSink:
+    """In-process per-stage latency histograms plus recent byte and job throughput."""
+
+    def __init__(self, buckets=BUCKETS, window=THROUGHPUT_WINDOW):
+        self.buckets = buckets
+        self.window = window
+        self._lock = threading.Lock()
+        self._stages = {}
+        self._recent = deque()  # (monotonic time, stage, bytes, ok)
+        self.http_statuses = {}
+        self.retries = 0
+
+    def handle(self, event):
+        stage = event["stage"]
+        seconds = event.get("seconds")
+        with self._lock:
+            stats = self._stages.setdefault(stage, {
+                "counts": [0] * len(self.buckets), "count": 0, "sum": 0.0, "bytes": 0, "errors": 0
+            })
+            if seconds is not None:
+                stats["counts"][bisect.bisect_left(self.buckets, seconds)] += 1
+                stats["count"] += 1
+                stats["sum"] += seconds
+            stats["bytes"] += event.get("bytes") or 0
+            if not event.get("ok", True):
+                stats["errors"] += 1
+            if event.get("http_status") is not None:
+                key = str(event["http_status"])
+                self.http_statuses[key] = self.http_statuses.get(key, 0) + 1
+            self.retries += event.get("retries") or 0
+            self._recent.append((time.monotonic(), stage, event.get("bytes") or 0, event.get("ok", True)))
+            self._trim()
+
+    def _trim(self):
+        # Called with the lock held
+        cutoff = time.monotonic() - self.window
+        while self._recent and self._recent[0][0] < cutoff:
+            self._recent.popleft()
+
+    def quantile(self, stage, q):
+        """Approximate quantile from the bucket bounds, None if the stage has no samples."""
+        with self._lock:
+            stats = self._stages.get(stage)
+            if not stats or not stats["count"]:
+                return None
+            target = q * stats["count"]
+            running = 0
+            for bound, count in zip(self.buckets, stats["counts"]):
+                running += count
+                if running >= target:
+                    return bound
+            return self.buckets[-1]
+
+    def mean(self, stage):
+        with self._lock:
+            stats = self._stages.get(stage)
+            return stats["sum"] / stats["count"] if stats and stats["count"] else None
+
+    def throughput(self):
+        """Upload/download MB/s and completed jobs/min over the recent window."""
+        with self._lock:
+            self._trim()
+            if not self._recent:
+                return {"upload_mb_s": 0.0, "download_mb_s": 0.0, "jobs_per_min": 0.0}
+            span = max(time.monotonic() - self._recent[0][0], 1.0)
+            upload = sum(size for _, stage, size, _ in self._recent if stage == UPLOAD)
+            download = sum(size for _, stage, size, _ in self._recent if stage == DOWNLOAD)
+            jobs = sum(1 for _, stage, _, ok in self._recent if stage == JOB and ok)
+        return {
+            "upload_mb_s": upload / span / (1024 * 1024),
+            "download_mb_s": download / span / (1024 * 1024),
+            "jobs_per_min": jobs / span * 60
+        }
+
+    def snapshot(self):
+        with self._lock:
+            return {stage: {"counts": list(stats["counts"]), "count": stats["count"], "sum": stats["sum"],
+                            "bytes": stats["bytes"], "errors": stats["errors"]}
+                    for stage, stats in self._stages.items()}
+
+    def summary(self):
+        """One line per stage: count, mean and p50/p95 bucket bounds."""
+        lines = []
+        snapshot = self.snapshot()
+        for stage in sorted(snapshot, key=lambda name: STAGES.index(name) if name in STAGES else len(STAGES)):
+            mean = self.mean(stage)
+            lines.append(f"{stage:<13} n={snapshot[stage]['count']:<6} mean={mean or 0:.3f}s "
+                         f"p50<={self.quantile(stage, 0.5)}s p95<={self.quantile(stage, 0.95)}s")
+        return "\n".join(lines)
+
+
+class PrometheusSink(HistogramSink):
+    """Histogram sink that also rewrites a Prometheus text-exposition file, e.g. for node_exporter's textfile collector."""
+
+    def __init__(self, path, interval=5.0, buckets=BUCKETS):
+        super().__init__(buckets)
+        self.path = path
+        self.interval = interval
+        self._last_write = 0.0
+
+    def handle(self, event):
+        super().handle(event)
+        if time.monotonic() - self._last_write >= self.interval:
+            self.write()
+
+    def write(self):
+        self._last_write = time.monotonic()
+        lines = [
+            "# HELP pdf2word_stage_seconds Time spent in each conversion stage.",
+            "# TYPE pdf2word_stage_seconds histogram",
+        ]
+        snapshot = self.snapshot()
+        for stage, stats in sorted(snapshot.items()):
+            running = 0
+            for bound, count in zip(self.buckets, stats["counts"]):
+                running += count
+                label = "+Inf" if bound == float("inf") else repr(float(bound))
+                lines.append(f'pdf2word_stage_seconds_bucket{{stage="{stage}",le="{label}"}} {running}')
+            lines.append(f'pdf2word_stage_seconds_sum{{stage="{stage}"}} {stats["sum"]}')
+            lines.append(f'pdf2word_stage_seconds_count{{stage="{stage}"}} {stats["count"]}')
+        lines += ["# HELP pdf2word_stage_bytes_total Bytes moved per stage.", "# TYPE pdf2word_stage_bytes_total counter"]
+        lines += [f'pdf2word_stage_bytes_total{{stage="{stage}"}} {stats["bytes"]}' for stage, stats in sorted(snapshot.items())]
+        lines += ["# HELP pdf2word_stage_errors_total Failed stage executions.", "# TYPE pdf2word_stage_errors_total counter"]
+        lines += [f'pdf2word_stage_errors_total{{stage="{stage}"}} {stats["errors"]}' for stage, stats in sorted(snapshot.items())]
+        with self._lock:
+            statuses = dict(self.http_statuses)
+            retries = self.retries
+        lines += ["# HELP pdf2word_http_responses_total HTTP responses by status code.", "# TYPE pdf2word_http_responses_total counter"]
+        lines += [f'pdf2word_http_responses_total{{code="{code}"}} {count}' for code, count in sorted(statuses.items())]
+        lines += ["# HELP pdf2word_http_retries_total Transport-level retries.", "# TYPE pdf2word_http_retries_total counter",
+                  f"pdf2word_http_retries_total {retries}"]
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".metrics-")
+        with os.fdopen(fd, "w") as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(tmp_path, self.path)
+
+    def close(self):
+        self.write()
+
+
+# Always-on in-process histograms; the GUI and CLI summaries read from this
+histograms = add_sink(HistogramSink())
@@ -0,0 +1,370 @@
+import argparse
+import io
+import json
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+import zipfile
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+IO_CHUNK_SIZE = 64 * 1024
+
+DOCX_PARTS = {
+    "[Content_Types].xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/word/document.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>'
+        '</Types>'
+    ),
+    "_rels/.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+        'Target="word/document.xml"/>'
+        '</Relationships>'
+    ),
+}
+
+
+def docx_bytes(text):
+    """A minimal valid DOCX holding one paragraph of text."""
+    document = (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">'
+        f'<w:body><w:p><w:r><w:t>{text}</w:t></w:r></w:p><w:sectPr/></w:body></w:document>'
+    )
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        for name, content in DOCX_PARTS.items():
+            archive.writestr(name, content)
+        archive.writestr("word/document.xml", document)
+    return buffer.getvalue()
+
+
+class MockSettings:
+    """Knobs for the simulated service; every delay is in seconds."""
+
+    def __init__(self, latency=0.02, latency_jitter=0.01, conversion_median=2.0, conversion_sigma=0.5,
+                 conversion_per_mb=0.5, error_rate=0.0, throttle_rate=0.0, retry_after=1,
+                 bandwidth=None, output_ratio=0.5, token_ttl=86400, valid_docx=False, drop_rate=0.0):
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        # Conversion time is lognormal around conversion_median, plus conversion_per_mb for each MB of input
+        self.conversion_median = conversion_median
+        self.conversion_sigma = conversion_sigma
+        self.conversion_per_mb = conversion_per_mb
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.bandwidth = bandwidth  # Bytes per second per transfer, None for unlimited
+        self.output_ratio = output_ratio  # Output size as a fraction of the input size
+        self.token_ttl = token_ttl
+        # Serve a real (tiny) DOCX instead of filler bytes, for exercising code that opens the output
+        self.valid_docx = valid_docx
+        self.drop_rate = drop_rate  # Fraction of downloads whose connection is cut halfway through the body
+
+    def conversion_time(self, size):
+        return random.lognormvariate(0, self.conversion_sigma) * self.conversion_median + size / (1024 * 1024) * self.conversion_per_mb
+
+
+class MockState:
+    def __init__(self, settings):
+        self.settings = settings
+        self.lock = threading.Lock()
+        self.assets = {}  # assetID -> uploaded size, None until uploaded
+        self.jobs = {}  # job ID -> (ready_at, output size, output bytes or None for filler)
+        self.requests = {}
+        self.first_request = {}  # route -> wall-clock time it was first requested, for startup benchmarks
+        self.injected = {"429": 0, "500": 0, "dropped": 0}
+
+    def count(self, route):
+        with self.lock:
+            self.requests[route] = self.requests.get(route, 0) + 1
+            self.first_request.setdefault(route, time.time())
+
+    def stats(self):
+        with self.lock:
+            return {"requests": dict(self.requests), "injected": dict(self.injected),
+                    "assets": len(self.assets), "jobs": len(self.jobs)}
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-alive, so connection pooling behaves as it would against Adobe
+    state = None  # Set per server by MockAdobeServer
+
+    ROUTES = [
+        ("POST", re.compile(r"^/ims/token/v3$"), "token"),
+        ("POST", re.compile(r"^/assets$"), "create_asset"),
+        ("DELETE", re.compile(r"^/assets/(?P<asset_id>[^/]+)$"), "delete_asset"),
+        ("PUT", re.compile(r"^/storage/upload/(?P<asset_id>[^/]+)$"), "upload"),
+        ("POST", re.compile(r"^/operation/exportpdf$"), "submit"),
+        ("GET", re.compile(r"^/operation/exportpdf/(?P<job_id>[^/]+)/status$"), "status"),
+        ("GET", re.compile(r"^/storage/download/(?P<job_id>[^/]+)$"), "download"),
+    ]
+
+    def log_message(self, format, *args):
+        pass  # Keep benchmark output clean
+
+    def do_GET(self):
+        self.dispatch("GET")
+
+    def do_POST(self):
+        self.dispatch("POST")
+
+    def do_PUT(self):
+        self.dispatch("PUT")
+
+    def do_DELETE(self):
+        self.dispatch("DELETE")
+
+    def do_HEAD(self):
+        # Connection warm-up probes; like any HEAD reply this one has headers only
+        self.state.count("head")
+        self.send_response(404)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def dispatch(self, method):
+        path = self.path.split("?", 1)[0]
+        for route_method, pattern, name in self.ROUTES:
+            match = pattern.match(path)
+            if match and route_method == method:
+                break
+        else:
+            self.read_body()
+            return self.send_json(404, {"error": {"code": "NOT_FOUND", "message": path}})
+
+        settings = self.state.settings
+        self.state.count(name)
+        time.sleep(max(settings.latency + random.uniform(-settings.latency_jitter, settings.latency_jitter), 0))
+        roll = random.random()
+        if roll < settings.throttle_rate:
+            self.read_body()
+            with self.state.lock:
+                self.state.injected["429"] += 1
+            return self.send_json(429, {"error": {"code": "TOO_MANY_REQUESTS"}}, {"Retry-After": str(settings.retry_after)})
+        if roll < settings.throttle_rate + settings.error_rate:
+            self.read_body()
+            with self.state.lock:
+                self.state.injected["500"] += 1
+            return self.send_json(500, {"error": {"code": "INTERNAL_ERROR"}})
+        getattr(self, "handle_" + name)(**match.groupdict())
+
+    def base_url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def read_body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        received = 0
+        started = time.monotonic()
+        while received < length:
+            chunk = self.rfile.read(min(IO_CHUNK_SIZE, length - received))
+            if not chunk:
+                break
+            received += len(chunk)
+            self.throttle(received, started)
+        return received
+
+    def throttle(self, transferred, started):
+        bandwidth = self.state.settings.bandwidth
+        if bandwidth:
+            ahead = transferred / bandwidth - (time.monotonic() - started)
+            if ahead > 0:
+                time.sleep(ahead)
+
+    def send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def json_body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+        if self.headers.get("Content-Type", "").startswith("application/json"):
+            return json.loads(raw or b"{}")
+        return {}
+
+    def handle_token(self):
+        self.read_body()
+        self.send_json(200, {"access_token": uuid.uuid4().hex, "token_type": "bearer",
+                             "expires_in": self.state.settings.token_ttl})
+
+    def handle_create_asset(self):
+        self.json_body()
+        asset_id = uuid.uuid4().hex
+        with self.state.lock:
+            self.state.assets[asset_id] = None
+        self.send_json(200, {"assetID": asset_id, "uploadUri": f"{self.base_url()}/storage/upload/{asset_id}"})
+
+    def handle_delete_asset(self, asset_id):
+        self.read_body()
+        with self.state.lock:
+            existed = self.state.assets.pop(asset_id, False) is not False
+        if existed:
+            # A 204 carries no body; one would be read as the next response on this keep-alive connection
+            self.send_response(204)
+            self.end_headers()
+        else:
+            self.send_json(404, {})
+
+    def handle_upload(self, asset_id):
+        size = self.read_body()
+        with self.state.lock:
+            known = asset_id in self.state.assets
+            if known:
+                self.state.assets[asset_id] = size
+        self.send_json(200 if known else 404, {})
+
+    def handle_submit(self):
+        body = self.json_body()
+        with self.state.lock:
+            size = self.state.assets.get(body.get("assetID"))
+        if size is None:
+            return self.send_json(404, {"error": {"code": "ASSET_NOT_FOUND"}})
+        job_id = uuid.uuid4().hex
+        ready_at = time.monotonic() + self.state.settings.conversion_time(size)
+        output_size = max(int(size * self.state.settings.output_ratio), 1024)
+        content = docx_bytes(f"Converted {body.get('assetID')}") if self.state.settings.valid_docx else None
+        if content is not None:
+            output_size = len(content)
+        with self.state.lock:
+            self.state.jobs[job_id] = (ready_at, output_size, content)
+        self.send_json(201, {}, {"Location": f"{self.base_url()}/operation/exportpdf/{job_id}/status"})
+
+    def handle_status(self, job_id):
+        self.read_body()
+        with self.state.lock:
+            job = self.state.jobs.get(job_id)
+        if job is None:
+            return self.send_json(404, {"error": {"code": "JOB_NOT_FOUND"}})
+        if time.monotonic() < job[0]:
+            return self.send_json(200, {"status": "in progress"})
+        download_uri = f"{self.base_url()}/storage/download/{job_id}"
+        self.send_json(200, {"status": "done", "asset": {"assetID": job_id, "downloadUri": download_uri}})
+
+    def handle_download(self, job_id):
+        self.read_body()
+        with self.state.lock:
+            job = self.state.jobs.get(job_id)
+        if job is None:
+            return self.send_json(404, {"error": {"code": "JOB_NOT_FOUND"}})
+        size, content = job[1], job[2]
+        start, end = 0, size - 1
+        range_match = re.match(r"bytes=(\d+)-(\d*)$", self.headers.get("Range", ""))
+        if range_match:
+            start = int(range_match.group(1))
+            end = min(int(range_match.group(2) or end), end)
+        self.send_response(206 if range_match else 200)
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Length", str(end - start + 1))
+        if range_match:
+            self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        self.end_headers()
+        block = bytes(range(256)) * (IO_CHUNK_SIZE // 256)
+        sent = 0
+        started = time.monotonic()
+        remaining = end - start + 1
+        if remaining > 1 and random.random() < self.state.settings.drop_rate:
+            with self.state.lock:
+                self.state.injected["dropped"] += 1
+            remaining //= 2
+            self.close_connection = True  # Hang up short of Content-Length
+        while remaining > 0:
+            if content is not None:
+                chunk = content[start + sent:start + sent + min(IO_CHUNK_SIZE, remaining)]
+            else:
+                chunk = block[:min(IO_CHUNK_SIZE, remaining)]
+            self.wfile.write(chunk)
+            sent += len(chunk)
+            remaining -= len(chunk)
+            self.throttle(sent, started)
+
+
+class _MockHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Cancelled transfers and killed clients hang up mid-reply; that is not a server error
+        if isinstance(sys.exc_info()[1], (BrokenPipeError, ConnectionResetError)):
+            return
+        super().handle_error(request, client_address)
+
+
+class MockAdobeServer:
+    """Local stand-in for IMS and PDF Services, served on a background thread."""
+
+    def __init__(self, host="127.0.0.1", port=0, settings=None):
+        self.state = MockState(settings or MockSettings())
+        handler = type("BoundMockHandler", (MockHandler,), {"state": self.state})
+        self.httpd = _MockHTTPServer((host, port), handler)
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="mock-adobe", daemon=True)
+        self._thread.start()
+        return self.url
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a mock Adobe IMS + PDF Services API on localhost.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.02, help="per-request latency in seconds")
+    parser.add_argument("--conversion-median", type=float, default=2.0, help="median conversion time in seconds")
+    parser.add_argument("--conversion-sigma", type=float, default=0.5, help="lognormal spread of conversion time")
+    parser.add_argument("--conversion-per-mb", type=float, default=0.5, help="extra conversion seconds per MB")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with 500")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="fraction of requests answered with 429")
+    parser.add_argument("--retry-after", type=int, default=1, help="Retry-After seconds sent with 429s")
+    parser.add_argument("--bandwidth", type=float, help="per-transfer bandwidth cap in MB/s")
+    parser.add_argument("--drop-rate", type=float, default=0.0, help="fraction of downloads cut off halfway")
+    parser.add_argument("--valid-docx", action="store_true", help="serve a minimal real DOCX instead of filler bytes")
+    args = parser.parse_args()
+
+    settings = MockSettings(
+        latency=args.latency, conversion_median=args.conversion_median, conversion_sigma=args.conversion_sigma,
+        conversion_per_mb=args.conversion_per_mb, error_rate=args.error_rate, throttle_rate=args.throttle_rate,
+        retry_after=args.retry_after, bandwidth=args.bandwidth * 1024 * 1024 if args.bandwidth else None,
+        valid_docx=args.valid_docx, drop_rate=args.drop_rate
+    )
+    server = MockAdobeServer(args.host, args.port, settings)
+    print(f"Mock Adobe API listening on {server.url}")
+    print(f"  export ADOBE_IMS_URL={server.url} ADOBE_PDF_SERVICES_URL={server.url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
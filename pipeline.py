@@ -0,0 +1,261 @@
+import os
+import threading
+from concurrent.futures import CancelledError, Future, InvalidStateError
+from journal import get_journal, stage_reached, discard_unsubmitted, encode_options, TOKEN, UPLOADED, SUBMITTED, DONE, SAVED
+from scheduler import JobScheduler, CANCELLED
+
+# Stage names, in pipeline order
+UPLOAD_STAGE = "upload"
+SUBMIT_STAGE = "submit"
+POLL_STAGE = "poll"
+DOWNLOAD_STAGE = "download"
+
+DEFAULT_UPLOAD_WORKERS = 2  # Uplink-bound: more parallel uploads mostly split the same bandwidth
+DEFAULT_SUBMIT_WORKERS = 2  # Short API calls
+DEFAULT_DOWNLOAD_WORKERS = 4  # Downlink- and disk-bound
+DEFAULT_QUEUE_SIZE = 16  # Files waiting in front of the upload and submit stages
+DEFAULT_MAX_IN_FLIGHT = 256  # Files between "accepted" and "saved"; most of them wait on Adobe
+
+
+class PipelineJob:
+    def __init__(self, file_path, output_path, entry, attempts, options):
+        self.file_path = file_path
+        self.output_path = output_path
+        self.entry = entry  # Journal row this job started from
+        self.options = options  # Encoded export options, as journaled
+        self.attempts = attempts
+        self.future = Future()
+        self.poll_future = None
+        self.cancelled = False
+
+
+class StagedPipeline:
+    """Run upload -> submit -> poll -> download as separate stages with their own pools.
+
+    Each file moves from stage to stage instead of holding one thread from start
+    to finish, so the upload of one file overlaps Adobe's conversion of the next
+    and the download of the one before. Upload, submit and download each run on
+    a ``JobScheduler`` sized independently; polling is handed to the shared
+    multiplexed poller and takes no thread at all.
+
+    The stage callables are ``upload(file_path)`` -> assetID,
+    ``submit(file_path, asset_id)`` -> job ID, ``track(file_path, job_id)`` ->
+    Future of the download URI and ``download(file_path, download_uri, output_path)``.
+    Progress is journaled exactly like ``journal.run_stages``, so batches resume
+    the same way whichever engine ran them, and a file cancelled between upload
+    and submit has its asset passed to ``discard(asset_id)`` the same way too.
+    ``options(file_path)`` gives the export options ``submit`` applies to a
+    file, so progress made under other options is not reused.
+    """
+
+    def __init__(self, upload, submit, track, download, journal=None,
+                 upload_workers=DEFAULT_UPLOAD_WORKERS, submit_workers=DEFAULT_SUBMIT_WORKERS,
+                 download_workers=DEFAULT_DOWNLOAD_WORKERS, queue_size=DEFAULT_QUEUE_SIZE,
+                 max_in_flight=DEFAULT_MAX_IN_FLIGHT, on_stage=None, discard=None, options=None):
+        self.upload = upload
+        self.submit = submit
+        self.track = track
+        self.download = download
+        self.journal = journal or get_journal()
+        self.on_stage = on_stage
+        self.discard = discard
+        self.options = options
+        self.stages = {
+            # A full queue blocks whoever hands work to it, so a slow stage pushes back on the ones before it
+            UPLOAD_STAGE: JobScheduler(upload_workers, max_pending=queue_size, on_state_change=self._on_state_change),
+            SUBMIT_STAGE: JobScheduler(submit_workers, max_pending=queue_size, on_state_change=self._on_state_change),
+            # Fed from poller callbacks, which must never block; max_in_flight bounds this queue instead
+            DOWNLOAD_STAGE: JobScheduler(download_workers, on_state_change=self._on_state_change),
+        }
+        self._slots = threading.BoundedSemaphore(max_in_flight)
+        self._jobs = {}  # file_path -> PipelineJob
+        self._cond = threading.Condition()
+
+    def convert(self, file_path, output_path, force=False):
+        """Queue one file; returns a Future resolving to False if the journal shows it already saved.
+
+        Blocks while ``max_in_flight`` files are in the pipeline or the upload
+        queue is full. Converting a file that is already in flight returns the
+        existing Future. ``force`` starts over whatever the journal shows.
+        """
+        with self._cond:
+            if file_path in self._jobs:
+                return self._jobs[file_path].future
+        options = encode_options(self.options(file_path) if self.options else None)
+        entry = None if force else self.journal.get(file_path, options=options)
+        if stage_reached(entry, SAVED) and entry["output_path"] == output_path and os.path.exists(output_path):
+            future = Future()
+            future.set_result(False)
+            return future
+        # Same fallbacks as run_stages: resume, then re-poll from the job ID, then start over
+        attempts = [entry]
+        if stage_reached(entry, DONE):
+            attempts.append(dict(entry, stage=SUBMITTED))
+        if entry is not None:
+            attempts.append(None)
+        job = PipelineJob(file_path, output_path, entry, attempts, options)
+        self._slots.acquire()
+        with self._cond:
+            self._jobs[file_path] = job
+        try:
+            self._start(job)
+        except Exception as e:
+            self._finish(job, error=e)
+        return job.future
+
+    def queue_depths(self):
+        """Queued and running counts per stage, plus files in flight overall."""
+        depths = {name: {"queued": scheduler.pending_count(), "running": scheduler.running_count()}
+                  for name, scheduler in self.stages.items()}
+        with self._cond:
+            polling = sum(1 for job in self._jobs.values() if job.poll_future is not None and not job.poll_future.done())
+            depths[POLL_STAGE] = {"queued": 0, "running": polling}
+            depths["in_flight"] = len(self._jobs)
+        return depths
+
+    def set_workers(self, stage, workers):
+        self.stages[stage].set_max_workers(workers)
+
+    def cancel_pending(self):
+        """Cancel every file in the pipeline; stages already running finish their current request."""
+        with self._cond:
+            jobs = list(self._jobs.values())
+        for job in jobs:
+            job.cancelled = True
+            if job.poll_future is not None:
+                job.poll_future.cancel()
+        for scheduler in self.stages.values():
+            scheduler.cancel_pending()
+
+    def wait(self, timeout=None):
+        """Block until every accepted file has finished, failed or been cancelled."""
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._jobs, timeout)
+
+    def shutdown(self, wait=True, cancel_pending=False):
+        if cancel_pending:
+            self.cancel_pending()
+        for scheduler in self.stages.values():
+            scheduler.shutdown(wait=wait)
+
+    def _start(self, job):
+        attempt = job.attempts.pop(0)
+        if attempt is None and job.entry is not None:
+            self.journal.reset(job.file_path)
+        if not stage_reached(attempt, TOKEN):
+            # A fresh start: clear handles left by a run under other options
+            self.journal.record(job.file_path, TOKEN, job.output_path, asset_id=None, job_id=None, download_uri=None,
+                                options=job.options)
+        self._report(job, TOKEN)
+        if stage_reached(attempt, DONE):
+            self._enqueue(job, DOWNLOAD_STAGE, self._download, attempt["download_uri"])
+        elif stage_reached(attempt, SUBMITTED):
+            self._poll(job, attempt["job_id"])
+        elif stage_reached(attempt, UPLOADED):
+            self._enqueue(job, SUBMIT_STAGE, self._submit, attempt["asset_id"])
+        else:
+            self._enqueue(job, UPLOAD_STAGE, self._upload)
+
+    def _enqueue(self, job, stage, step, *args):
+        self.stages[stage].submit(job.file_path, lambda: self._run(job, step, *args))
+
+    def _run(self, job, step, *args):
+        if job.cancelled:
+            return self._finish(job, error=CancelledError())
+        try:
+            step(job, *args)
+        except Exception as e:
+            self._fail_later(job, e)
+
+    def _upload(self, job):
+        asset_id = self.upload(job.file_path)
+        self.journal.record(job.file_path, UPLOADED, asset_id=asset_id)
+        self._report(job, UPLOADED)
+        self._enqueue(job, SUBMIT_STAGE, self._submit, asset_id)
+
+    def _submit(self, job, asset_id):
+        job_id = self.submit(job.file_path, asset_id)
+        self.journal.record(job.file_path, SUBMITTED, job_id=job_id)
+        self._report(job, SUBMITTED)
+        self._poll(job, job_id)
+
+    def _poll(self, job, job_id):
+        job.poll_future = self.track(job.file_path, job_id)
+        job.poll_future.add_done_callback(lambda future: self._polled(job, future))
+
+    def _polled(self, job, future):
+        # Runs on the poller thread, so anything that might block is moved elsewhere
+        if future.cancelled() or job.cancelled:
+            return self._finish(job, error=CancelledError())
+        error = future.exception()
+        if error is not None:
+            return self._fail_later(job, error)
+        try:
+            download_uri = future.result()
+            self.journal.record(job.file_path, DONE, download_uri=download_uri)
+            self._report(job, DONE)
+            self._enqueue(job, DOWNLOAD_STAGE, self._download, download_uri)
+        except Exception as e:
+            # The Future would swallow it, leaving the job in flight and wait() blocked forever
+            self._fail_later(job, e)
+
+    def _download(self, job, download_uri):
+        self.download(job.file_path, download_uri, job.output_path)
+        self.journal.record(job.file_path, SAVED)
+        self._report(job, SAVED)
+        self._finish(job, result=True)
+
+    def _fail_later(self, job, error):
+        # A retry starts over on the bounded upload queue, which may be waiting on the very
+        # stage worker or poller that failed, so it is handed to a thread of its own
+        threading.Thread(target=self._fail, args=(job, error), name="pipeline-retry", daemon=True).start()
+
+    def _fail(self, job, error):
+        if job.cancelled or isinstance(error, CancelledError) or not job.attempts:
+            return self._finish(job, error=error)
+        try:
+            self._start(job)
+        except Exception as e:
+            self._finish(job, error=e)
+
+    def _finish(self, job, result=None, error=None):
+        with self._cond:
+            if self._jobs.get(job.file_path) is not job:
+                return  # Already finished, e.g. cancelled while a stage was running
+            del self._jobs[job.file_path]
+            self._cond.notify_all()
+        self._slots.release()
+        if isinstance(error, CancelledError) and self.discard:
+            # May run on the canceller's thread; deleting the asset is a request, so it happens elsewhere
+            threading.Thread(target=discard_unsubmitted, args=(self.journal, job.file_path, self.discard),
+                             name="pipeline-discard", daemon=True).start()
+        try:
+            if isinstance(error, CancelledError):
+                job.future.cancel()
+            elif error is not None:
+                job.future.set_exception(error)
+            else:
+                job.future.set_result(result)
+        except InvalidStateError:
+            pass  # The caller cancelled the Future first
+
+    def _on_state_change(self, scheduler_job):
+        if scheduler_job.state == CANCELLED:
+            with self._cond:
+                job = self._jobs.get(scheduler_job.key)
+            if job is not None:
+                self._finish(job, error=CancelledError())
+
+    def _report(self, job, stage):
+        if self.on_stage:
+            try:
+                self.on_stage(job.file_path, stage)
+            except Exception as e:
+                print(f"Pipeline stage callback error: {e}")
+
+
+def format_depths(depths):
+    """One status line, e.g. for printing every few seconds while tuning worker counts."""
+    stages = (UPLOAD_STAGE, SUBMIT_STAGE, POLL_STAGE, DOWNLOAD_STAGE)
+    return " | ".join(f"{stage} {depths[stage]['queued']} queued/{depths[stage]['running']} running" for stage in stages) \
+        + f" | {depths['in_flight']} in flight"
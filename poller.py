@@ -0,0 +1,221 @@
+import heapq
+import itertools
+import threading
+import time
+from concurrent.futures import Future, InvalidStateError, ThreadPoolExecutor
+import metrics
+from http_session import get_no_retry_session
+from tokens import get_token_provider
+from ratelimit import get_limiter, retry_after_seconds, STATUS
+
+FIRST_POLL_DELAY = 1.0  # Small files are often done within a couple of seconds
+SECONDS_PER_MB = 0.5  # Rough Adobe conversion time per MB of input, used for the first wait
+SECONDS_PER_PAGE = 0.1  # The same per page, when the page count is known
+OCR_SECONDS_PER_PAGE = 1.0  # Scanned pages go through OCR first
+MIN_INTERVAL = 1.0
+MAX_INTERVAL = 15.0
+BACKOFF = 1.5
+POLL_DEADLINE = 600  # Total time a job may take before we give up, in seconds
+DEADLINE_PER_MB = 10
+DEADLINE_PER_PAGE = 2
+MAX_DEADLINE = 3600
+MAX_CONCURRENT_POLLS = 4
+RETRYABLE_STATUSES = (429, 500, 502, 503, 504)
+
+_pollers = {}
+_poller_credentials = {}  # client_id -> the credentials its poller signs requests with now
+_pollers_lock = threading.Lock()
+
+
+def initial_delay(file_size, pages=None, ocr=False):
+    """Wait before the first status request, estimated from the input size and page count."""
+    estimate = max(file_size / (1024 * 1024) * SECONDS_PER_MB, (pages or 0) * (OCR_SECONDS_PER_PAGE if ocr else SECONDS_PER_PAGE))
+    return min(FIRST_POLL_DELAY + estimate, MAX_INTERVAL)
+
+
+def next_interval(interval):
+    return min(max(interval * BACKOFF, MIN_INTERVAL), MAX_INTERVAL)
+
+
+def deadline_for(file_size, pages=None, ocr=False):
+    per_page = DEADLINE_PER_PAGE * (OCR_SECONDS_PER_PAGE / SECONDS_PER_PAGE if ocr else 1)
+    return min(POLL_DEADLINE + max(file_size / (1024 * 1024) * DEADLINE_PER_MB, (pages or 0) * per_page), MAX_DEADLINE)
+
+
+def download_uri_from(status_data):
+    download_uri = status_data.get("downloadUri") or status_data.get("asset", {}).get("downloadUri")
+    if not download_uri:
+        raise ValueError("Download URI not found")
+    return download_uri
+
+
+class PollJob:
+    def __init__(self, status_url, file_size, deadline, future, label=None, pages=None, ocr=False):
+        self.status_url = status_url
+        self.label = label
+        self.interval = initial_delay(file_size, pages, ocr)
+        self.deadline = time.monotonic() + deadline
+        self.future = future
+        self.polls = 0
+
+
+class StatusPoller:
+    """Track every outstanding export job from one scheduler thread.
+
+    Each job is polled on its own schedule: a first wait estimated from the file
+    size, then exponential backoff capped at ``MAX_INTERVAL``, with any
+    ``Retry-After`` header taking precedence. A job fails only when its total
+    deadline passes. ``track`` returns a Future that resolves to the download URI,
+    so the download stage can either block on it or chain a callback.
+    """
+
+    def __init__(self, headers_factory, max_concurrent_polls=MAX_CONCURRENT_POLLS):
+        self.headers_factory = headers_factory
+        self._heap = []
+        self._counter = itertools.count()
+        self._cond = threading.Condition()
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrent_polls, thread_name_prefix="poller")
+        self._thread = None
+        self._closed = False
+        self.status_requests = 0
+
+    def track(self, status_url, file_size=0, deadline=None, label=None, pages=None, ocr=False):
+        """Start polling status_url; ``label`` (usually the file path) tags the poll metrics.
+
+        ``pages`` and ``ocr`` (scanned input), when known from preflight, refine
+        the first wait and the deadline.
+        """
+        future = Future()
+        if deadline is None:
+            deadline = deadline_for(file_size, pages, ocr)
+        job = PollJob(status_url, file_size, deadline, future, label, pages, ocr)
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Poller has been closed")
+            self._schedule(job, job.interval)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name="status-poller", daemon=True)
+                self._thread.start()
+        future.add_done_callback(lambda f: f.cancelled() and self._forget(job))
+        return future
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            jobs = [job for _, _, job in self._heap]
+            self._heap.clear()
+            self._cond.notify_all()
+        for job in jobs:
+            job.future.cancel()
+        self._executor.shutdown(wait=False)
+
+    def pending_count(self):
+        with self._cond:
+            return len(self._heap)
+
+    def _schedule(self, job, delay):
+        # Called with the condition held
+        heapq.heappush(self._heap, (time.monotonic() + delay, next(self._counter), job))
+        self._cond.notify_all()
+
+    def _forget(self, job):
+        """Drop a cancelled job from the schedule now instead of when its next poll comes due."""
+        with self._cond:
+            self._heap[:] = [entry for entry in self._heap if entry[2] is not job]
+            heapq.heapify(self._heap)
+
+    def _reschedule(self, job, delay):
+        with self._cond:
+            if not self._closed:
+                self._schedule(job, delay)
+
+    def _loop(self):
+        while True:
+            with self._cond:
+                while not self._closed and (not self._heap or self._heap[0][0] > time.monotonic()):
+                    self._cond.wait(self._heap[0][0] - time.monotonic() if self._heap else None)
+                if self._closed:
+                    return
+                _, _, job = heapq.heappop(self._heap)
+            if job.future.cancelled():
+                continue
+            self._executor.submit(self._poll, job)
+
+    def _poll(self, job):
+        if time.monotonic() > job.deadline:
+            _resolve(job.future, error=TimeoutError(f"Conversion did not finish after {job.polls} status checks"))
+            return
+        job.polls += 1
+        with self._cond:
+            self.status_requests += 1
+        delay = None
+        limiter = get_limiter()
+        limiter.acquire(STATUS)
+        started = time.monotonic()
+        try:
+            # Never retried underneath: every 429/503 has to reach the limiter and the reschedule below
+            response = get_no_retry_session().get(job.status_url, headers=self.headers_factory(), timeout=30)
+            limiter.observe(STATUS, response)
+            metrics.emit(metrics.POLL, job.label, time.monotonic() - started, ok=response.ok, poll=job.polls, **metrics.http_fields(response))
+            delay = retry_after_seconds(response.headers)
+            if response.status_code in RETRYABLE_STATUSES:
+                job.interval = next_interval(job.interval)
+                self._reschedule(job, delay if delay is not None else job.interval)
+                return
+            response.raise_for_status()
+            status_data = response.json()
+        except Exception as e:
+            if getattr(e, "response", None) is None:
+                metrics.emit(metrics.POLL, job.label, time.monotonic() - started, ok=False, poll=job.polls, error=str(e))
+            if getattr(getattr(e, "response", None), "status_code", None) is not None:
+                _resolve(job.future, error=e)  # A non-retryable HTTP error will not go away
+            else:
+                job.interval = next_interval(job.interval)
+                self._reschedule(job, job.interval)  # Network hiccup: try again until the deadline
+            return
+
+        status = status_data.get("status")
+        if status == "done":
+            try:
+                _resolve(job.future, result=download_uri_from(status_data))
+            except ValueError as e:
+                _resolve(job.future, error=e)
+        elif status == "failed":
+            _resolve(job.future, error=ValueError(f"Conversion failed: {status_data.get('error')}"))
+        else:
+            job.interval = next_interval(job.interval)
+            self._reschedule(job, delay if delay is not None else job.interval)
+
+
+def _resolve(future, result=None, error=None):
+    # The caller may have cancelled the future while its poll was in flight
+    try:
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+    except InvalidStateError:
+        pass
+
+
+def get_poller(credentials):
+    """Return the process-wide poller for these credentials.
+
+    There is one poller per client ID. Each poll is signed for the credentials
+    it was last asked for, so reloaded credentials (a new secret or IMS URL)
+    also apply to jobs it is already tracking.
+    """
+    client_id = credentials["client_credentials"]["client_id"]
+    with _pollers_lock:
+        _poller_credentials[client_id] = credentials
+        poller = _pollers.get(client_id)
+        if poller is None:
+            def headers_factory():
+                with _pollers_lock:
+                    current = _poller_credentials[client_id]
+                return {
+                    "x-api-key": client_id,
+                    "Authorization": f"Bearer {get_token_provider(current).get_token()}"
+                }
+            poller = _pollers[client_id] = StatusPoller(headers_factory)
+        return poller
@@ -0,0 +1,221 @@
+import mmap
+import os
+import re
+import threading
+from collections import OrderedDict
+import metrics
+from config import OCR_LANGS, DEFAULT_OCR_LANG
+
+HEADER_WINDOW = 1024  # Readers accept up to this much junk before %PDF- and after %%EOF
+TRAILER_WINDOW = 1024 * 1024  # Where /Encrypt can appear: the trailer or xref stream at the end...
+LINEARIZED_WINDOW = 1024 * 1024  # ...or the first-page trailer of a linearized file
+OBJECT_WINDOW = 4096  # How much of an object or trailer is read once the xref has located it
+MAX_XREF_SECTIONS = 32  # Incremental updates followed through /Prev before giving up
+MAX_REMEMBERED = 1024
+
+_VERSION = re.compile(rb"%PDF-(\d\.\d)")
+_PAGES_COUNT = re.compile(rb"/Type\s*/Pages\b(?:(?!>>).)*?/Count\s+(\d+)|/Count\s+(\d+)(?:(?!>>).)*?/Type\s*/Pages\b", re.S)
+_PAGE = re.compile(rb"/Type\s*/Page\b(?!s)")
+_STARTXREF = re.compile(rb"startxref\s+(\d+)")
+_XREF = re.compile(rb"\s*xref")
+_SUBSECTION = re.compile(rb"\s*(\d+)\s+(\d+)[ \t]*[\r\n]+")
+_PREV = re.compile(rb"/Prev\s+(\d+)")
+_ROOT = re.compile(rb"/Root\s+(\d+)\s+\d+\s+R")
+_PAGES_REF = re.compile(rb"/Pages\s+(\d+)\s+\d+\s+R")
+_COUNT = re.compile(rb"/Count\s+(\d+)")
+_LANG = re.compile(rb"/Lang\s*\(((?:[^()\\]|\\.){2,40})\)", re.S)
+_ESCAPE = re.compile(rb"\\([0-7]{1,3}|.)", re.S)
+
+_config = {"enabled": True, "ocr_lang": None}
+_results = OrderedDict()  # (file_path, size, mtime) -> PreflightResult
+_results_lock = threading.Lock()
+
+
+class PreflightError(ValueError):
+    """The file cannot convert; raised before anything is uploaded."""
+
+
+class PreflightResult:
+    """What a cheap look at the raw bytes tells about one PDF.
+
+    ``pages`` and ``has_text`` are None when the answer is hidden in compressed
+    object streams, which only a full parse could open, or in the middle of a
+    large file, which is never read.
+    """
+
+    def __init__(self, file_path, size, version=None, pages=None, has_text=None, lang=None):
+        self.file_path = file_path
+        self.size = size
+        self.version = version
+        self.pages = pages
+        self.has_text = has_text
+        self.lang = lang  # Document language from the catalog's /Lang entry
+
+    @property
+    def ocr_lang(self):
+        """OCR language for the export job: --ocr-lang, else the document's own language if it needs OCR."""
+        if _config["ocr_lang"]:
+            return _config["ocr_lang"]
+        if self.has_text is not True and self.lang:
+            return match_ocr_lang(self.lang) or DEFAULT_OCR_LANG
+        return DEFAULT_OCR_LANG
+
+    @property
+    def needs_ocr(self):
+        return self.has_text is False
+
+
+def configure(enabled=None, ocr_lang=None):
+    for name, value in (("enabled", enabled), ("ocr_lang", ocr_lang)):
+        if value is not None:
+            _config[name] = value
+    with _results_lock:
+        _results.clear()
+
+
+def match_ocr_lang(lang):
+    """Map a language tag like "de" or "pt-br" onto Adobe's OCR languages, None if unsupported."""
+    lang = lang.lower()
+    for candidate in OCR_LANGS:
+        if candidate.lower() == lang:
+            return candidate
+    primary = lang.split("-")[0]
+    return next((candidate for candidate in OCR_LANGS if candidate.split("-")[0].lower() == primary), None)
+
+
+def check(file_path):
+    """Inspect file_path without parsing it; raises PreflightError if it cannot convert.
+
+    Results are remembered per size and mtime, so each stage of a conversion
+    can ask again for free.
+    """
+    stat = os.stat(file_path)
+    key = (os.path.abspath(file_path), stat.st_size, stat.st_mtime)
+    with _results_lock:
+        if key in _results:
+            _results.move_to_end(key)
+            return _results[key]
+    if _config["enabled"]:
+        with metrics.timed(metrics.PREFLIGHT, file_path, bytes=stat.st_size) as event:
+            result = _inspect(file_path, stat.st_size)
+            event.update(pages=result.pages, has_text=result.has_text)
+    else:
+        result = PreflightResult(file_path, stat.st_size)
+    with _results_lock:
+        _results[key] = result
+        while len(_results) > MAX_REMEMBERED:
+            _results.popitem(last=False)
+    return result
+
+
+def _inspect(file_path, size):
+    if size == 0:
+        raise PreflightError(f"{file_path} is empty")
+    with open(file_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        header = _VERSION.search(data, 0, HEADER_WINDOW + 13)
+        if header is None:
+            raise PreflightError(f"{file_path} is not a PDF (no %PDF- header)")
+        if data.rfind(b"%%EOF", max(size - HEADER_WINDOW, 0)) < 0:
+            raise PreflightError(f"{file_path} is truncated or damaged (no %%EOF marker)")
+        # Only the first and last megabyte are read, so a large file costs no more than a small one
+        windows = [(0, min(LINEARIZED_WINDOW, size))]
+        if size > LINEARIZED_WINDOW:
+            windows.append((max(size - TRAILER_WINDOW, LINEARIZED_WINDOW), size))
+        whole = size <= LINEARIZED_WINDOW + TRAILER_WINDOW  # Then the windows cover every byte
+        if any(data.find(b"/Encrypt", start, end) >= 0 for start, end in windows):
+            raise PreflightError(f"{file_path} is encrypted; remove its password before converting")
+        compressed = any(data.find(b"/ObjStm", start, end) >= 0 for start, end in windows)
+        # The trailer's /Root leads to the catalog and from there to the page tree root's /Count
+        xref = _startxref(data, size)
+        catalog = _referenced(data, xref, _trailer(data, xref), _ROOT)
+        page_tree = _referenced(data, xref, catalog, _PAGES_REF)
+        count = _COUNT.search(page_tree) if page_tree else None
+        pages = int(count.group(1)) if count else None
+        if pages is None:
+            # No classic xref to follow: the page tree root counts every page, leaves are a last resort
+            counts = [int(match.group(1) or match.group(2))
+                      for start, end in windows for match in _PAGES_COUNT.finditer(data, start, end)]
+            if counts:
+                pages = max(counts)
+            elif whole and not compressed:
+                pages = sum(1 for _ in _PAGE.finditer(data)) or None
+        if any(data.find(b"/Font", start, end) >= 0 for start, end in windows):
+            has_text = True
+        else:
+            has_text = False if whole and not compressed else None
+        lang = _LANG.search(catalog) if catalog else None
+        if lang is None:
+            lang = next(filter(None, (_LANG.search(data, start, end) for start, end in windows)), None)
+        return PreflightResult(
+            file_path, size, version=header.group(1).decode(), pages=pages,
+            has_text=has_text, lang=_literal(lang.group(1)) if lang else None
+        )
+
+
+def _startxref(data, size):
+    start = data.rfind(b"startxref", max(size - HEADER_WINDOW, 0))
+    match = _STARTXREF.match(data, start) if start >= 0 else None
+    return int(match.group(1)) if match else None
+
+
+def _xref_sections(data, xref):
+    """Yield (subsections, trailer) for the classic xref table at ``xref`` and each older one its /Prev names.
+
+    Stops at an xref stream, whose entries are compressed. Subsections are
+    (first object, count, offset of the first entry); entries are 20 bytes each.
+    """
+    for _ in range(MAX_XREF_SECTIONS):
+        match = _XREF.match(data, xref) if xref is not None and 0 <= xref < len(data) else None
+        if match is None:
+            return
+        subsections = []
+        position = match.end()
+        while subsection := _SUBSECTION.match(data, position, position + 64):
+            first, count = int(subsection.group(1)), int(subsection.group(2))
+            subsections.append((first, count, subsection.end()))
+            position = subsection.end() + count * 20
+        trailer = data[position:position + OBJECT_WINDOW]
+        end = trailer.find(b"startxref")
+        trailer = trailer if end < 0 else trailer[:end]
+        yield subsections, trailer
+        prev = _PREV.search(trailer)
+        xref = int(prev.group(1)) if prev else None
+
+
+def _trailer(data, xref):
+    """The newest trailer dictionary, or None."""
+    return next((trailer for _, trailer in _xref_sections(data, xref)), None)
+
+
+def _referenced(data, xref, source, pattern):
+    """The object a reference like ``/Root 1 0 R`` in ``source`` points at, or None."""
+    match = pattern.search(source) if source else None
+    if match is None:
+        return None
+    number = int(match.group(1))
+    offset = _object_offset(data, xref, number)
+    if offset is None:
+        return None
+    body = data[offset:offset + OBJECT_WINDOW]
+    if not body.startswith(b"%d " % number):
+        return None
+    end = body.find(b"endobj")
+    return body if end < 0 else body[:end]
+
+
+def _object_offset(data, xref, number):
+    """Byte offset of object ``number`` in the newest xref section that lists it."""
+    for subsections, _ in _xref_sections(data, xref):
+        for first, count, start in subsections:
+            if first <= number < first + count:
+                entry = data[start + (number - first) * 20:start + (number - first) * 20 + 18]
+                return int(entry[:10]) if entry.endswith(b"n") and entry[:10].isdigit() else None
+    return None
+
+
+def _literal(value):
+    """Decode the escapes of a PDF literal string, e.g. de\\055DE -> de-DE."""
+    def unescape(match):
+        escaped = match.group(1)
+        return bytes([int(escaped, 8) & 0xFF]) if escaped[:1].isdigit() else escaped
+    return _ESCAPE.sub(unescape, value).decode("latin-1")
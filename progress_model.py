@@ -0,0 +1,131 @@
+from pathlib import Path
+from PyQt5.QtWidgets import QApplication, QStyle, QStyledItemDelegate, QStyleOptionProgressBar
+from PyQt5.QtCore import Qt, QAbstractTableModel, QModelIndex, QTimer
+from PyQt5.QtGui import QColor, QPalette
+
+NAME_COLUMN, PROGRESS_COLUMN, STATUS_COLUMN = range(3)
+HEADERS = ("File Name", "Progress", "Status")
+PENDING = "Pending"
+FRAME_MS = 33  # Coalesce row updates to ~30 repaints per second
+
+
+def progress_color(value, colors):
+    if value < 33:
+        return colors["danger"]
+    if value < 66:
+        return colors["primary"]
+    return colors["success"]
+
+
+class ProgressTableModel(QAbstractTableModel):
+    """One row per file, looked up by full path in O(1).
+
+    Updates only mark rows dirty; a single-shot timer turns them into one
+    ``dataChanged`` per frame, so thousands of progress signals a second cost
+    a handful of repaints.
+    """
+
+    def __init__(self, colors, parent=None, frame_ms=FRAME_MS):
+        super().__init__(parent)
+        self.colors = colors
+        self._rows = []  # [file_path, name, progress, status, status color or None]
+        self._index = {}  # file_path -> row number
+        self._dirty = set()
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(frame_ms)
+        self._timer.timeout.connect(self.flush)
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(HEADERS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return HEADERS[section]
+        return None
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        file_path, name, progress, status, color = self._rows[index.row()]
+        column = index.column()
+        if role == Qt.DisplayRole:
+            return (name, progress, status)[column]
+        if role == Qt.ToolTipRole:
+            return file_path if column == NAME_COLUMN else None
+        if role == Qt.ForegroundRole and column == STATUS_COLUMN and color:
+            return QColor(color)
+        return None
+
+    def add_files(self, file_paths):
+        """Append rows for paths not already listed; returns the ones added."""
+        added = list(dict.fromkeys(path for path in file_paths if path not in self._index))
+        if not added:
+            return added
+        first = len(self._rows)
+        self.beginInsertRows(QModelIndex(), first, first + len(added) - 1)
+        for offset, file_path in enumerate(added):
+            self._index[file_path] = first + offset
+            self._rows.append([file_path, Path(file_path).name, 0, PENDING, None])
+        self.endInsertRows()
+        return added
+
+    def clear(self):
+        self.beginResetModel()
+        self._rows.clear()
+        self._index.clear()
+        self._dirty.clear()
+        self.endResetModel()
+
+    def set_progress(self, file_path, progress):
+        self._update(file_path, 2, progress)
+
+    def set_status(self, file_path, status, color=None):
+        row = self._index.get(file_path)
+        if row is not None:
+            self._rows[row][4] = color
+            self._update(file_path, 3, status)
+
+    def _update(self, file_path, field, value):
+        row = self._index.get(file_path)
+        if row is None or self._rows[row][field] == value:
+            return
+        self._rows[row][field] = value
+        self._dirty.add(row)
+        if not self._timer.isActive():
+            self._timer.start()
+
+    def flush(self):
+        """Emit one dataChanged spanning every row touched since the last frame."""
+        if not self._dirty:
+            return
+        first, last = min(self._dirty), max(self._dirty)
+        self._dirty.clear()
+        # The view only repaints the part of the range that is on screen
+        self.dataChanged.emit(self.index(first, 0), self.index(last, len(HEADERS) - 1))
+
+
+class ProgressBarDelegate(QStyledItemDelegate):
+    """Paint the progress column as a bar instead of creating a QProgressBar per row."""
+
+    def __init__(self, colors, parent=None):
+        super().__init__(parent)
+        self.colors = colors
+
+    def paint(self, painter, option, index):
+        value = index.data(Qt.DisplayRole) or 0
+        bar = QStyleOptionProgressBar()
+        bar.rect = option.rect.adjusted(2, 2, -2, -2)
+        bar.minimum = 0
+        bar.maximum = 100
+        bar.progress = value
+        bar.text = f"{value}%"
+        bar.textVisible = True
+        bar.textAlignment = Qt.AlignCenter
+        bar.state = option.state | QStyle.State_Horizontal
+        bar.palette = QPalette(option.palette)
+        bar.palette.setColor(QPalette.Highlight, QColor(progress_color(value, self.colors)))
+        QApplication.style().drawControl(QStyle.CE_ProgressBar, bar, painter)
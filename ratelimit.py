@@ -0,0 +1,257 @@
+import json
+import os
+import tempfile
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# Budgets, one per kind of request
+ASSETS = "assets"  # POST /assets
+SUBMIT = "submit"  # POST /operation/exportpdf
+STATUS = "status"  # GET .../status
+BUCKETS = (ASSETS, SUBMIT, STATUS)
+
+# (requests per second, burst) ceilings; AIMD probes up to these and backs off below them
+DEFAULT_LIMITS = {ASSETS: (5.0, 10), SUBMIT: (5.0, 10), STATUS: (10.0, 20)}
+MIN_RATE = 0.2
+INCREASE = 0.02  # Additive step per successful request, as a fraction of the ceiling
+DECREASE = 0.5  # Multiplicative cut on a throttled response
+DECREASE_COOLDOWN = 1.0  # A burst of 429s from one moment counts as a single congestion signal
+THROTTLE_STATUSES = (429, 503)
+MAX_THROTTLE_RETRIES = 5
+
+DEFAULT_STATE_PATH = os.path.join(os.path.expanduser("~"), ".cache", "pdf-to-word", "ratelimit.json")
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+
+def retry_after_seconds(headers):
+    """Parse a Retry-After header (seconds or HTTP date); None when absent or invalid."""
+    value = headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+class RateLimiter:
+    """Token buckets with AIMD rates, optionally shared by every process on the host.
+
+    With a ``path`` the bucket state lives in a small JSON file guarded by an OS
+    file lock, so several convert.py runs draw on one budget; without one it is
+    kept in memory. Wall-clock time is used because it is the one clock every
+    process agrees on.
+    """
+
+    def __init__(self, path=None, limits=None):
+        self.path = path
+        self.limits = dict(DEFAULT_LIMITS)
+        self.limits.update(limits or {})
+        self._lock = threading.Lock()
+        self._state = {}
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    def set_limit(self, bucket, rate, burst=None):
+        self.limits[bucket] = (float(rate), burst if burst is not None else max(int(rate * 2), 1))
+
+    def reserve(self, bucket):
+        """Take one token if available; otherwise return the seconds to wait before trying again."""
+        with self._locked() as state:
+            entry = self._refill(state, bucket)
+            wait = entry["blocked_until"] - time.time()
+            if wait > 0:
+                return wait
+            if entry["tokens"] >= 1:
+                entry["tokens"] -= 1
+                return 0
+            return (1 - entry["tokens"]) / entry["rate"]
+
+    def acquire(self, bucket, sleep=time.sleep):
+        """Block until a token is available; pass an interruptible ``sleep`` (TransferControl.sleep) to stop early."""
+        while True:
+            wait = self.reserve(bucket)
+            if not wait:
+                return
+            sleep(wait)
+
+    async def acquire_async(self, bucket):
+        import asyncio  # Only the async engine waits here; keep the import off everyone else's startup
+        while True:
+            wait = self.reserve(bucket)
+            if not wait:
+                return
+            await asyncio.sleep(wait)
+
+    def feedback(self, bucket, status_code, headers=None, retries=None):
+        """Adapt the rate to a response; returns True if it was throttled.
+
+        ``retries`` is the urllib3 retry history, so throttles that the transport
+        already retried still slow the bucket down.
+        """
+        throttled = status_code in THROTTLE_STATUSES or any(
+            getattr(retry, "status", None) in THROTTLE_STATUSES for retry in retries or ()
+        )
+        ceiling = self.limits[bucket][0]
+        with self._locked() as state:
+            entry = self._refill(state, bucket)
+            now = time.time()
+            if throttled:
+                if now - entry["decreased_at"] >= DECREASE_COOLDOWN:
+                    entry["rate"] = max(entry["rate"] * DECREASE, MIN_RATE)
+                    entry["decreased_at"] = now
+                    entry["tokens"] = min(entry["tokens"], 0)
+                delay = retry_after_seconds(headers or {})
+                if delay is not None:
+                    entry["blocked_until"] = max(entry["blocked_until"], now + delay)
+            else:
+                entry["rate"] = min(entry["rate"] + ceiling * INCREASE, ceiling)
+        return throttled
+
+    def observe(self, bucket, response):
+        """``feedback`` for a requests response, including throttles urllib3 retried on its own."""
+        retries = getattr(getattr(getattr(response, "raw", None), "retries", None), "history", None)
+        return self.feedback(bucket, response.status_code, response.headers, retries)
+
+    def send(self, bucket, request, sleep=time.sleep):
+        """Call ``request()`` (returning a requests response) within the budget, retrying throttled attempts.
+
+        A 429/503 means the request was rejected rather than processed, so this
+        is safe even for the POSTs that the transport never retries.
+        """
+        for attempt in range(MAX_THROTTLE_RETRIES + 1):
+            self.acquire(bucket, sleep)
+            response = request()
+            if not self.observe(bucket, response) or attempt == MAX_THROTTLE_RETRIES:
+                return response
+
+    def snapshot(self):
+        """Current rate, tokens and back-off per bucket."""
+        with self._locked() as state:
+            return {bucket: dict(self._refill(state, bucket)) for bucket in self.limits}
+
+    def _refill(self, state, bucket):
+        rate_ceiling, burst = self.limits[bucket]
+        now = time.time()
+        entry = state.setdefault(bucket, {
+            "rate": rate_ceiling, "tokens": float(burst), "updated": now, "blocked_until": 0.0, "decreased_at": 0.0
+        })
+        entry["rate"] = min(max(entry["rate"], MIN_RATE), rate_ceiling)
+        elapsed = max(now - entry["updated"], 0.0)  # Wall clocks can step backwards
+        entry["tokens"] = min(entry["tokens"] + elapsed * entry["rate"], burst)
+        entry["updated"] = now
+        return entry
+
+    def _locked(self):
+        return _SharedState(self) if self.path else _LocalState(self)
+
+
+class _LocalState:
+    def __init__(self, limiter):
+        self.limiter = limiter
+
+    def __enter__(self):
+        self.limiter._lock.acquire()
+        return self.limiter._state
+
+    def __exit__(self, *exc):
+        self.limiter._lock.release()
+
+
+class _SharedState:
+    """Read-modify-write of the state file under an exclusive OS lock."""
+
+    def __init__(self, limiter):
+        self.limiter = limiter
+        self.state = None
+        self._lock_file = None
+
+    def __enter__(self):
+        self.limiter._lock.acquire()
+        try:
+            self._lock_file = open(self.limiter.path + ".lock", "a+b")
+            lock_file(self._lock_file)
+            try:
+                with open(self.limiter.path, "r") as f:
+                    self.state = json.load(f)
+            except (OSError, ValueError):
+                self.state = {}  # First use, or a file torn by a crash: start from full buckets
+        except BaseException:
+            self._release()
+            raise
+        return self.state
+
+    def __exit__(self, exc_type, *exc):
+        try:
+            if exc_type is None:
+                directory = os.path.dirname(os.path.abspath(self.limiter.path))
+                fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".ratelimit-")
+                with os.fdopen(fd, "w") as f:
+                    json.dump(self.state, f)
+                os.replace(tmp_path, self.limiter.path)
+        finally:
+            self._release()
+
+    def _release(self):
+        if self._lock_file is not None:
+            unlock_file(self._lock_file)
+            self._lock_file.close()
+            self._lock_file = None
+        self.limiter._lock.release()
+
+
+def lock_file(f):
+    """Block until this process holds the exclusive OS lock on the open file f."""
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+    else:
+        f.seek(0)
+        while True:
+            try:
+                msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                return
+            except OSError:
+                pass  # LK_LOCK gives up after ~10 seconds; keep waiting
+
+
+def unlock_file(f):
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+    else:
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def set_limiter(limiter):
+    """Replace the process-wide limiter, e.g. with one whose budget a cluster coordinator holds."""
+    global _limiter
+    with _limiter_lock:
+        _limiter = limiter
+    return limiter
+
+
+def get_limiter():
+    """Return the process-wide limiter.
+
+    Its state is shared through PDF2WORD_RATELIMIT_STATE (default under
+    ~/.cache/pdf-to-word); set the variable to an empty string to keep limits per process.
+    """
+    global _limiter
+    with _limiter_lock:
+        if _limiter is None:
+            path = os.environ.get("PDF2WORD_RATELIMIT_STATE", DEFAULT_STATE_PATH)
+            _limiter = RateLimiter(path or None)
+        return _limiter
@@ -0,0 +1,148 @@
+import heapq
+import itertools
+import threading
+
+DEFAULT_MAX_WORKERS = 4
+
+QUEUED = "Queued"
+RUNNING = "Running"
+DONE = "Done"
+FAILED = "Failed"
+CANCELLED = "Cancelled"
+
+
+class Job:
+    def __init__(self, key, func, priority=0):
+        self.key = key
+        self.func = func
+        self.priority = priority
+        self.state = QUEUED
+        self.result = None
+        self.error = None
+
+
+class JobScheduler:
+    """Run jobs on a bounded pool of threads, lowest priority value first, FIFO within a priority.
+
+    At most ``max_workers`` jobs run at once; the rest wait in the queue until a
+    slot frees up. If ``max_pending`` is set, ``submit`` blocks while the queue is
+    full so producers cannot run ahead of the workers.
+    """
+
+    def __init__(self, max_workers=DEFAULT_MAX_WORKERS, max_pending=None, on_state_change=None):
+        if max_workers < 1:
+            raise ValueError("max_workers must be at least 1")
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.on_state_change = on_state_change
+        self._queue = []
+        self._counter = itertools.count()
+        self._cond = threading.Condition()
+        self._threads = []
+        self._running = 0
+        self._shutdown = False
+
+    def submit(self, key, func, priority=0, timeout=None):
+        """Queue ``func`` under ``key``; blocks while the pending queue is full."""
+        job = Job(key, func, priority)
+        with self._cond:
+            if self._shutdown:
+                raise RuntimeError("Scheduler has been shut down")
+            if self.max_pending is not None:
+                if not self._cond.wait_for(lambda: len(self._queue) < self.max_pending or self._shutdown, timeout):
+                    raise TimeoutError("Timed out waiting for a free queue slot")
+                if self._shutdown:
+                    raise RuntimeError("Scheduler has been shut down")
+            # Report "Queued" before a worker can pick the job up and report "Running"
+            self._notify(job)
+            heapq.heappush(self._queue, (priority, next(self._counter), job))
+            self._spawn_worker()
+            self._cond.notify_all()
+        return job
+
+    def set_max_workers(self, max_workers):
+        """Change the concurrency cap; extra threads exit once their current job finishes."""
+        if max_workers < 1:
+            raise ValueError("max_workers must be at least 1")
+        with self._cond:
+            self.max_workers = max_workers
+            for _ in range(max_workers):
+                self._spawn_worker()
+            self._cond.notify_all()
+
+    def cancel_pending(self):
+        """Drop every job that has not started yet and return them."""
+        with self._cond:
+            cancelled = [job for _, _, job in self._queue]
+            self._queue.clear()
+            self._cond.notify_all()
+        for job in cancelled:
+            job.state = CANCELLED
+            self._notify(job)
+        return cancelled
+
+    def pending_count(self):
+        with self._cond:
+            return len(self._queue)
+
+    def running_count(self):
+        with self._cond:
+            return self._running
+
+    def wait(self, timeout=None):
+        """Block until the queue is empty and no job is running."""
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._queue and self._running == 0, timeout)
+
+    def shutdown(self, wait=True, cancel_pending=False):
+        if cancel_pending:
+            self.cancel_pending()
+        with self._cond:
+            self._shutdown = True
+            self._cond.notify_all()
+            threads = list(self._threads)
+        if wait:
+            for thread in threads:
+                thread.join()
+
+    def _spawn_worker(self):
+        # Called with the condition held
+        idle = len(self._threads) - self._running
+        if idle < len(self._queue) and len(self._threads) < self.max_workers:
+            thread = threading.Thread(target=self._worker_loop, name=f"scheduler-{len(self._threads)}", daemon=True)
+            self._threads.append(thread)
+            thread.start()
+
+    def _worker_loop(self):
+        me = threading.current_thread()
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._queue or self._shutdown or len(self._threads) > self.max_workers)
+                if not self._queue or len(self._threads) > self.max_workers:
+                    if self._shutdown or len(self._threads) > self.max_workers:
+                        self._threads.remove(me)
+                        self._cond.notify_all()
+                        return
+                    continue
+                _, _, job = heapq.heappop(self._queue)
+                self._running += 1
+                job.state = RUNNING
+                self._cond.notify_all()
+            self._notify(job)
+            try:
+                job.result = job.func()
+                job.state = DONE
+            except Exception as e:
+                job.error = e
+                job.state = FAILED
+            with self._cond:
+                self._running -= 1
+                self._cond.notify_all()
+            self._notify(job)
+
+    def _notify(self, job):
+        if self.on_state_change:
+            try:
+                self.on_state_change(job)
+            except Exception as e:
+                print(f"Scheduler state callback error: {e}")
@@ -0,0 +1,131 @@
+import os
+import shutil
+import tempfile
+from concurrent.futures import CancelledError
+from scheduler import JobScheduler, FAILED, CANCELLED
+
+# Files at or above either threshold are converted as page-range chunks
+SPLIT_MIN_PAGES = 200
+SPLIT_MIN_BYTES = 50 * 1024 * 1024
+CHUNK_PAGES = 100
+MAX_PARALLEL_CHUNKS = 4
+
+_config = {
+    "enabled": True,
+    "min_pages": SPLIT_MIN_PAGES,
+    "min_bytes": SPLIT_MIN_BYTES,
+    "chunk_pages": CHUNK_PAGES,
+    "max_workers": MAX_PARALLEL_CHUNKS,
+}
+
+
+def configure(enabled=None, min_pages=None, min_bytes=None, chunk_pages=None, max_workers=None):
+    for name, value in (("enabled", enabled), ("min_pages", min_pages), ("min_bytes", min_bytes),
+                        ("chunk_pages", chunk_pages), ("max_workers", max_workers)):
+        if value is not None:
+            _config[name] = value
+
+
+def available():
+    """Splitting needs pypdf, and merging needs python-docx plus docxcompose."""
+    try:
+        import pypdf  # noqa: F401
+        import docxcompose  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def plan(file_path, pages=None):
+    """Page ranges (1-based, inclusive) to convert separately, or None to convert the file whole.
+
+    A known page count (from preflight) lets small files skip opening pypdf.
+    """
+    if not _config["enabled"] or not available():
+        return None
+    size = os.path.getsize(file_path)
+    if pages is not None and pages < _config["min_pages"] and size < _config["min_bytes"]:
+        return None
+    import pypdf
+    try:
+        pages = len(pypdf.PdfReader(file_path).pages)
+    except Exception as e:
+        print(f"Not splitting {file_path}: {e}")  # Adobe may still read what pypdf cannot
+        return None
+    chunk_pages = _config["chunk_pages"]
+    if pages < 2 or (pages < _config["min_pages"] and size < _config["min_bytes"]):
+        return None
+    if pages <= chunk_pages:
+        # Over the size threshold but short: still split, one part per parallel slot
+        chunk_pages = -(-pages // _config["max_workers"])
+    return [(start, min(start + chunk_pages - 1, pages)) for start in range(1, pages + 1, chunk_pages)]
+
+
+def split_pdf(file_path, ranges, directory):
+    """Write one PDF per page range into directory and return their paths in page order.
+
+    Chunks left by an interrupted run are reused as they are, so the journal
+    (which invalidates on size/mtime) can resume their conversions.
+    """
+    import pypdf
+    os.makedirs(directory, exist_ok=True)
+    reader = None
+    paths = []
+    for start, end in ranges:
+        path = os.path.join(directory, f"pages-{start:05d}-{end:05d}.pdf")
+        if not os.path.exists(path):
+            reader = reader or pypdf.PdfReader(file_path)
+            writer = pypdf.PdfWriter()
+            for page in range(start - 1, end):
+                writer.add_page(reader.pages[page])
+            fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+            with os.fdopen(fd, "wb") as f:
+                writer.write(f)
+            os.replace(tmp_path, path)
+        paths.append(path)
+    return paths
+
+
+def merge_docx(part_paths, output_path):
+    """Concatenate DOCX parts in order, each starting on a new page, and write output_path atomically."""
+    from docx import Document
+    from docxcompose.composer import Composer
+    master = Document(part_paths[0])
+    composer = Composer(master)
+    for part_path in part_paths[1:]:
+        master.add_page_break()
+        composer.append(Document(part_path))
+    directory = os.path.dirname(os.path.abspath(output_path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-", suffix=".docx")
+    os.close(fd)
+    try:
+        composer.save(tmp_path)
+        os.replace(tmp_path, output_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def convert_split(file_path, output_path, ranges, directory, convert_part):
+    """Convert each page range with ``convert_part(chunk_pdf, chunk_docx)`` in parallel, then merge.
+
+    ``directory`` holds the chunks and their DOCX parts; it is removed once the
+    merged document is saved.
+    """
+    chunks = split_pdf(file_path, ranges, directory)
+    parts = [os.path.splitext(chunk)[0] + ".docx" for chunk in chunks]
+    scheduler = JobScheduler(max_workers=min(_config["max_workers"], len(chunks)))
+    jobs = [scheduler.submit(chunk, lambda chunk=chunk, part=part: convert_part(chunk, part))
+            for chunk, part in zip(chunks, parts)]
+    scheduler.wait()
+    scheduler.shutdown()
+    # A chunk whose conversion was stopped fails with CancelledError; that is a cancel, not a failure
+    if any(job.state == CANCELLED or isinstance(job.error, CancelledError) for job in jobs):
+        raise CancelledError()
+    for job, (start, end) in zip(jobs, ranges):
+        if job.state == FAILED:
+            raise RuntimeError(f"Pages {start}-{end} failed: {job.error}") from job.error
+    merge_docx(parts, output_path)
+    shutil.rmtree(directory, ignore_errors=True)
+    return len(chunks)
@@ -0,0 +1,86 @@
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(autouse=True)
+def isolated_state(tmp_path, monkeypatch):
+    """Keep the cache, journal, settings and rate-limit state of every test in its own directory."""
+    import cache
+    import journal
+    monkeypatch.setenv("PDF2WORD_CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setenv("PDF2WORD_JOURNAL", str(tmp_path / "journal.sqlite3"))
+    monkeypatch.setenv("PDF2WORD_RATELIMIT_STATE", "")
+    monkeypatch.setenv("PDF2WORD_CONFIG", str(tmp_path / "config.json"))
+    monkeypatch.setattr(cache, "_cache", None)
+    monkeypatch.setattr(journal, "_journal", None)
+
+
+@pytest.fixture
+def adobe_services(monkeypatch):
+    """The mock Adobe services, with credentials, tokens and pollers of this process pointed at them."""
+    import config
+    import poller
+    import tokens
+    from mock_adobe_server import MockAdobeServer, MockSettings
+    monkeypatch.setattr(config, "_credentials", None)
+    monkeypatch.setattr(config, "_file_settings", None)
+    monkeypatch.setattr(tokens, "_providers", {})
+    monkeypatch.setattr(poller, "_pollers", {})
+    monkeypatch.setattr(poller, "_poller_credentials", {})
+    monkeypatch.setattr(poller, "FIRST_POLL_DELAY", 0.0)
+    monkeypatch.setenv(config.CLIENT_ID_ENV, "tests")
+    monkeypatch.setenv(config.CLIENT_SECRET_ENV, "tests")
+    with MockAdobeServer(settings=MockSettings(latency=0, latency_jitter=0, conversion_median=0.05,
+                                               conversion_per_mb=0)) as server:
+        monkeypatch.setenv(config.IMS_URL_ENV, server.url)
+        monkeypatch.setenv(config.PDF_SERVICES_URL_ENV, server.url)
+        yield server
+        for status_poller in poller._pollers.values():
+            status_poller.close()
+
+
+class ScriptedServer:
+    """A local HTTP server answering GETs with ``respond(handler, number)``; number counts requests from 1."""
+
+    def __init__(self, respond):
+        self.requests = []  # (path, headers) per request, in order
+        self._respond = respond
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                server.requests.append((self.path, dict(self.headers)))
+                server._respond(self, len(server.requests))
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.httpd.daemon_threads = True
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.httpd.server_address[1]}"
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+@pytest.fixture
+def scripted_server():
+    servers = []
+
+    def start(respond):
+        servers.append(ScriptedServer(respond))
+        return servers[-1]
+    yield start
+    for server in servers:
+        server.close()
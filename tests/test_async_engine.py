@@ -0,0 +1,59 @@
+import asyncio
+import re
+
+import pytest
+
+import async_engine
+
+CREDENTIALS = {"client_credentials": {"client_id": "tests", "client_secret": "tests"}}
+ORIGINAL = b"a" * 200_000
+REPLACED = b"b" * 150_000
+
+
+def interrupted_object(changed):
+    """First response dies a quarter through; resumes honour If-Range against the current ETag."""
+    def respond(handler, number):
+        if number == 1:
+            handler.send_response(200)
+            handler.send_header("Content-Length", str(len(ORIGINAL)))
+            handler.send_header("ETag", '"v1"')
+            handler.end_headers()
+            handler.wfile.write(ORIGINAL[:50_000])
+            handler.wfile.flush()
+            handler.connection.shutdown(2)
+            return
+        body, etag = (REPLACED, '"v2"') if changed else (ORIGINAL, '"v1"')
+        match = re.match(r"bytes=(\d+)-", handler.headers.get("Range", ""))
+        if match and handler.headers.get("If-Range") == etag:
+            start = int(match.group(1))
+            handler.send_response(206)
+            handler.send_header("Content-Range", f"bytes {start}-{len(body) - 1}/{len(body)}")
+            body = body[start:]
+        else:
+            handler.send_response(200)
+        handler.send_header("Content-Length", str(len(body)))
+        handler.send_header("ETag", etag)
+        handler.end_headers()
+        handler.wfile.write(body)
+    return respond
+
+
+def download(url, output_path):
+    async def run():
+        async with async_engine.AsyncConversionEngine(CREDENTIALS) as engine:
+            await engine.download(url, output_path)
+    asyncio.run(run())
+    with open(output_path, "rb") as f:
+        return f.read()
+
+
+@pytest.mark.parametrize("changed, expected", [(False, ORIGINAL), (True, REPLACED)], ids=["unchanged", "changed"])
+def test_resume_is_guarded_by_if_range(scripted_server, tmp_path, changed, expected):
+    server = scripted_server(interrupted_object(changed))
+    data = download(f"{server.url}/result", str(tmp_path / "out.docx"))
+    # Lengths and byte values rather than the bytes themselves, which make unreadable diffs
+    assert (len(data), set(data)) == (len(expected), set(expected))
+    assert len(server.requests) == 2
+    resume_headers = server.requests[1][1]
+    assert resume_headers["Range"] == "bytes=50000-"
+    assert resume_headers["If-Range"] == '"v1"'
@@ -0,0 +1,62 @@
+import json
+import multiprocessing
+import os
+
+from cache import ConversionCache
+
+ENTRY_BYTES = 10_000
+
+
+def fill(directory, max_bytes, worker, source, count):
+    cache = ConversionCache(directory, max_bytes)
+    for number in range(count):
+        cache.put(f"{worker:02d}{number:062d}", source)
+
+
+def run_processes(directory, max_bytes, source, workers=4, count=10):
+    processes = [multiprocessing.Process(target=fill, args=(directory, max_bytes, worker, source, count))
+                 for worker in range(workers)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join(timeout=60)
+        assert process.exitcode == 0
+
+
+def on_disk(directory):
+    with open(os.path.join(directory, "index.json")) as f:
+        index = json.load(f)
+    objects = {name for _, _, names in os.walk(os.path.join(directory, "objects")) for name in names}
+    return index, objects
+
+
+def make_source(tmp_path):
+    source = tmp_path / "converted.docx"
+    source.write_bytes(b"x" * ENTRY_BYTES)
+    return str(source)
+
+
+def test_processes_merge_their_entries(tmp_path):
+    directory = str(tmp_path / "cache")
+    run_processes(directory, 10**9, make_source(tmp_path))
+    index, objects = on_disk(directory)
+    assert len(index) == 40
+    assert set(index) == objects
+
+
+def test_size_cap_holds_across_processes(tmp_path):
+    directory = str(tmp_path / "cache")
+    run_processes(directory, 15 * ENTRY_BYTES, make_source(tmp_path))
+    index, objects = on_disk(directory)
+    assert sum(entry["size"] for entry in index.values()) <= 15 * ENTRY_BYTES
+    # Whichever process evicted an entry removed its object too
+    assert set(index) == objects
+
+
+def test_entry_from_another_instance_is_found(tmp_path):
+    directory = str(tmp_path / "cache")
+    reader, writer = ConversionCache(directory), ConversionCache(directory)
+    writer.put("ab" * 32, make_source(tmp_path))
+    assert reader.get("ab" * 32, str(tmp_path / "out.docx"))
+    reader.put("cd" * 32, make_source(tmp_path))
+    assert writer.get("cd" * 32, str(tmp_path / "out2.docx"))
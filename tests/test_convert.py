@@ -0,0 +1,53 @@
+import hashlib
+
+import pytest
+
+import cache
+import convert
+import preflight
+from benchmark import make_pdf
+
+
+@pytest.fixture
+def pdf(tmp_path):
+    path = tmp_path / "scan.pdf"
+    make_pdf(str(path), 200_000)
+    return str(path)
+
+
+@pytest.fixture
+def hashed(monkeypatch):
+    """Files hashed ahead of their upload, in order."""
+    calls = []
+    file_digest = cache.ConversionCache.file_digest
+
+    def spy(file_path):
+        calls.append(file_path)
+        return file_digest(file_path)
+    monkeypatch.setattr(cache.ConversionCache, "file_digest", staticmethod(spy))
+    return calls
+
+
+def cache_key(pdf):
+    with open(pdf, "rb") as f:
+        digest = hashlib.sha256(f.read()).hexdigest()
+    return cache.ConversionCache.key_for_digest(digest, "docx", preflight.check(pdf).ocr_lang)
+
+
+def test_lookup_hashes_once_and_hits_on_the_next_run(adobe_services, pdf, hashed, tmp_path):
+    assert convert.convert_file(pdf) == convert.CONVERTED
+    assert hashed == [pdf]
+    assert convert.convert_file(pdf, str(tmp_path / "copy.docx")) == convert.CACHED
+
+
+def test_force_stores_under_the_upload_digest_without_hashing_first(adobe_services, pdf, hashed, tmp_path):
+    assert convert.convert_file(pdf, force=True) == convert.CONVERTED
+    assert hashed == []
+    assert cache.get_cache().get(cache_key(pdf), str(tmp_path / "from-cache.docx"))
+
+
+def test_disabled_cache_never_hashes(adobe_services, pdf, hashed, monkeypatch):
+    monkeypatch.setenv("PDF2WORD_CACHE_MAX_MB", "0")
+    assert convert.convert_file(pdf) == convert.CONVERTED
+    assert convert.convert_file(pdf, force=True) == convert.CONVERTED
+    assert hashed == []
@@ -0,0 +1,64 @@
+import threading
+
+import pytest
+
+from journal import JobJournal, run_formats, encode_options, TOKEN, SAVED
+
+
+@pytest.fixture
+def journal(tmp_path):
+    return JobJournal(str(tmp_path / "journal.sqlite3"))
+
+
+@pytest.fixture
+def pdf(tmp_path):
+    path = tmp_path / "a.pdf"
+    path.write_bytes(b"%PDF-1.4\n%%EOF\n")
+    return str(path)
+
+
+def test_formats_failing_on_the_same_asset_share_one_re_upload(journal, pdf, tmp_path):
+    outputs = {"docx": str(tmp_path / "a.docx"), "xlsx": str(tmp_path / "a.xlsx")}
+    # Rows from an interrupted run, so a failed attempt is retried from scratch
+    for target_format, output_path in outputs.items():
+        journal.record(pdf, TOKEN, output_path, target_format, options=encode_options(None))
+    uploads = []
+    failed = threading.Barrier(len(outputs))  # Both formats fail on the first asset before either retries
+
+    def upload():
+        uploads.append(f"asset-{len(uploads)}")
+        return uploads[-1]
+
+    def submit(asset_id, target_format):
+        if asset_id == "asset-0":
+            failed.wait(timeout=10)
+            raise RuntimeError("asset expired")
+        return f"{asset_id}/{target_format}"
+
+    def download(download_uri, output_path):
+        with open(output_path, "w") as f:
+            f.write(download_uri)
+
+    results = run_formats(journal, pdf, outputs, upload, submit, poll=lambda job_id: job_id, download=download)
+    assert results == {"docx": True, "xlsx": True}
+    assert uploads == ["asset-0", "asset-1"]
+    for target_format, output_path in outputs.items():
+        with open(output_path) as f:
+            assert f.read() == f"asset-1/{target_format}"
+        assert journal.get(pdf, target_format)["stage"] == SAVED
+
+
+def test_fresh_formats_upload_once(journal, pdf, tmp_path):
+    outputs = {"docx": str(tmp_path / "a.docx"), "pptx": str(tmp_path / "a.pptx")}
+    uploads = []
+
+    def upload():
+        uploads.append("asset")
+        return "asset"
+
+    def download(download_uri, output_path):
+        open(output_path, "w").close()
+
+    run_formats(journal, pdf, outputs, upload, submit=lambda asset_id, target_format: target_format,
+                poll=lambda job_id: job_id, download=download)
+    assert uploads == ["asset"]
@@ -0,0 +1,70 @@
+from concurrent.futures import Future
+
+import pytest
+
+from journal import JobJournal, DONE, SAVED
+from pipeline import StagedPipeline
+
+
+class FailingJournal(JobJournal):
+    """Fails the first time a file reaches the given stage."""
+
+    def __init__(self, path, fail_at):
+        super().__init__(path)
+        self.fail_at = fail_at
+
+    def record(self, file_path, stage, *args, **fields):
+        if stage == self.fail_at:
+            self.fail_at = None
+            raise OSError("disk full")
+        return super().record(file_path, stage, *args, **fields)
+
+
+def completed(value):
+    future = Future()
+    future.set_result(value)
+    return future
+
+
+@pytest.fixture
+def pdf(tmp_path):
+    path = tmp_path / "a.pdf"
+    path.write_bytes(b"%PDF-1.4\n%%EOF\n")
+    return str(path)
+
+
+def make_pipeline(journal, downloads):
+    return StagedPipeline(
+        upload=lambda file_path: "asset",
+        submit=lambda file_path, asset_id: "job",
+        track=lambda file_path, job_id: completed("http://example.invalid/out"),
+        download=lambda file_path, uri, output_path: downloads.append(output_path),
+        journal=journal)
+
+
+def test_failure_after_polling_fails_the_file_instead_of_hanging(tmp_path, pdf):
+    journal = FailingJournal(str(tmp_path / "journal.sqlite3"), fail_at=DONE)
+    downloads = []
+    pipeline = make_pipeline(journal, downloads)
+    try:
+        future = pipeline.convert(pdf, str(tmp_path / "a.docx"))
+        assert pipeline.wait(timeout=10)
+        with pytest.raises(OSError, match="disk full"):
+            future.result(timeout=0)
+        assert downloads == []
+    finally:
+        pipeline.shutdown()
+
+
+def test_file_runs_through_every_stage(tmp_path, pdf):
+    journal = JobJournal(str(tmp_path / "journal.sqlite3"))
+    downloads = []
+    pipeline = make_pipeline(journal, downloads)
+    try:
+        future = pipeline.convert(pdf, str(tmp_path / "a.docx"))
+        assert pipeline.wait(timeout=10)
+        assert future.result(timeout=0) is True
+        assert downloads == [str(tmp_path / "a.docx")]
+        assert journal.get(pdf)["stage"] == SAVED
+    finally:
+        pipeline.shutdown()
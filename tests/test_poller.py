@@ -0,0 +1,84 @@
+import json
+
+import pytest
+
+import poller
+import ratelimit
+import tokens
+
+
+def reply(handler, status, payload, headers=None):
+    body = json.dumps(payload).encode()
+    handler.send_response(status)
+    for name, value in (headers or {}).items():
+        handler.send_header(name, value)
+    handler.send_header("Content-Type", "application/json")
+    handler.send_header("Content-Length", str(len(body)))
+    handler.end_headers()
+    handler.wfile.write(body)
+
+
+@pytest.fixture
+def limiter(monkeypatch):
+    monkeypatch.setattr(poller, "FIRST_POLL_DELAY", 0.0)
+    previous = ratelimit.get_limiter()
+    yield ratelimit.set_limiter(ratelimit.RateLimiter())
+    ratelimit.set_limiter(previous)
+
+
+@pytest.mark.parametrize("status", [429, 503])
+def test_throttled_poll_reaches_limiter_and_reschedules(scripted_server, limiter, status):
+    def respond(handler, number):
+        if number == 1:
+            return reply(handler, status, {}, {"Retry-After": "0"})
+        reply(handler, 200, {"status": "done", "asset": {"downloadUri": "http://example.invalid/out"}})
+    server = scripted_server(respond)
+    status_poller = poller.StatusPoller(lambda: {})
+    try:
+        ceiling = limiter.limits[ratelimit.STATUS][0]
+        assert status_poller.track(f"{server.url}/status").result(timeout=10) == "http://example.invalid/out"
+        # Each throttle is a poll of its own, not a transport retry hidden inside one
+        assert len(server.requests) == 2
+        assert status_poller.status_requests == 2
+        assert limiter.snapshot()[ratelimit.STATUS]["rate"] < ceiling
+    finally:
+        status_poller.close()
+
+
+def test_non_retryable_status_fails_the_job(scripted_server, limiter):
+    server = scripted_server(lambda handler, number: reply(handler, 404, {}))
+    status_poller = poller.StatusPoller(lambda: {})
+    try:
+        with pytest.raises(Exception, match="404"):
+            status_poller.track(f"{server.url}/status").result(timeout=10)
+        assert len(server.requests) == 1
+    finally:
+        status_poller.close()
+
+
+class StaticTokens:
+    def __init__(self, token):
+        self.token = token
+
+    def get_token(self):
+        return self.token
+
+    def close(self):
+        pass
+
+
+def test_poller_signs_with_reloaded_credentials(monkeypatch):
+    monkeypatch.setattr(tokens, "_providers", {})
+    monkeypatch.setattr(poller, "_pollers", {})
+    monkeypatch.setattr(poller, "_poller_credentials", {})
+    first = {"client_credentials": {"client_id": "client", "client_secret": "old"}}
+    reloaded = {"client_credentials": {"client_id": "client", "client_secret": "new"}}
+    tokens.set_token_provider(first, StaticTokens("old-token"))
+    status_poller = poller.get_poller(first)
+    try:
+        assert status_poller.headers_factory()["Authorization"] == "Bearer old-token"
+        tokens.set_token_provider(reloaded, StaticTokens("new-token"))
+        assert poller.get_poller(reloaded) is status_poller
+        assert status_poller.headers_factory()["Authorization"] == "Bearer new-token"
+    finally:
+        status_poller.close()
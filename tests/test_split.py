@@ -0,0 +1,41 @@
+from concurrent.futures import CancelledError
+
+import pypdf
+import pytest
+
+import split
+
+
+@pytest.fixture
+def document(tmp_path):
+    writer = pypdf.PdfWriter()
+    for _ in range(4):
+        writer.add_blank_page(612, 792)
+    path = tmp_path / "long.pdf"
+    with open(path, "wb") as f:
+        writer.write(f)
+    return str(path)
+
+
+def test_stopped_chunk_cancels_instead_of_failing(tmp_path, document):
+    def convert_part(chunk, part):
+        if "00003" in chunk:
+            raise CancelledError()
+        if "00001" in chunk:
+            raise RuntimeError("boom")
+
+    output = tmp_path / "long.docx"
+    ranges = [(1, 2), (3, 4)]
+    with pytest.raises(CancelledError):
+        split.convert_split(document, str(output), ranges, str(tmp_path / "parts"), convert_part)
+    assert not output.exists()
+
+
+def test_failed_chunk_names_its_pages(tmp_path, document):
+    def convert_part(chunk, part):
+        if "00003" in chunk:
+            raise RuntimeError("boom")
+
+    with pytest.raises(RuntimeError, match="Pages 3-4 failed: boom"):
+        split.convert_split(document, str(tmp_path / "long.docx"), [(1, 2), (3, 4)],
+                            str(tmp_path / "parts"), convert_part)
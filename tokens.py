@@ -0,0 +1,143 @@
+import threading
+import time
+from config import ims_url
+import metrics
+from http_session import get_session
+
+TOKEN_SCOPE = "openid,AdobeID,read_organizations,exportpdf"
+EXPIRY_MARGIN = 30  # Treat tokens as expired 30 seconds early
+REFRESH_AHEAD = 300  # Refresh in the background 5 minutes before expiry
+
+_providers = {}
+_providers_lock = threading.Lock()
+
+
+def token_url():
+    return f"{ims_url()}/ims/token/v3"
+
+
+class TokenProvider:
+    """Process-wide IMS access token shared by every worker.
+
+    Concurrent callers that find the token missing or expired wait on a single
+    in-flight request instead of each hitting the IMS endpoint, and a background
+    timer renews the token shortly before it expires so workers rarely block.
+    """
+
+    def __init__(self, credentials):
+        self.credentials = credentials
+        self._lock = threading.Lock()
+        self._token = None
+        self._inflight = None
+        self._error = None
+        self._timer = None
+
+    def get_token(self):
+        with self._lock:
+            if self._token and self._token["expires_at"] > time.time():
+                return self._token["access_token"]
+            inflight = self._inflight
+            leader = inflight is None
+            if leader:
+                inflight = self._inflight = threading.Event()
+
+        if leader:
+            self._refresh(inflight)
+        else:
+            inflight.wait()
+
+        with self._lock:
+            if self._token and self._token["expires_at"] > time.time():
+                return self._token["access_token"]
+            raise self._error or RuntimeError("Failed to obtain access token")
+
+    def get_token_with_expiry(self):
+        """(access_token, expires_at) for handing the token on, e.g. to cluster workers."""
+        access_token = self.get_token()
+        with self._lock:
+            return access_token, self._token["expires_at"] if self._token else time.time()
+
+    def invalidate(self):
+        """Drop the cached token, e.g. after the API answered 401."""
+        with self._lock:
+            self._token = None
+
+    def close(self):
+        with self._lock:
+            if self._timer:
+                self._timer.cancel()
+                self._timer = None
+
+    def _fetch(self):
+        data = {
+            "grant_type": "client_credentials",
+            "client_id": self.credentials["client_credentials"]["client_id"],
+            "client_secret": self.credentials["client_credentials"]["client_secret"],
+            "scope": TOKEN_SCOPE
+        }
+        with metrics.timed(metrics.TOKEN) as event:
+            response = get_session().post(token_url(), data=data, headers={"Content-Type": "application/x-www-form-urlencoded"}, timeout=30)
+            event.update(metrics.http_fields(response))
+            response.raise_for_status()
+            token_data = response.json()
+        return {
+            "access_token": token_data["access_token"],
+            "expires_at": time.time() + token_data["expires_in"] - EXPIRY_MARGIN
+        }
+
+    def _refresh(self, inflight):
+        try:
+            token = self._fetch()
+            error = None
+        except Exception as e:
+            token = None
+            error = e
+        with self._lock:
+            if token:
+                self._token = token
+                self._schedule_refresh(token["expires_at"])
+            self._error = error
+            self._inflight = None
+        inflight.set()
+
+    def _schedule_refresh(self, expires_at):
+        # Called with the lock held
+        if self._timer:
+            self._timer.cancel()
+        delay = max(expires_at - time.time() - REFRESH_AHEAD, 0)
+        if delay <= 0:
+            self._timer = None
+            return
+        self._timer = threading.Timer(delay, self._background_refresh)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _background_refresh(self):
+        with self._lock:
+            if self._inflight is not None:
+                return
+            inflight = self._inflight = threading.Event()
+        self._refresh(inflight)
+
+
+def set_token_provider(credentials, provider):
+    """Serve these credentials' tokens from provider, e.g. one that borrows them from a cluster coordinator."""
+    with _providers_lock:
+        old = _providers.get(credentials["client_credentials"]["client_id"])
+        if old is not None and old is not provider:
+            old.close()
+        provider.credentials = credentials
+        _providers[credentials["client_credentials"]["client_id"]] = provider
+    return provider
+
+
+def get_token_provider(credentials):
+    """Return the shared provider for these credentials, creating it on first use."""
+    client_id = credentials["client_credentials"]["client_id"]
+    with _providers_lock:
+        provider = _providers.get(client_id)
+        if provider is None or provider.credentials != credentials:
+            if provider:
+                provider.close()
+            provider = _providers[client_id] = TokenProvider(credentials)
+        return provider
@@ -0,0 +1,322 @@
+import hashlib
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import CancelledError
+import requests
+from urllib3.exceptions import HTTPError as Urllib3Error
+from http_session import get_session, abort_on
+
+MIN_CHUNK_SIZE = 64 * 1024
+MAX_CHUNK_SIZE = 4 * 1024 * 1024
+FAST_READ = 0.05  # A read quicker than this grows the buffer; one slower than SLOW_READ shrinks it
+SLOW_READ = 0.5
+MAX_RESUMES = 5
+DOWNLOAD_TIMEOUT = 300
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+UPLOAD_TIMEOUT = 300
+
+# Connection drops and stalls mid-body, which urllib3 does not retry once the headers have arrived
+TRANSIENT_ERRORS = (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError, Urllib3Error)
+
+
+class IncompleteDownload(IOError):
+    """The body ended before Content-Length bytes arrived and resuming did not recover it."""
+
+
+class TransferControl:
+    """Pause, resume or cancel a running conversion from another thread.
+
+    Transfers call ``checkpoint`` between chunks, so either takes effect
+    mid-file rather than at the next stage. Waits go through ``sleep`` and
+    ``result``, which return the moment the control is cancelled, and
+    ``on_cancel`` lets a blocking call register a way to abort itself, such as
+    closing its HTTP response.
+    """
+
+    def __init__(self):
+        self._resumed = threading.Event()
+        self._resumed.set()
+        self._cancelled = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks = []
+
+    def pause(self):
+        self._resumed.clear()
+
+    def resume(self):
+        self._resumed.set()
+
+    def cancel(self):
+        with self._lock:
+            self._cancelled.set()
+            callbacks, self._callbacks = self._callbacks, []
+        self._resumed.set()
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                print(f"Cancel callback error: {e}")
+
+    def on_cancel(self, callback):
+        """Run callback when cancelled (at once if already); returns a function that unregisters it."""
+        with self._lock:
+            if not self._cancelled.is_set():
+                self._callbacks.append(callback)
+                return lambda: self._unregister(callback)
+        callback()
+        return lambda: None
+
+    def _unregister(self, callback):
+        with self._lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+
+    def sleep(self, seconds):
+        """time.sleep that raises CancelledError as soon as the control is cancelled."""
+        if self._cancelled.wait(seconds):
+            raise CancelledError("Transfer cancelled")
+
+    def result(self, future):
+        """future.result() that cancels the future and raises CancelledError as soon as the control is cancelled."""
+        done = threading.Event()
+        future.add_done_callback(lambda _: done.set())
+        unregister = self.on_cancel(done.set)
+        try:
+            done.wait()
+        finally:
+            unregister()
+        if self.cancelled:
+            future.cancel()
+            raise CancelledError("Transfer cancelled")
+        return future.result()
+
+    @property
+    def paused(self):
+        return not self._resumed.is_set()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def checkpoint(self):
+        """Block while paused; raise CancelledError once cancelled."""
+        self._resumed.wait()
+        if self._cancelled.is_set():
+            raise CancelledError("Transfer cancelled")
+
+
+class Bandwidth:
+    """Byte-rate cap shared by every transfer that draws on it; unlimited while rate is None."""
+
+    def __init__(self, rate=None):
+        self.rate = rate
+        self._lock = threading.Lock()
+        self._allowance = 0.0
+        self._updated = time.monotonic()
+
+    def set_rate(self, rate):
+        with self._lock:
+            self.rate = rate
+            self._allowance = 0.0
+
+    def reserve(self, size):
+        """Take size bytes from the budget and return the seconds to wait before sending them."""
+        with self._lock:
+            if not self.rate:
+                return 0
+            now = time.monotonic()
+            # At most a quarter second of unused budget carries over, so idle time does not become a burst
+            self._allowance = min(self._allowance + (now - self._updated) * self.rate, self.rate / 4)
+            self._updated = now
+            self._allowance -= size
+            return max(-self._allowance / self.rate, 0)
+
+    def consume(self, size, sleep=time.sleep):
+        wait = self.reserve(size)
+        if wait:
+            sleep(wait)
+
+
+# Uplink cap for every upload in the process (convert.py --upload-limit)
+upload_bandwidth = Bandwidth()
+
+
+class UploadStream:
+    """Request body that sends a file in one pass, hashing it and reporting progress on the way.
+
+    Each chunk read goes to the socket, to SHA-256 and to ``progress(sent,
+    total)``, and passes ``control.checkpoint()`` and the bandwidth cap first.
+    Chunks grow up to ``chunk_size`` while the socket keeps up and shrink when
+    it stalls, so a cancel is never stuck behind a large send. ``len()`` lets
+    requests send a Content-Length, since presigned storage URLs reject
+    chunked bodies. A retried request iterates again from the start.
+    """
+
+    def __init__(self, file_path, progress=None, control=None, bandwidth=upload_bandwidth, chunk_size=UPLOAD_CHUNK_SIZE):
+        self.file_path = file_path
+        self.size = os.path.getsize(file_path)
+        self.progress = progress
+        self.control = control
+        self.bandwidth = bandwidth
+        self.chunk_size = chunk_size
+        self.sha256 = None  # Hex digest once a full pass has been sent
+
+    def __len__(self):
+        return self.size
+
+    def __iter__(self):
+        hasher = hashlib.sha256()
+        buffer = bytearray(self.chunk_size)  # Reused: each chunk has been sent before the next read
+        view = memoryview(buffer)
+        sleep = self.control.sleep if self.control else time.sleep
+        chunk_size = min(MIN_CHUNK_SIZE, self.chunk_size)
+        sent = 0
+        with open(self.file_path, "rb", buffering=0) as f:
+            while sent < self.size:
+                if self.control:
+                    self.control.checkpoint()
+                # Never past the announced length, even if the file grows meanwhile
+                read = f.readinto(view[:min(chunk_size, self.size - sent)])
+                if not read:
+                    break
+                chunk = view[:read]
+                self.bandwidth.consume(read, sleep)
+                hasher.update(chunk)
+                started = time.monotonic()
+                yield chunk  # The socket sends it while the generator is suspended here
+                chunk_size = min(_next_chunk_size(chunk_size, read, time.monotonic() - started), self.chunk_size)
+                sent += read
+                if self.progress:
+                    self.progress(sent, self.size)
+        if sent != self.size:
+            raise IOError(f"{self.file_path} changed size while it was being uploaded")
+        self.sha256 = hasher.hexdigest()
+
+
+def upload_file(url, file_path, progress=None, control=None, event=None, expected_sha256=None, session=None):
+    """PUT file_path to a presigned storage URL in one streamed pass and return its SHA-256.
+
+    With ``expected_sha256`` (say, the digest the cache was keyed by), a file
+    that changed between hashing and upload raises instead of being converted
+    under the wrong key.
+    """
+    event = event if event is not None else {}
+    body = UploadStream(file_path, progress, control)
+    try:
+        # The body fits in socket buffers long before the server has read it, so only aborting the socket stops a cancelled upload promptly
+        with abort_on(control):
+            response = (session or get_session()).put(url, data=body, headers={"Content-Type": "application/pdf"}, timeout=UPLOAD_TIMEOUT)
+    except Exception:
+        if control and control.cancelled:
+            raise CancelledError("Upload stopped") from None
+        raise
+    event["http_status"] = response.status_code
+    event["bytes"] = len(body)
+    response.raise_for_status()
+    if expected_sha256 is not None and body.sha256 != expected_sha256:
+        raise ValueError(f"{file_path} changed while it was being uploaded")
+    return body.sha256
+
+
+def download_file(url, output_path, control=None, progress=None, event=None, session=None):
+    """Stream url to output_path and return the number of bytes written.
+
+    The body goes to a temporary file next to output_path, read with buffers
+    that grow while the connection keeps up. A dropped connection resumes
+    from the last byte with a Range request (guarded by If-Range, so a changed
+    object restarts instead of being spliced). The file is renamed into place
+    only once its size matches Content-Length, so output_path either holds
+    the complete document or is untouched. A ``TransferControl`` can pause or
+    cancel it between chunks; ``progress(done, total)`` sees every chunk. A
+    ``metrics.timed`` event dict gets the HTTP status, bytes and resume count.
+    """
+    event = event if event is not None else {}
+    session = session or get_session()
+    directory = os.path.dirname(os.path.abspath(output_path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-", suffix=os.path.splitext(output_path)[1])
+    try:
+        with os.fdopen(fd, "wb") as f:
+            done, total = _fetch(session, url, f, control, progress, event)
+            f.flush()
+            os.fsync(f.fileno())
+        if total is not None and done != total:
+            raise IncompleteDownload(f"Received {done} of {total} bytes")
+        os.replace(tmp_path, output_path)
+        return done
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _fetch(session, url, f, control, progress, event):
+    done, total, validator = 0, None, None
+    chunk_size = MIN_CHUNK_SIZE
+    for attempt in range(MAX_RESUMES + 1):
+        event["resumes"] = attempt
+        # Identity encoding keeps Content-Length and Range offsets in bytes on disk
+        headers = {"Accept-Encoding": "identity"}
+        if done:
+            headers["Range"] = f"bytes={done}-"
+            if validator:
+                headers["If-Range"] = validator
+        try:
+            # A cancel shuts the socket, which unblocks a read waiting on it
+            with abort_on(control), session.get(url, headers=headers, stream=True, timeout=DOWNLOAD_TIMEOUT) as response:
+                event["http_status"] = response.status_code
+                if response.status_code == 416 and total is not None and done == total:
+                    return done, total
+                response.raise_for_status()
+                if done and response.status_code != 206:
+                    # The server ignored the Range or the object changed: start over
+                    f.seek(0)
+                    f.truncate()
+                    done = 0
+                if total is None or response.status_code == 200:
+                    total = _total_length(response)
+                validator = response.headers.get("ETag") or response.headers.get("Last-Modified")
+                while True:
+                    if control:
+                        control.checkpoint()
+                    started = time.monotonic()
+                    chunk = response.raw.read(chunk_size)
+                    if not chunk:
+                        break
+                    f.write(chunk)
+                    done += len(chunk)
+                    event["bytes"] = done
+                    if progress:
+                        progress(done, total)
+                    chunk_size = _next_chunk_size(chunk_size, len(chunk), time.monotonic() - started)
+            if total is None or done >= total:
+                return done, total
+        except Exception as e:
+            if control and control.cancelled:
+                raise CancelledError("Download stopped") from None
+            if not isinstance(e, TRANSIENT_ERRORS) or attempt == MAX_RESUMES:
+                raise
+            print(f"Download interrupted at {done} bytes ({e}); resuming")
+        if control:
+            control.sleep(min(2 ** attempt, 10) if attempt else 0)
+        else:
+            time.sleep(min(2 ** attempt, 10) if attempt else 0)
+    raise IncompleteDownload(f"Received {done} of {total} bytes after {MAX_RESUMES} resumes")
+
+
+def _total_length(response):
+    """Full object size from Content-Range on a 206, else Content-Length; None if the server sent neither."""
+    content_range = response.headers.get("Content-Range", "")
+    if "/" in content_range and not content_range.endswith("/*"):
+        return int(content_range.rsplit("/", 1)[1])
+    length = response.headers.get("Content-Length")
+    return int(length) if length is not None else None
+
+
+def _next_chunk_size(chunk_size, received, seconds):
+    if received == chunk_size and seconds < FAST_READ:
+        return min(chunk_size * 2, MAX_CHUNK_SIZE)
+    if seconds > SLOW_READ:
+        return max(chunk_size // 2, MIN_CHUNK_SIZE)
+    return chunk_size
@@ -0,0 +1,245 @@
+import json
+import os
+import queue
+import tempfile
+import threading
+import time
+
+SETTLE_SECONDS = 2.0  # A PDF is picked up once its size and mtime have not changed for this long
+POLL_INTERVAL = 2.0  # Directory rescans when filesystem events are unavailable
+RESCAN_INTERVAL = 60.0  # Safety rescan with events too: network shares often deliver none
+CHECK_INTERVAL = 0.5
+
+DEFAULT_CHECKPOINT_PATH = os.path.join(os.path.expanduser("~"), ".cache", "pdf-to-word", "watch.jsonl")
+
+
+def available():
+    """Filesystem events (inotify, FSEvents, ReadDirectoryChangesW) need watchdog; otherwise directories are polled."""
+    try:
+        import watchdog  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def is_pdf(path):
+    return path.lower().endswith(".pdf") and not os.path.basename(path).startswith(".")
+
+
+def signature(stat):
+    return stat.st_size, stat.st_mtime
+
+
+class Checkpoint:
+    """Append-only JSON-lines record of the PDFs already handled, as (size, mtime) per path.
+
+    A file counts as handled only in the version that was converted, so editing
+    or replacing it makes it eligible again. The log is compacted on load,
+    dropping superseded lines and files that no longer exist.
+    """
+
+    def __init__(self, path=DEFAULT_CHECKPOINT_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._done = {}
+        self._stream = None
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self._load()
+            self._compact()
+            self._stream = open(path, "a")
+
+    def is_done(self, file_path, file_signature):
+        with self._lock:
+            return self._done.get(file_path) == file_signature
+
+    def mark(self, file_path, file_signature):
+        with self._lock:
+            self._done[file_path] = file_signature
+            if self._stream:
+                self._stream.write(json.dumps({"path": file_path, "size": file_signature[0], "mtime": file_signature[1]}) + "\n")
+                self._stream.flush()
+
+    def close(self):
+        with self._lock:
+            if self._stream:
+                self._stream.close()
+                self._stream = None
+
+    def _load(self):
+        try:
+            with open(self.path) as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                        self._done[entry["path"]] = (entry["size"], entry["mtime"])
+                    except (ValueError, KeyError, TypeError):
+                        continue  # A line torn by a crash
+        except FileNotFoundError:
+            pass
+
+    def _compact(self):
+        self._done = {path: entry for path, entry in self._done.items() if os.path.exists(path)}
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".watch-")
+        with os.fdopen(fd, "w") as f:
+            for path, (size, mtime) in self._done.items():
+                f.write(json.dumps({"path": path, "size": size, "mtime": mtime}) + "\n")
+        os.replace(tmp_path, self.path)
+
+
+class FolderWatcher:
+    """Yield PDFs from directory trees as they appear and finish being written.
+
+    Directories are scanned once at start, so files dropped while nothing was
+    watching are picked up, then followed through filesystem events when
+    watchdog is installed or by rescanning every ``interval`` seconds. A file is
+    handed out once its size and mtime have held still for ``settle`` seconds.
+
+    Iterating yields ``(file_path, directory)`` pairs until ``stop`` is called.
+    Report each one back with ``done`` or ``failed``: done files are written to
+    the checkpoint and skipped on later runs, failed ones are retried when the
+    file changes.
+    """
+
+    def __init__(self, directories, checkpoint=None, settle=SETTLE_SECONDS, interval=POLL_INTERVAL, use_events=None):
+        self.directories = [os.path.abspath(directory) for directory in directories]
+        self.checkpoint = checkpoint or Checkpoint(None)
+        self.settle = settle
+        self.interval = interval
+        self.use_events = available() if use_events is None else use_events
+        self._lock = threading.Lock()
+        self._candidates = {}  # file_path -> (signature or None, monotonic time it was first seen)
+        self._claimed = {}  # file_path -> signature handed out and not reported back yet
+        self._failed = {}  # file_path -> signature that failed
+        self._ready = queue.Queue()
+        self._stop = threading.Event()
+        self._observer = None
+        self._thread = None
+
+    def start(self):
+        self._scan()
+        if self.use_events:
+            self._start_observer()
+        self._thread = threading.Thread(target=self._loop, name="folder-watcher", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._ready.put(None)
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer.join()
+            self._observer = None
+
+    def __iter__(self):
+        while not self._stop.is_set():
+            item = self._ready.get()
+            if item is None:
+                return
+            yield item
+
+    def done(self, file_path):
+        with self._lock:
+            file_signature = self._claimed.pop(file_path, None)
+            self._failed.pop(file_path, None)
+        if file_signature is not None:
+            self.checkpoint.mark(file_path, file_signature)
+
+    def failed(self, file_path):
+        with self._lock:
+            file_signature = self._claimed.pop(file_path, None)
+            if file_signature is not None:
+                self._failed[file_path] = file_signature
+
+    def touch(self, file_path):
+        """Note that file_path was created or written; it is handed out once it settles."""
+        if not is_pdf(file_path):
+            return
+        with self._lock:
+            if file_path not in self._candidates and file_path not in self._claimed:
+                self._candidates[file_path] = (None, time.monotonic())
+
+    def _loop(self):
+        last_scan = time.monotonic()
+        rescan = RESCAN_INTERVAL if self._observer is not None else self.interval
+        while not self._stop.wait(CHECK_INTERVAL):
+            if time.monotonic() - last_scan >= rescan:
+                self._scan()
+                last_scan = time.monotonic()
+            self._settle()
+
+    def _scan(self):
+        for directory in self.directories:
+            for dir_path, _, file_names in os.walk(directory):
+                for file_name in file_names:
+                    file_path = os.path.join(dir_path, file_name)
+                    if not is_pdf(file_path):
+                        continue
+                    try:
+                        file_signature = signature(os.stat(file_path))
+                    except OSError:
+                        continue
+                    if not self._skip(file_path, file_signature):
+                        self.touch(file_path)
+
+    def _skip(self, file_path, file_signature):
+        if self.checkpoint.is_done(file_path, file_signature):
+            return True
+        with self._lock:
+            return file_path in self._claimed or self._failed.get(file_path) == file_signature
+
+    def _settle(self):
+        now = time.monotonic()
+        with self._lock:
+            candidates = list(self._candidates.items())
+        for file_path, (last_signature, since) in candidates:
+            try:
+                file_signature = signature(os.stat(file_path))
+            except OSError:
+                with self._lock:
+                    self._candidates.pop(file_path, None)  # Deleted or renamed before it settled
+                continue
+            if file_signature != last_signature:
+                with self._lock:
+                    self._candidates[file_path] = (file_signature, now)
+                continue
+            if now - since < self.settle:
+                continue
+            with self._lock:
+                self._candidates.pop(file_path, None)
+            if self._skip(file_path, file_signature):
+                continue
+            with self._lock:
+                self._claimed[file_path] = file_signature
+            self._ready.put((file_path, self._directory_of(file_path)))
+
+    def _directory_of(self, file_path):
+        return max((directory for directory in self.directories if file_path.startswith(directory + os.sep)),
+                   key=len, default=os.path.dirname(file_path))
+
+    def _start_observer(self):
+        from watchdog.observers import Observer
+        from watchdog.events import FileSystemEventHandler
+
+        watcher = self
+
+        class Handler(FileSystemEventHandler):
+            def on_created(self, event):
+                if not event.is_directory:
+                    watcher.touch(event.src_path)
+
+            def on_modified(self, event):
+                if not event.is_directory:
+                    watcher.touch(event.src_path)
+
+            def on_moved(self, event):
+                # Writers that save to a temporary name and rename into place
+                if not event.is_directory:
+                    watcher.touch(event.dest_path)
+
+        self._observer = Observer()
+        for directory in self.directories:
+            self._observer.schedule(Handler(), directory, recursive=True)
+        self._observer.start()